@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""Collect telemetry batches from many Grow-monitor Pis into one database.
+
+Run on the aggregating machine:
+
+    python3 aggregator.py --db aggregate.db --udp 0.0.0.0:9999 --http 0.0.0.0:8099
+
+Or check the whole publish/ingest path on one machine with no network:
+
+    python3 aggregator.py --loopback --nodes 300
+"""
+import argparse
+import logging
+import queue
+import random
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telemetry import LoopbackTransport, TelemetryPublisher, decode_payload
+
+# ====== CONFIG ======
+DB_PATH = "/home/jasonvega/Desktop/project/aggregate.db"
+COMMIT_INTERVAL = 2.0
+# Batches a packet can arrive behind and still count as late rather than as a node restart
+REORDER_WINDOW = 64
+# ====================
+
+SEQ_MASK = 0xFFFFFFFF
+
+
+def _timestamp(epoch):
+    return datetime.fromtimestamp(epoch).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class Aggregator:
+    """Decode batches from any thread and bulk insert them from a single writer.
+
+    Each node's sequence number is tracked so lost batches show up as gaps
+    in the nodes table. UDP can reorder packets, so a batch up to
+    REORDER_WINDOW behind that was counted missing is taken off the gaps
+    when it turns up. UDP can also deliver a datagram twice, so a hash of
+    each recent payload is kept: the same seq with the same bytes is a
+    duplicate and is dropped. Any other batch going backwards means the
+    node restarted, even if its seq 0 was lost.
+
+    """
+
+    def __init__(self, db_path=DB_PATH, commit_interval=COMMIT_INTERVAL):
+        self.db_path = db_path
+        self.commit_interval = commit_interval
+        self.received = 0
+        self.rejected = 0
+        self._queue = queue.Queue()
+        self._nodes = {}
+        self._nodes_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="aggregator-writer", daemon=True)
+
+        conn = sqlite3.connect(self.db_path)
+        self._setup(conn)
+        for node, last_seq, gaps, received in conn.execute(
+            "SELECT node, last_seq, gaps, received FROM nodes"
+        ):
+            self._nodes[node] = [last_seq, gaps, received, set(), {}]
+        conn.close()
+
+        self._thread.start()
+
+    def _setup(self, conn):
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS node_readings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                node TEXT,
+                timestamp TEXT,
+                channel INTEGER,
+                moisture REAL,
+                saturation REAL
+            );
+            CREATE INDEX IF NOT EXISTS node_readings_node_time ON node_readings (node, channel, timestamp);
+            CREATE TABLE IF NOT EXISTS node_pump_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                node TEXT,
+                timestamp TEXT,
+                channel INTEGER,
+                rate REAL,
+                duration REAL,
+                UNIQUE(node, timestamp, channel, rate, duration)
+            );
+            CREATE TABLE IF NOT EXISTS nodes (
+                node TEXT PRIMARY KEY,
+                last_seq INTEGER,
+                last_seen TEXT,
+                gaps INTEGER,
+                received INTEGER
+            );
+        """)
+        conn.commit()
+
+    def ingest(self, payload):
+        """Decode one payload and queue it for the writer. Safe from any thread."""
+        try:
+            node, seq, readings, pumps = decode_payload(payload)
+        except Exception as e:
+            self.rejected += 1
+            logging.warning("Rejected telemetry payload: %s", e)
+            return False
+
+        with self._nodes_lock:
+            state = self._nodes.setdefault(node, [None, 0, 0, set(), {}])
+            if not self._track_seq(node, state, seq, hash(payload)):
+                # Already stored, so accepted without queueing it again
+                return True
+            state[2] += 1
+            self.received += 1
+
+        self._queue.put((node, readings, pumps))
+        return True
+
+    def _track_seq(self, node, state, seq, digest):
+        """Update [last_seq, gaps, received, missing, seen] for a batch numbered seq.
+
+        Returns False if the batch is a duplicate of one already received.
+        """
+        last_seq, missing, seen = state[0], state[3], state[4]
+        if seen.get(seq) == digest:
+            logging.info("Node %s: duplicate seq %d dropped", node, seq)
+            return False
+        if last_seq is None:
+            state[0] = seq
+            seen[seq] = digest
+            return True
+        # Sequence numbers wrap at 2**32, so compare them modulo that
+        ahead = (seq - last_seq) & SEQ_MASK
+        behind = (last_seq - seq) & SEQ_MASK
+        if 0 < ahead <= SEQ_MASK // 2:
+            if ahead > 1:
+                state[1] += ahead - 1
+                logging.warning("Node %s: missed %d batch(es) before seq %d", node, ahead - 1, seq)
+                missing.update((seq - n) & SEQ_MASK for n in range(1, min(ahead, REORDER_WINDOW + 1)))
+            state[0] = seq
+            # Anything further back than the window would be taken for a restart, so stop tracking it
+            missing.difference_update([m for m in missing if (seq - m) & SEQ_MASK > REORDER_WINDOW])
+            for old in [s for s in seen if (seq - s) & SEQ_MASK > REORDER_WINDOW]:
+                del seen[old]
+        elif seq in missing:
+            missing.discard(seq)
+            state[1] -= 1
+            logging.info("Node %s: seq %d arrived late, %d behind", node, seq, behind)
+        else:
+            # Not a batch we were waiting for and not one we have, so the node started counting again
+            logging.info("Node %s restarted (seq %d after %d)", node, seq, last_seq)
+            state[0] = seq
+            missing.clear()
+            seen.clear()
+        seen[seq] = digest
+        return True
+
+    def wait_idle(self):
+        """Block until everything ingested so far has been committed."""
+        self._queue.join()
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path)
+        while True:
+            batches = [self._queue.get()]
+            deadline = time.monotonic() + self.commit_interval
+            while time.monotonic() < deadline:
+                try:
+                    batches.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._write(conn, batches)
+            except sqlite3.Error as e:
+                logging.exception("Aggregator write failed: %s", e)
+            for _ in batches:
+                self._queue.task_done()
+
+    def _write(self, conn, batches):
+        readings = []
+        pumps = []
+        for node, node_readings, node_pumps in batches:
+            readings.extend(
+                (node, _timestamp(ts), channel, moisture, saturation)
+                for ts, channel, moisture, saturation in node_readings
+            )
+            pumps.extend(
+                (node, _timestamp(ts), channel, rate, duration)
+                for ts, channel, rate, duration in node_pumps
+            )
+
+        with self._nodes_lock:
+            nodes = [
+                (node, last_seq, gaps, received)
+                for node, (last_seq, gaps, received, _, _) in self._nodes.items()
+            ]
+        now = _timestamp(time.time())
+
+        with conn:
+            conn.executemany(
+                "INSERT INTO node_readings (node, timestamp, channel, moisture, saturation) VALUES (?, ?, ?, ?, ?)",
+                readings,
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO node_pump_log (node, timestamp, channel, rate, duration) VALUES (?, ?, ?, ?, ?)",
+                pumps,
+            )
+            conn.executemany(
+                """INSERT INTO nodes (node, last_seq, last_seen, gaps, received) VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(node) DO UPDATE SET
+                       last_seq = excluded.last_seq,
+                       last_seen = excluded.last_seen,
+                       gaps = excluded.gaps,
+                       received = excluded.received""",
+                [(node, last_seq, now, gaps, received) for node, last_seq, gaps, received in nodes],
+            )
+
+    def serve_udp(self, host, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        sock.bind((host, port))
+        logging.info("Listening for UDP telemetry on %s:%d", host, port)
+        while True:
+            payload, _ = sock.recvfrom(65535)
+            self.ingest(payload)
+
+    def serve_http(self, host, port):
+        aggregator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                ok = aggregator.ingest(self.rfile.read(length))
+                self.send_response(204 if ok else 400)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        logging.info("Listening for HTTP telemetry on %s:%d", host, port)
+        server.serve_forever()
+
+
+def loopback(db_path, nodes, readings_per_node, drop_every=0):
+    """Publish fake readings from many nodes straight into an aggregator."""
+    aggregator = Aggregator(db_path, commit_interval=0.5)
+    transport = LoopbackTransport(aggregator)
+
+    class LossyTransport:
+        def __init__(self):
+            self.sent = 0
+
+        def send(self, payload):
+            self.sent += 1
+            if drop_every and self.sent % drop_every == 0:
+                return
+            transport.send(payload)
+
+    publishers = [
+        TelemetryPublisher(f"pi-{n:03d}", LossyTransport(), batch_size=60, flush_interval=3600)
+        for n in range(nodes)
+    ]
+
+    start = time.perf_counter()
+    now = time.time()
+    for i in range(readings_per_node):
+        for publisher in publishers:
+            for channel in (1, 2, 3):
+                publisher.add_reading(now + i, channel, random.uniform(3, 27), random.random())
+            if i % 60 == 0:
+                publisher.add_pump_event(now + i, 1, 0.5, 0.2)
+            publisher.maybe_flush()
+    for publisher in publishers:
+        publisher.flush()
+    for publisher in publishers:
+        publisher.wait_sent()
+    aggregator.wait_idle()
+    elapsed = time.perf_counter() - start
+
+    conn = sqlite3.connect(db_path)
+    count = conn.execute("SELECT COUNT(*) FROM node_readings").fetchone()[0]
+    gaps = conn.execute("SELECT SUM(gaps) FROM nodes").fetchone()[0]
+    conn.close()
+    print(f"✅ {nodes} nodes, {aggregator.received} batches, {count} readings in {elapsed:.2f}s "
+          f"({count / elapsed:.0f} readings/s), {gaps} gap(s) detected")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--udp", help="host:port to receive UDP batches on")
+    parser.add_argument("--http", help="host:port to receive HTTP POST batches on")
+    parser.add_argument("--loopback", action="store_true", help="run an in-process publish/ingest check")
+    parser.add_argument("--nodes", type=int, default=100)
+    parser.add_argument("--readings", type=int, default=300, help="readings per channel per node for --loopback")
+    parser.add_argument("--drop-every", type=int, default=0, help="drop every Nth batch in --loopback")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+
+    if args.loopback:
+        logging.getLogger().setLevel(logging.ERROR)
+        loopback(args.db, args.nodes, args.readings, args.drop_every)
+        return
+
+    aggregator = Aggregator(args.db)
+    threads = []
+    if args.udp:
+        host, port = args.udp.rsplit(":", 1)
+        threads.append(threading.Thread(target=aggregator.serve_udp, args=(host, int(port)), daemon=True))
+    if args.http:
+        host, port = args.http.rsplit(":", 1)
+        threads.append(threading.Thread(target=aggregator.serve_http, args=(host, int(port)), daemon=True))
+    if not threads:
+        parser.error("give at least one of --udp, --http or --loopback")
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""When to beep for low moisture: the alarm interval, lights out and snooze.
+
+grow-monitor's Alarm view adds the piezo and the snooze icon on top of this.
+"""
+from clock import real_clock
+
+SNOOZE_DURATION = 500
+
+
+class AlarmState:
+    def __init__(self, enabled=True, interval=10.0, clock=real_clock):
+        self.enabled = enabled
+        self.interval = interval
+        self.clock = clock
+        self.beeps = 0
+        self._triggered = False
+        self._time_last_beep = clock.time()
+        self._sleep_until = None
+
+    def update_from_yml(self, config):
+        if config is not None:
+            self.enabled = config.get("alarm_enable", self.enabled)
+            self.interval = config.get("alarm_interval", self.interval)
+
+    def update(self, lights_out=False):
+        if self._sleep_until is not None:
+            if self._sleep_until > self.clock.time():
+                return
+            self._sleep_until = None
+
+        if (
+            self.enabled
+            and not lights_out
+            and self._triggered
+            and self.clock.time() - self._time_last_beep > self.interval
+        ):
+            self.beep()
+            self._time_last_beep = self.clock.time()
+
+            self._triggered = False
+
+    def beep(self):
+        self.beeps += 1
+
+    def trigger(self):
+        self._triggered = True
+
+    def disable(self):
+        self.enabled = False
+
+    def enable(self):
+        self.enabled = True
+
+    def cancel_sleep(self):
+        self._sleep_until = None
+
+    def sleeping(self):
+        return self._sleep_until is not None
+
+    def sleep(self, duration=SNOOZE_DURATION):
+        self._sleep_until = self.clock.time() + duration
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""Streaming anomaly detection for sensor readings, with constant state per sensor.
+
+Three kinds of anomaly are tracked for each sensor:
+
+    flatline   the reading has not moved by more than tolerance for flatline_seconds,
+               eg: a dead moisture sensor reporting the same count over and over
+    spike      a reading outside low..high, or further than spike_sigma standard
+               deviations (and at least spike_min) from the running mean
+    drift      the slow running mean has wandered outside low..high
+
+Each add() updates a handful of numbers, nothing is kept per sample. Spikes
+are kept out of the running mean and variance so one bad reading does not
+widen the band for the next. More than spike_run of them in a row are taken
+as a new level instead, and the running mean restarts from there.
+
+Run directly to benchmark the cost per sample, or to check the moisture
+detector against healthy and stuck sensor traces:
+
+    python3 anomaly.py --samples 1000000
+    python3 anomaly.py --check
+"""
+import argparse
+import math
+import random
+import time
+
+FLATLINE = "flatline"
+SPIKE = "spike"
+DRIFT = "drift"
+
+
+class AnomalyDetector:
+    def __init__(
+        self,
+        low,
+        high,
+        flatline_seconds=600,
+        tolerance=1e-6,
+        spike_sigma=6.0,
+        spike_min=1.0,
+        alpha=0.05,
+        drift_alpha=0.001,
+        warmup=30,
+        spike_run=10,
+    ):
+        self.low = low
+        self.high = high
+        self.flatline_seconds = flatline_seconds
+        self.tolerance = tolerance
+        self.spike_sigma = spike_sigma
+        self.spike_min = spike_min
+        self.alpha = alpha
+        self.drift_alpha = drift_alpha
+        self.warmup = warmup
+        self.spike_run = spike_run
+
+        self.count = 0
+        self.mean = 0.0
+        self.variance = 0.0
+        self.slow = 0.0
+        self._spikes = 0
+        self._run_value = None
+        self._run_start = None
+        self.active = set()
+        self.changes = []
+
+    def add(self, t, value):
+        """Add a reading taken at time t (seconds), returning the set of active anomalies."""
+        found = set()
+
+        if self._run_value is not None and abs(value - self._run_value) <= self.tolerance:
+            if self.flatline_seconds is not None and t - self._run_start >= self.flatline_seconds:
+                found.add(FLATLINE)
+        else:
+            self._run_value = value
+            self._run_start = t
+
+        if self.count == 0:
+            self.mean = self.slow = value
+        else:
+            diff = value - self.mean
+            band = max(self.spike_sigma * math.sqrt(self.variance), self.spike_min)
+            outlier = (
+                (not self.low <= value <= self.high and self.low <= self.mean <= self.high)
+                or (self.count >= self.warmup and abs(diff) > band)
+            )
+            if outlier and self._spikes < self.spike_run:
+                self._spikes += 1
+                found.add(SPIKE)
+            else:
+                if outlier:
+                    self.mean, self.variance, diff = value, 0.0, 0.0
+                self._spikes = 0
+                increment = self.alpha * diff
+                self.mean += increment
+                self.variance = (1 - self.alpha) * (self.variance + diff * increment)
+            self.slow += self.drift_alpha * (value - self.slow)
+        self.count += 1
+
+        if not self.low <= self.slow <= self.high:
+            found.add(DRIFT)
+
+        if found != self.active:
+            for kind in found - self.active:
+                self.changes.append((kind, True))
+            for kind in self.active - found:
+                self.changes.append((kind, False))
+            self.active = found
+        return found
+
+    def drain_changes(self):
+        """Return and clear the (kind, started) changes since the last call."""
+        changes, self.changes = self.changes, []
+        return changes
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "variance": self.variance,
+            "slow": self.slow,
+            "spikes": self._spikes,
+            "run_value": self._run_value,
+            "run_start": self._run_start,
+            "active": sorted(self.active),
+        }
+
+    def load_dict(self, data):
+        self.count = data["count"]
+        self.mean = data["mean"]
+        self.variance = data["variance"]
+        self.slow = data["slow"]
+        self._spikes = data.get("spikes", 0)
+        self._run_value = data["run_value"]
+        self._run_start = data["run_start"]
+        self.active = set(data["active"])
+
+
+MOISTURE_FLATLINE_SECONDS = 3600
+
+
+def moisture_detector():
+    """Raw pulses/sec from a Grow moisture sensor, valid between 0 and 28 as in Moisture.active."""
+    # Drying soil moves the rate by thousandths of a Hz over minutes, so closeness proves nothing.
+    # A live sensor's rate is a count over a measured window and never repeats exactly for an hour,
+    # a stuck one repeats its last count, or reads 0 with no edges at all.
+    return AnomalyDetector(0.01, 28.0, flatline_seconds=MOISTURE_FLATLINE_SECONDS, tolerance=0.0, spike_min=3.0)
+
+
+def temperature_detector():
+    """Arduino temperature in °C, usually logged every few minutes from cron."""
+    return AnomalyDetector(-10.0, 50.0, flatline_seconds=6 * 3600, tolerance=0.0, spike_min=5.0, warmup=12)
+
+
+def uv_detector():
+    """Arduino UV light in mW/cm^2, which sits at 0 all night so is never a flatline."""
+    return AnomalyDetector(0.0, 15.0, flatline_seconds=None, spike_min=4.0, warmup=12)
+
+
+def benchmark(samples):
+    """Return seconds per add() for a noisy moisture series with the odd stuck run and spike."""
+    detector = moisture_detector()
+    random.seed(1)
+    values = []
+    for i in range(samples):
+        if i % 5000 < 700:
+            values.append(12.0)
+        elif i % 997 == 0:
+            values.append(27.5)
+        else:
+            values.append(12.0 + random.gauss(0, 0.3))
+
+    add = detector.add
+    start = time.perf_counter()
+    for t, value in enumerate(values):
+        add(t, value)
+    return (time.perf_counter() - start) / samples, len(detector.changes)
+
+
+def moisture_traces(days=3, seed=1):
+    """Yield (name, should_flatline, [(t, value)]) sensor traces, one reading a second."""
+    rng = random.Random(seed)
+    seconds = int(days * 86400)
+    # Drying by 1% of the 3..27Hz range a day, with ±0.2% jitter, as counted over a ~1s window
+    drying = []
+    for t in range(seconds):
+        rate = 12.0 + 0.24 * t / 86400
+        elapsed = 1.0 + rng.uniform(-0.002, 0.002)
+        drying.append((t, round(rate * elapsed) / elapsed * (1 + rng.uniform(-0.002, 0.002))))
+    yield "slowly drying", False, drying
+    yield "steady", False, [(t, 12.0 * (1 + rng.uniform(-0.002, 0.002))) for t in range(seconds)]
+    stuck = [(t, value) for t, value in drying[:3600]] + [(t, drying[3599][1]) for t in range(3600, 3 * 3600)]
+    yield "stuck count", True, stuck
+    yield "no edges", True, [(t, 0.0) for t in range(3 * 3600)]
+
+
+def check():
+    """Run moisture_detector over moisture_traces, returning True if each flatlines only when it should."""
+    ok = True
+    for name, should_flatline, trace in moisture_traces():
+        detector = moisture_detector()
+        flatlined = False
+        for t, value in trace:
+            flatlined = FLATLINE in detector.add(t, value) or flatlined
+        passed = flatlined == should_flatline
+        ok = ok and passed
+        print(f"{'✅' if passed else '❌'} {name}: {'flatline' if flatlined else 'no flatline'} over {len(trace) / 3600:.0f}h")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the per-sample cost of AnomalyDetector.add.")
+    parser.add_argument("--samples", type=int, default=1000000)
+    parser.add_argument("--check", action="store_true", help="check the moisture detector against sensor traces")
+    args = parser.parse_args()
+
+    if args.check:
+        raise SystemExit(0 if check() else 1)
+
+    per_sample, changes = benchmark(args.samples)
+    print(f"{args.samples} samples, {changes} anomaly start/stop changes")
+    print(f"{per_sample * 1e9:.0f}ns per sample, {per_sample * 1e6 * 3:.2f}µs per tick for 3 channels")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Backfill pump_log from every rotated syslog, including the gzipped ones.
+
+    python3 backfill.py
+    python3 backfill.py --logs "/var/log/syslog*" --db plants.db --dry-run
+
+log_pump_events in database.py only reads syslog and syslog.1. This reads
+all of them, one file per worker process. Each file is read in large blocks
+and searched for "Watering Channel" with bytes.find, so the regex only runs
+on the few lines that can match. Events are deduplicated across files and
+against pump_log, then inserted in a single transaction.
+"""
+import argparse
+import glob
+import gzip
+import re
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from database import DB_PATH, WATERING_MARKER, WATERING_PATTERN, setup_database
+
+BLOCK_SIZE = 1 << 20
+
+MARKER = WATERING_MARKER.encode()
+PATTERN = re.compile(WATERING_PATTERN.pattern.encode())
+
+
+def scan_block(block, events):
+    """Add the watering events in block, which must end on a line boundary."""
+    start = block.find(MARKER)
+    while start != -1:
+        line_start = block.rfind(b"\n", 0, start) + 1
+        line_end = block.find(b"\n", start)
+        if line_end == -1:
+            line_end = len(block)
+        match = PATTERN.search(block, line_start, line_end)
+        if match:
+            timestamp, channel, rate, duration = match.groups()
+            events.add((timestamp.decode(), int(channel), float(rate), float(duration)))
+        start = block.find(MARKER, line_end)
+
+
+def scan(path):
+    """Return (path, bytes read, set of (timestamp, channel, rate, duration))."""
+    opener = gzip.open if path.endswith(".gz") else open
+    events = set()
+    size = 0
+    tail = b""
+    with opener(path, "rb") as file:
+        while True:
+            block = file.read(BLOCK_SIZE)
+            if not block:
+                break
+            size += len(block)
+            block = tail + block
+            cut = block.rfind(b"\n") + 1
+            tail = block[cut:]
+            scan_block(block[:cut], events)
+    if tail:
+        scan_block(tail, events)
+    return path, size, events
+
+
+def rotation_order(path):
+    """syslog, syslog.1, syslog.2.gz... sorted newest first."""
+    match = re.search(r"\.(\d+)(\.gz)?$", path)
+    return int(match.group(1)) if match else 0
+
+
+def insert_events(db_path, events):
+    """Insert events not already in pump_log, returning how many were added."""
+    if not events:
+        return 0
+    setup_database(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        # pump_log made by setup_database has no UNIQUE constraint, so check for existing rows here
+        existing = set(
+            conn.execute(
+                "SELECT timestamp, channel, rate, duration FROM pump_log WHERE timestamp >= ?",
+                (events[0][0],),
+            )
+        )
+        new = [event for event in events if event not in existing]
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO pump_log (timestamp, channel, rate, duration) VALUES (?, ?, ?, ?)",
+                new,
+            )
+    finally:
+        conn.close()
+    return len(new)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logs", default="/var/log/syslog*", help="glob of syslog files to scan")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--dry-run", action="store_true", help="scan and report without writing to the database")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(args.logs), key=rotation_order)
+    if not paths:
+        print(f"❌ No logs match {args.logs}")
+        return
+
+    start = time.perf_counter()
+    events = set()
+    total = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for path, size, found in executor.map(scan, paths):
+            print(f"📄 {path}: {len(found)} event(s) in {size / 1e6:.1f}MB")
+            events |= found
+            total += size
+    scanned = time.perf_counter() - start
+
+    events = sorted(events)
+    print(f"🔍 {len(events)} unique event(s) in {total / 1e6:.1f}MB of logs, scanned in {scanned:.2f}s")
+    if args.dry_run:
+        return
+
+    inserted = insert_events(args.db, events)
+    if inserted > 0:
+        print(f"✅ Backfilled {inserted} new pump event(s).")
+    else:
+        print("ℹ️ No new pump events found.")
+
+
+if __name__ == "__main__":
+    main()
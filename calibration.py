@@ -0,0 +1,168 @@
+"""Suggest wet and dry points from the spread of raw readings a sensor actually sees.
+
+Each channel keeps P² estimators (Jain & Chlamtac, 1985) of a low and a high
+percentile of its raw pulses/sec. Wet soil pulses slowly, so the low
+percentile becomes the suggested wet_point and the high one the dry_point.
+
+Memory stays bounded at five markers per estimator. To follow sensor
+drift, each estimator is rebuilt every window samples, with a second one
+warming up alongside it so there is always a full window to suggest from.
+"""
+import logging
+import pathlib
+
+import yaml
+
+
+class P2Quantile:
+    """Streaming estimate of the p-quantile using five markers."""
+
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self._heights = []
+        self._positions = [0, 1, 2, 3, 4]
+        self._desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        self.count += 1
+        q = self._heights
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        n = self._positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q = self._heights
+        n = self._positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    @property
+    def value(self):
+        q = self._heights
+        if not q:
+            return None
+        if len(q) < 5:
+            return q[min(len(q) - 1, int(round(self.p * (len(q) - 1))))]
+        return q[2]
+
+    def to_dict(self):
+        return {
+            "p": self.p,
+            "count": self.count,
+            "heights": list(self._heights),
+            "positions": list(self._positions),
+            "desired": list(self._desired),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        estimator = cls(data["p"])
+        estimator.count = data["count"]
+        estimator._heights = list(data["heights"])
+        estimator._positions = list(data["positions"])
+        estimator._desired = list(data["desired"])
+        return estimator
+
+
+class CalibrationEstimator:
+    """Estimate one channel's wet and dry points from its raw readings."""
+
+    def __init__(self, low=0.02, high=0.98, window=7 * 24 * 3600, min_samples=6 * 3600):
+        self.low = low
+        self.high = high
+        self.window = window
+        self.min_samples = min_samples
+        self._current = (P2Quantile(low), P2Quantile(high))
+        self._next = (P2Quantile(low), P2Quantile(high))
+
+    def add(self, reading):
+        # Same validity test as Moisture.active, a dead sensor reads 0
+        if not 0 < reading < 28:
+            return
+        for estimator in self._current + self._next:
+            estimator.add(reading)
+        if self._next[0].count >= self.window:
+            self._current = self._next
+            self._next = (P2Quantile(self.low), P2Quantile(self.high))
+
+    @property
+    def count(self):
+        return self._current[0].count
+
+    def suggest(self):
+        """Return (wet_point, dry_point) in pulses/sec, or None until enough samples are seen."""
+        if self.count < self.min_samples:
+            return None
+        wet, dry = self._current[0].value, self._current[1].value
+        if dry - wet < 1.0:
+            return None
+        return round(wet, 2), round(dry, 2)
+
+    def to_dict(self):
+        return {
+            "current": [estimator.to_dict() for estimator in self._current],
+            "next": [estimator.to_dict() for estimator in self._next],
+        }
+
+    def load_dict(self, data):
+        self._current = tuple(P2Quantile.from_dict(item) for item in data["current"])
+        self._next = tuple(P2Quantile.from_dict(item) for item in data["next"])
+
+
+class CalibrationStore:
+    """Persist every channel's estimator state in a yml file next to settings.yml."""
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+
+    def load(self, channels):
+        if not self.path.is_file():
+            return
+        try:
+            data = yaml.safe_load(open(self.path)) or {}
+        except yaml.YAMLError as e:
+            logging.warning("Ignoring calibration state %s: %s", self.path, e)
+            return
+        for channel in channels:
+            state = data.get(f"channel{channel.channel}")
+            if state:
+                channel.calibration.load_dict(state)
+
+    def save(self, channels):
+        data = {f"channel{channel.channel}": channel.calibration.to_dict() for channel in channels}
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        with open(tmp_path, "w") as file:
+            yaml.safe_dump(data, file)
+        tmp_path.replace(self.path)
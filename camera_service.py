@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""Keep the camera open and take stills on a schedule or on request.
+
+Opening the camera, configuring it and waiting for auto exposure and white
+balance to settle takes seconds, which cameratestnew.py used to pay for
+every photo. This service does it once: the camera stays configured and
+streaming, and once AE/AWB have converged their values are locked with
+set_controls, so every still (and every timelapse frame) is taken with the
+same exposure, gain and colour gains. A capture then only waits for the
+next frame and the JPEG encode.
+
+    python3 camera_service.py                     # captures on request only
+    python3 camera_service.py --interval 600      # plus a timelapse frame every 10 minutes
+    python3 camera_service.py --simulate --benchmark 200
+
+Captures are requested over HTTP on localhost:
+
+    POST /capture   take a still now, returns {"path", "frame_ms", "ms"}
+    POST /relock    let AE/AWB settle again (eg: after the grow lights change) and lock the new values
+    GET  /status    captures so far, the last one and the locked controls
+
+The simulated camera needs no hardware: its scene brightness can be set and
+its AE/AWB settle over a few frames like the real one. It writes small PPM
+images instead of JPEGs.
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from clock import real_clock
+
+# ====== CONFIG ======
+BASE_DIR = "/home/jasonvega/Desktop/project"
+CAPTURE_DIR = os.path.join(BASE_DIR, "captures")
+HOST = "127.0.0.1"
+PORT = 8082
+CONVERGE_TIMEOUT = 5.0
+# ====================
+
+
+# ==========================
+# Camera backends
+# ==========================
+
+class Picamera2Camera:
+    """The Pi camera through picamera2, streaming the full resolution still configuration."""
+
+    extension = "jpg"
+
+    def __init__(self):
+        self.picam2 = None
+
+    def start(self):
+        from picamera2 import Picamera2
+
+        self.picam2 = Picamera2()
+        self.picam2.configure(self.picam2.create_still_configuration(buffer_count=2))
+        self.picam2.start()
+
+    def metadata(self):
+        return self.picam2.capture_metadata()
+
+    def set_controls(self, controls):
+        self.picam2.set_controls(controls)
+
+    def capture(self, path):
+        """Save the next frame to path, returning the seconds spent waiting for it."""
+        start = time.perf_counter()
+        request = self.picam2.capture_request()
+        waited = time.perf_counter() - start
+        try:
+            request.save("main", path)
+        finally:
+            request.release()
+        return waited
+
+    def stop(self):
+        if self.picam2 is not None:
+            self.picam2.stop()
+            self.picam2.close()
+            self.picam2 = None
+
+
+class SimulatedCamera:
+    """A camera without hardware, with controls and metadata named like picamera2's."""
+
+    extension = "ppm"
+    TARGET_LEVEL = 0.45
+    AWB_GAINS = (2.0, 1.6)
+
+    def __init__(self, scene=0.5, frame_time=1 / 30, size=(64, 48), clock=real_clock):
+        self.scene = scene
+        self.frame_time = frame_time
+        self.size = size
+        self.clock = clock
+        self.controls = {"AeEnable": True, "AwbEnable": True}
+        self.exposure_time = 10000.0
+        self.gain = 1.0
+        self.colour_gains = (1.0, 1.0)
+        self._lock = threading.Lock()
+
+    def start(self):
+        pass
+
+    def _level(self):
+        return self.scene * self.exposure_time / 10000 * self.gain
+
+    def _frame(self):
+        """Wait for the next frame, letting AE/AWB take a step towards their targets if enabled."""
+        self.clock.sleep(self.frame_time)
+        if self.controls.get("AeEnable", True):
+            self.exposure_time = min(max(self.exposure_time * (self.TARGET_LEVEL / max(self._level(), 1e-3)) ** 0.5, 100), 200000)
+        if self.controls.get("AwbEnable", True):
+            self.colour_gains = tuple(g + (target - g) * 0.5 for g, target in zip(self.colour_gains, self.AWB_GAINS))
+
+    def metadata(self):
+        with self._lock:
+            self._frame()
+            return {
+                "ExposureTime": round(self.exposure_time),
+                "AnalogueGain": self.gain,
+                "ColourGains": self.colour_gains,
+                "AeLocked": abs(self._level() / self.TARGET_LEVEL - 1) < 0.05,
+            }
+
+    def set_controls(self, controls):
+        with self._lock:
+            self.controls.update(controls)
+            if "ExposureTime" in controls:
+                self.exposure_time = float(controls["ExposureTime"])
+            if "AnalogueGain" in controls:
+                self.gain = float(controls["AnalogueGain"])
+            if "ColourGains" in controls:
+                self.colour_gains = tuple(controls["ColourGains"])
+
+    def capture(self, path):
+        start = time.perf_counter()
+        with self._lock:
+            self._frame()
+            level = self._level()
+            red, blue = self.colour_gains
+        waited = time.perf_counter() - start
+        width, height = self.size
+        pixels = bytearray()
+        for y in range(height):
+            shade = level * (0.5 + y / height)
+            pixels += bytes(min(255, int(255 * shade * gain / 2)) for gain in (red, 2.0, blue)) * width
+        with open(path, "wb") as file:
+            file.write(f"P6\n{width} {height}\n255\n".encode() + pixels)
+        return waited
+
+    def stop(self):
+        pass
+
+
+# ==========================
+# Capture service
+# ==========================
+
+class CaptureService(threading.Thread):
+    """Owns the camera: settles and locks its exposure, then captures on request and every interval seconds."""
+
+    def __init__(self, camera, capture_dir=CAPTURE_DIR, interval=None, clock=real_clock):
+        super().__init__(name="capture", daemon=True)
+        self.camera = camera
+        self.capture_dir = capture_dir
+        self.interval = interval
+        self.clock = clock
+        self.ready = threading.Event()
+        self.controls = None
+        self.captures = 0
+        self.last = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def lock_exposure(self, timeout=CONVERGE_TIMEOUT):
+        """Let AE/AWB converge, then fix the exposure, gain and colour gains they settled on."""
+        self.camera.set_controls({"AeEnable": True, "AwbEnable": True})
+        deadline = self.clock.time() + timeout
+        previous = None
+        steady = 0
+        while True:
+            metadata = self.camera.metadata()
+            values = (metadata["ExposureTime"], *metadata["ColourGains"])
+            # Settled once exposure and white balance hold for a few frames, AeLocked alone says nothing about AWB
+            if previous and all(abs(value - last) <= 0.02 * last for value, last in zip(values, previous)):
+                steady += 1
+            else:
+                steady = 0
+            previous = values
+            if steady >= 3:
+                break
+            if self.clock.time() > deadline:
+                logging.warning("Exposure still changing after %.0fs, locking it anyway", timeout)
+                break
+        self.controls = {
+            "AeEnable": False,
+            "AwbEnable": False,
+            "ExposureTime": int(metadata["ExposureTime"]),
+            "AnalogueGain": metadata["AnalogueGain"],
+            "ColourGains": tuple(metadata["ColourGains"]),
+        }
+        self.camera.set_controls(self.controls)
+        logging.info(
+            "Locked exposure at %dus, gain %.2f, colour gains %.2f/%.2f",
+            self.controls["ExposureTime"], self.controls["AnalogueGain"], *self.controls["ColourGains"],
+        )
+        return self.controls
+
+    def relock(self):
+        with self._lock:
+            return self.lock_exposure()
+
+    def _path(self, prefix):
+        stamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        path = os.path.join(self.capture_dir, f"{prefix}_{stamp}.{self.camera.extension}")
+        n = 1
+        while os.path.exists(path):
+            path = os.path.join(self.capture_dir, f"{prefix}_{stamp}_{n}.{self.camera.extension}")
+            n += 1
+        return path
+
+    def capture(self, prefix="image"):
+        """Take a still now, returning (path, seconds waiting for the frame, seconds in total)."""
+        if not self.ready.wait(CONVERGE_TIMEOUT * 2):
+            raise RuntimeError("the camera isn't ready")
+        with self._lock:
+            if self._stop_event.is_set():
+                raise RuntimeError("the capture service is stopping")
+            path = self._path(prefix)
+            start = time.perf_counter()
+            waited = self.camera.capture(path)
+            elapsed = time.perf_counter() - start
+            self.captures += 1
+            self.last = path
+        return path, waited, elapsed
+
+    def run(self):
+        os.makedirs(self.capture_dir, exist_ok=True)
+        self.camera.start()
+        try:
+            self.lock_exposure()
+            self.ready.set()
+            if not self.interval:
+                self._stop_event.wait()
+                return
+            next_time = self.clock.time()
+            while not self._stop_event.is_set():
+                try:
+                    path, _, elapsed = self.capture("timelapse")
+                    logging.info("📷 %s in %.0fms", os.path.basename(path), elapsed * 1000)
+                except Exception as e:
+                    logging.warning("Timelapse capture failed: %s", e)
+                # A capture that overruns skips the missed frames rather than bunching them up
+                now = self.clock.time()
+                next_time += self.interval
+                if next_time < now:
+                    next_time += ((now - next_time) // self.interval + 1) * self.interval
+                if self.clock.wait(self._stop_event, next_time - now):
+                    break
+        finally:
+            with self._lock:
+                self.camera.stop()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def status(self):
+        return {
+            "ready": self.ready.is_set(),
+            "captures": self.captures,
+            "last": self.last,
+            "interval": self.interval,
+            "controls": self.controls,
+        }
+
+
+def capture_once(path, camera=None):
+    """Open the camera, let it settle, take one still to path and close it, for when the service isn't running."""
+    camera = camera or Picamera2Camera()
+    camera.start()
+    try:
+        CaptureService(camera).lock_exposure()
+        camera.capture(path)
+    finally:
+        camera.stop()
+    return path
+
+
+def request_capture(host=HOST, port=PORT, timeout=30):
+    """Ask a running service for a still and return its path.
+
+    Raises OSError when no service is listening and RuntimeError when it
+    couldn't capture.
+    """
+    request = urllib.request.Request(f"http://{host}:{port}/capture", data=b"", method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())["path"]
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(json.loads(e.read() or b"{}").get("error", str(e))) from e
+
+
+# ==========================
+# HTTP trigger
+# ==========================
+
+def make_server(service, host=HOST, port=PORT):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/status":
+                self._send(200, service.status())
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            try:
+                if self.path == "/capture":
+                    path, waited, elapsed = service.capture()
+                    self._send(200, {"path": path, "frame_ms": waited * 1000, "ms": elapsed * 1000})
+                elif self.path == "/relock":
+                    self._send(200, {"controls": service.relock()})
+                else:
+                    self._send(404, {"error": "not found"})
+            except (OSError, RuntimeError) as e:
+                self._send(503, {"error": str(e)})
+
+        def _send(self, status, data):
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def benchmark(captures, camera, capture_dir, port=PORT + 1000):
+    """Time captures requested over HTTP against opening the camera for each one, the old way."""
+    service = CaptureService(camera, capture_dir)
+    server = make_server(service, port=port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    start = time.perf_counter()
+    service.start()
+    service.ready.wait()
+    print(f"Camera started and locked in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    times = []
+    for _ in range(captures):
+        start = time.perf_counter()
+        request_capture(port=port)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    print(
+        f"{captures} captures: p50 {times[len(times) // 2] * 1000:.1f}ms  "
+        f"p99 {times[int(len(times) * 0.99)] * 1000:.1f}ms  max {times[-1] * 1000:.1f}ms"
+    )
+    exposures = {camera.metadata()["ExposureTime"] for _ in range(5)}
+    print(f"Exposure while locked: {sorted(exposures)}us")
+
+    service.stop()
+    service.join()
+    server.shutdown()
+
+    start = time.perf_counter()
+    capture_once(os.path.join(capture_dir, f"once.{camera.extension}"), type(camera)())
+    print(f"One-shot capture, opening and settling the camera: {(time.perf_counter() - start) * 1000:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--dir", default=CAPTURE_DIR, help="where captures are saved")
+    parser.add_argument("--interval", type=float, help="take a timelapse frame every INTERVAL seconds")
+    parser.add_argument("--simulate", action="store_true", help="use the simulated camera")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="time N captures and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+    camera = SimulatedCamera() if args.simulate else Picamera2Camera()
+    if args.benchmark:
+        os.makedirs(args.dir, exist_ok=True)
+        benchmark(args.benchmark, camera, args.dir)
+        return
+
+    service = CaptureService(camera, args.dir, args.interval)
+    service.start()
+    server = make_server(service, args.host, args.port)
+    logging.info("Capture service on http://%s:%d/", args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        service.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,8 @@ from datetime import datetime
 import os
 import requests
 
-# Google API imports
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+import google_clients
+import oauth_manager
 
 # Paths
 CREDENTIALS_PATH = "/home/jasonvega/Desktop/photos_credentials.json"
@@ -20,35 +18,23 @@ SCOPES = [
 ]
 
 def google_auth():
-    creds = None
-    if os.path.exists(TOKEN_PATH):
-        creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_PATH, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_PATH, 'w') as token:
-            token.write(creds.to_json())
-    return creds
-
-def create_album(creds, album_name):
+    return oauth_manager.credentials(TOKEN_PATH, CREDENTIALS_PATH, SCOPES)
+
+def create_album(photos, album_name):
     """Always create a new album"""
-    create_url = "https://photoslibrary.googleapis.com/v1/albums"
-    headers = {"Authorization": f"Bearer {creds.token}"}
-    payload = {"album": {"title": album_name}}
-
-    response = requests.post(create_url, headers=headers, json=payload)
-    if response.status_code == 200:
-        album = response.json()
-        print(f"📂 Created new album '{album_name}' with ID {album['id']}")
-        return album["id"]
-    else:
-        print("❌ Album creation failed:", response.text)
+    from googleapiclient.errors import HttpError
+
+    try:
+        album = photos.albums().create(body={"album": {"title": album_name}}).execute()
+    except HttpError as e:
+        print("❌ Album creation failed:", e)
         return None
+    print(f"📂 Created new album '{album_name}' with ID {album['id']}")
+    return album["id"]
 
 def upload_to_new_album(file_path, album_name):
+    from googleapiclient.errors import HttpError
+
     creds = google_auth()
 
     # Step 1: Upload file → uploadToken
@@ -70,12 +56,12 @@ def upload_to_new_album(file_path, album_name):
     upload_token = response.content.decode("utf-8")
 
     # Step 2: Create a brand-new album
-    album_id = create_album(creds, album_name)
+    photos = google_clients.photos(credentials=creds)
+    album_id = create_album(photos, album_name)
     if not album_id:
         return
 
     # Step 3: Add photo into new album
-    create_url = "https://photoslibrary.googleapis.com/v1/mediaItems:batchCreate"
     payload = {
         "albumId": album_id,
         "newMediaItems": [
@@ -86,12 +72,12 @@ def upload_to_new_album(file_path, album_name):
         ]
     }
 
-    response = requests.post(create_url, headers={"Authorization": f"Bearer {creds.token}"}, json=payload)
-
-    if response.status_code == 200:
-        print(f"✅ Uploaded photo into new album '{album_name}'")
-    else:
-        print("❌ Media creation failed:", response.text)
+    try:
+        photos.mediaItems().batchCreate(body=payload).execute()
+    except HttpError as e:
+        print("❌ Media creation failed:", e)
+        return
+    print(f"✅ Uploaded photo into new album '{album_name}'")
 
 # ---- Camera section ----
 camera = PiCamera()
@@ -0,0 +1,348 @@
+"""Channels tie a moisture sensor and pump to their watering and alarm levels.
+
+Kept free of display and GPIO imports so that tools such as simulate.py can
+drive the same decision logic with virtual sensors, pumps and clocks.
+"""
+import logging
+import math
+import re
+from array import array
+
+from anomaly import moisture_detector
+from calibration import CalibrationEstimator
+from clock import real_clock
+from streamstats import StreamingStats
+
+# Indicator colours, shared with grow-monitor's display
+COLOR_BLUE = (31, 137, 251)
+COLOR_GREEN = (99, 255, 124)
+COLOR_YELLOW = (254, 219, 82)
+COLOR_RED = (247, 0, 63)
+
+# Pins for each stacked/rewired Grow HAT, overridden by "hats" in settings.yml
+DEFAULT_HATS = [
+    {"moisture_pins": [23, 8, 25], "pump_pins": [17, 27, 22]},
+]
+
+
+def moisture_counter(settings):
+    """The pulse counting backend settings.yml asks for (see pulsecounter.py)."""
+    return (settings.get("general") or {}).get("moisture_counter", "gate")
+
+
+def channel_layout(settings):
+    """(channel id, sensor, pump, sensor pin, pump pin) for every channel in settings.yml.
+
+    See ChannelRegistry for how channels are placed on the HATs.
+
+    """
+    hats = settings.get("hats", DEFAULT_HATS)
+    ids = sorted(
+        int(match.group(1))
+        for match in (re.fullmatch(r"channel(\d+)", str(key)) for key in settings)
+        if match
+    ) or [1, 2, 3]
+
+    layout = []
+    for channel_id in ids:
+        section = settings.get(f"channel{channel_id}") or {}
+        hat = section.get("hat", (channel_id - 1) // 3 + 1)
+        sensor = section.get("sensor", (channel_id - 1) % 3 + 1)
+        pump = section.get("pump", sensor)
+        if not 1 <= hat <= len(hats):
+            raise ValueError(f"Channel {channel_id} uses HAT {hat} but only {len(hats)} are configured")
+        pins = hats[hat - 1]
+        layout.append((channel_id, sensor, pump, pins["moisture_pins"][sensor - 1], pins["pump_pins"][pump - 1]))
+    return layout
+
+
+class Channel:
+    """One plant: a moisture sensor, a pump and the levels that drive them.
+
+    sensor and pump are created from the sensor/pump channel numbers unless
+    given, eg: by the simulator. notify is called with a message when the
+    channel waters or raises its alarm.
+
+    """
+
+    colors = [
+        COLOR_BLUE,
+        COLOR_GREEN,
+        COLOR_YELLOW,
+        COLOR_RED
+    ]
+
+    def __init__(
+        self,
+        display_channel,
+        sensor_channel,
+        pump_channel,
+        title=None,
+        water_level=0.5,
+        warn_level=0.5,
+        pump_speed=0.5,
+        pump_time=0.2,
+        watering_delay=60,
+        wet_point=0.7,
+        dry_point=26.7,
+        icon=None,
+        auto_water=False,
+        enabled=False,
+        auto_calibrate=False,
+        sensor_pin=None,
+        pump_pin=None,
+        counter="python",
+        sensor=None,
+        pump=None,
+        notify=None,
+        clock=real_clock,
+    ):
+        if sensor is None:
+            from moisture import Moisture
+            sensor = Moisture(sensor_channel, gpio_pin=sensor_pin, counter=counter, clock=clock)
+        if pump is None:
+            from pump import Pump
+            pump = Pump(pump_channel, gpio_pin=pump_pin)
+
+        self.channel = display_channel
+        self.sensor = sensor
+        self.pump = pump
+        self.clock = clock
+        self._notify = notify
+        self.water_level = water_level
+        self.warn_level = warn_level
+        self.auto_water = auto_water
+        self.pump_speed = pump_speed
+        self.pump_time = pump_time
+        self.watering_delay = watering_delay
+        self._wet_point = wet_point
+        self._dry_point = dry_point
+        self.last_dose = clock.time()
+        self.icon = icon
+        self._enabled = enabled
+        self.alarm = False
+        self.stats = StreamingStats()
+        self.calibration = CalibrationEstimator()
+        self.anomaly = moisture_detector()
+        self.auto_calibrate = auto_calibrate
+        self.title = f"Channel {display_channel}" if title is None else title
+
+        self.sensor.set_wet_point(wet_point)
+        self.sensor.set_dry_point(dry_point)
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, enabled):
+        self._enabled = enabled
+
+    @property
+    def wet_point(self):
+        return self._wet_point
+
+    @property
+    def dry_point(self):
+        return self._dry_point
+
+    @wet_point.setter
+    def wet_point(self, wet_point):
+        self._wet_point = wet_point
+        self.sensor.set_wet_point(wet_point)
+
+    @dry_point.setter
+    def dry_point(self, dry_point):
+        self._dry_point = dry_point
+        self.sensor.set_dry_point(dry_point)
+
+    def warn_color(self):
+        value = self.sensor.moisture
+
+    def indicator_color(self, value):
+        value = 1.0 - value
+        if value == 1.0:
+            return self.colors[-1]
+        if value == 0.0:
+            return self.colors[0]
+
+        value *= len(self.colors) - 1
+        a = int(math.floor(value))
+        b = a + 1
+        blend = float(value - a)
+
+        r, g, b = [int(((self.colors[b][i] - self.colors[a][i]) * blend) + self.colors[a][i]) for i in range(3)]
+        return (r, g, b)
+
+    def update_from_yml(self, config):
+        if config is not None:
+            self.pump_speed = config.get("pump_speed", self.pump_speed)
+            self.pump_time = config.get("pump_time", self.pump_time)
+            self.warn_level = config.get("warn_level", self.warn_level)
+            self.water_level = config.get("water_level", self.water_level)
+            self.watering_delay = config.get("watering_delay", self.watering_delay)
+            self.auto_water = config.get("auto_water", self.auto_water)
+            self.enabled = config.get("enabled", self.enabled)
+            self.wet_point = config.get("wet_point", self.wet_point)
+            self.dry_point = config.get("dry_point", self.dry_point)
+            self.auto_calibrate = config.get("auto_calibrate", self.auto_calibrate)
+
+    def __str__(self):
+        return f"""Channel: {self.channel}
+Enabled: {self.enabled}
+Alarm level: {self.warn_level}
+Auto water: {self.auto_water}
+Water level: {self.water_level}
+Pump speed: {self.pump_speed}
+Pump time: {self.pump_time}
+Delay: {self.watering_delay}
+Wet point: {self.wet_point}
+Dry point: {self.dry_point}
+Auto calibrate: {self.auto_calibrate}
+"""
+
+    def water(self):
+        if not self.auto_water:
+            return False
+        if self.clock.time() - self.last_dose > self.watering_delay:
+            self.pump.dose(self.pump_speed, self.pump_time, blocking=False)
+            self.last_dose = self.clock.time()
+            return True
+        return False
+
+    def render(self, image, font):
+        pass
+
+    def notify(self, message):
+        if self._notify is not None:
+            self._notify(message)
+
+    def add_reading(self, t, sat, raw=None):
+        """Feed a new sensor reading into the channel's streaming statistics."""
+        self.stats.add(t, sat)
+        if raw is not None:
+            self.calibration.add(raw)
+            self.anomaly.add(t, raw)
+
+    def calibrate(self):
+        """Apply the suggested wet/dry points if auto_calibrate is set.
+
+        Returns the suggested (wet_point, dry_point), or None if there is no
+        suggestion yet.
+
+        """
+        suggestion = self.calibration.suggest()
+        if suggestion is None:
+            return None
+        wet_point, dry_point = suggestion
+        if self.auto_calibrate and (wet_point, dry_point) != (self.wet_point, self.dry_point):
+            logging.info(
+                f"Calibrating Channel: {self.channel} - wet point {self.wet_point:.2f} -> {wet_point:.2f}Hz, "
+                f"dry point {self.dry_point:.2f} -> {dry_point:.2f}Hz"
+            )
+            self.wet_point = wet_point
+            self.dry_point = dry_point
+        return suggestion
+
+    def update(self, sat=None):
+        """Check saturation against the alarm and watering levels.
+
+        The smoothed saturation is used once readings have arrived, so a
+        single noisy reading does not start the pump or the alarm.
+
+        Returns True if the pump was started.
+
+        """
+        if not self.enabled:
+            return False
+        if sat is None:
+            sat = self.sensor.saturation
+        sat = self.stats.value(sat)
+        watered = False
+        # A stuck or dead sensor looks just like dry soil, so don't water on its word
+        if sat < self.water_level and not self.anomaly.active:
+            if self.water():
+                watered = True
+                logging.info(
+                    f"Watering Channel: {self.channel} - rate {self.pump_speed:.2f} for {self.pump_time:.2f}sec"
+                )
+                self.notify(f"Auto-watering triggered on Channel {self.channel}")
+        if sat < self.warn_level:
+            if not self.alarm:
+                logging.warning(
+                    f"Alarm on Channel: {self.channel} - saturation is {sat * 100:.2f}% (warn level {self.warn_level * 100:.2f}%)"
+                )
+                self.notify(f"Warning: Moisture low on Channel {self.channel}")
+            self.alarm = True
+        else:
+            self.alarm = False
+        return watered
+
+
+class ChannelRegistry:
+    """Every configured channel, across one or more Grow HATs.
+
+    Channels come from the "channelN" sections of settings.yml. Each may set
+    "hat" (1-based index into the "hats" pin list) and "sensor"/"pump" (1-3 on
+    that HAT), otherwise channels 4-6 go on HAT 2 and so on.
+
+    """
+
+    def __init__(self, channels, clock=real_clock):
+        self.channels = channels
+        self.clock = clock
+        self.moisture = array("d", [0.0] * len(channels))
+        self.saturation = array("d", [0.0] * len(channels))
+        self.new_data = array("b", [0] * len(channels))
+        self.watered = []
+
+    @classmethod
+    def from_config(cls, config, notify=None, clock=real_clock):
+        settings = config.config or {}
+        counter = moisture_counter(settings)
+        channels = [
+            Channel(
+                channel_id,
+                sensor,
+                pump,
+                sensor_pin=sensor_pin,
+                pump_pin=pump_pin,
+                counter=counter,
+                notify=notify,
+                clock=clock,
+            )
+            for channel_id, sensor, pump, sensor_pin, pump_pin in channel_layout(settings)
+        ]
+        return cls(channels, clock)
+
+    def __iter__(self):
+        return iter(self.channels)
+
+    def __len__(self):
+        return len(self.channels)
+
+    def __getitem__(self, index):
+        return self.channels[index]
+
+    def index(self, channel):
+        return self.channels.index(channel)
+
+    def update(self):
+        """Read every sensor once, then update all channels from the batch.
+
+        Afterwards new_data flags the channels with a fresh reading this
+        tick, and watered lists the channels whose pump was started.
+
+        """
+        now = self.clock.time()
+        for i, channel in enumerate(self.channels):
+            self.new_data[i] = channel.sensor.new_data
+            self.moisture[i] = channel.sensor.moisture
+            saturation = (self.moisture[i] - channel.dry_point) / (channel.wet_point - channel.dry_point)
+            self.saturation[i] = max(0.0, min(1.0, round(saturation, 3)))
+            if self.new_data[i]:
+                channel.add_reading(now, self.saturation[i], self.moisture[i])
+
+        self.watered = [
+            channel for channel, sat in zip(self.channels, self.saturation) if channel.update(sat)
+        ]
@@ -0,0 +1,70 @@
+"""Clocks injected into the sensors, channels, alarm and main loop.
+
+time() is for intervals such as watering delays and alarm beeps, wall() for
+timestamps that are stored or shared with other processes. RealClock uses
+time.monotonic() so intervals are not thrown out when NTP steps the system
+clock. VirtualClock only moves when advanced or slept on, so a day of
+watering delays, alarm intervals and snoozes runs in a fraction of a second.
+"""
+import time
+
+
+class RealClock:
+    """Monotonic time, sleeping for real."""
+
+    def time(self):
+        return time.monotonic()
+
+    def wall(self):
+        return time.time()
+
+    def to_wall(self, t):
+        """Convert a time() value to a Unix timestamp."""
+        return t + time.time() - time.monotonic()
+
+    def from_wall(self, timestamp):
+        """Convert a Unix timestamp to a time() value."""
+        return timestamp - time.time() + time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def wait(self, event, timeout):
+        """Wait for a threading.Event for up to timeout seconds."""
+        return event.wait(timeout)
+
+
+class VirtualClock:
+    """A clock that only moves when told to. time() and wall() are the same."""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def wall(self):
+        return self.now
+
+    def to_wall(self, t):
+        return t
+
+    def from_wall(self, timestamp):
+        return timestamp
+
+    def set(self, now):
+        self.now = now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def wait(self, event, timeout):
+        if not event.is_set():
+            self.now += timeout
+        return event.is_set()
+
+
+real_clock = RealClock()
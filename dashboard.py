@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""Local web dashboard for plants.db.
+
+    python3 dashboard.py --port 8080
+
+then open http://<pi>:8080/ in a browser. The page draws charts from JSON
+endpoints that can also be used directly:
+
+    /api/channels
+    /api/readings?channel=1&start=2025-11-01&end=2025-12-01&points=800&field=moisture
+    /api/sensors?field=temp&days=30&points=800     (temp or light)
+    /api/pumps?channel=1&start=...&end=...
+
+start and end default to days (7) before now, and now. Series are
+downsampled to at most points with Largest-Triangle-Three-Buckets, which
+keeps the peaks and dips a plain average would flatten. Time values
+are the logged local time as seconds since 1970, so the page shows them as
+UTC to get the same wall-clock time back.
+
+Responses are kept in an LRU cache that is emptied whenever PRAGMA
+data_version says another connection has written to the database. Each
+response has an ETag, so a browser refreshing an unchanged chart gets a
+304 with no body.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from database import DB_PATH, setup_database
+
+# ====== CONFIG ======
+HOST = "0.0.0.0"
+PORT = 8080
+CACHE_SIZE = 128
+DEFAULT_POINTS = 800
+MAX_POINTS = 5000
+# ====================
+
+SENSOR_FIELDS = {"temp", "light"}
+READING_FIELDS = {"moisture", "smoothed", "drying_rate", "raw"}
+
+
+def lttb(points, threshold):
+    """Downsample [(x, y)] to threshold points with Largest-Triangle-Three-Buckets."""
+    if threshold >= len(points) or threshold < 3:
+        return points
+
+    sampled = [points[0]]
+    bucket_size = (len(points) - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, len(points))
+
+        # Average of the next bucket is the third corner of the triangle
+        next_bucket = points[end:next_end] or points[-1:]
+        avg_x = sum(p[0] for p in next_bucket) / len(next_bucket)
+        avg_y = sum(p[1] for p in next_bucket) / len(next_bucket)
+
+        ax, ay = points[a]
+        best = start
+        best_area = -1.0
+        for j in range(start, end):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best = j
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
+
+
+def time_range(query):
+    """start/end query values as timestamp strings, defaulting to the last days (7) up to now."""
+    end = query.get("end") or time.strftime("%Y-%m-%d %H:%M:%S")
+    start = query.get("start")
+    if not start:
+        days = float(query.get("days", 7))
+        start = (datetime.fromisoformat(end) - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+    return start, end
+
+
+class Dashboard:
+    """Run queries against plants.db, caching responses until the database changes."""
+
+    def __init__(self, db_path=DB_PATH, cache_size=CACHE_SIZE):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Only used to watch PRAGMA data_version, which changes when any other connection commits
+        self._watch = sqlite3.connect(db_path, check_same_thread=False)
+        self._data_version = None
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    def _check_version(self):
+        with self._lock:
+            version = self._watch.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._data_version:
+                self._data_version = version
+                self._cache.clear()
+
+    def get(self, path, query):
+        """Return (body bytes, gzipped body, etag) for an API path, or None if there's no such endpoint."""
+        key = (path, tuple(sorted(query.items())))
+        self._check_version()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+
+        handler = {
+            "/api/channels": self.channels,
+            "/api/readings": self.readings,
+            "/api/sensors": self.sensors,
+            "/api/pumps": self.pumps,
+        }.get(path)
+        if handler is None:
+            return None
+
+        body = json.dumps(handler(query), separators=(",", ":")).encode()
+        response = (body, gzip.compress(body, 5), f'"{hashlib.sha1(body).hexdigest()[:16]}"')
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = response
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return response
+
+    def _series(self, sql, params, points):
+        rows = self._conn().execute(sql, params).fetchall()
+        return {"count": len(rows), "points": lttb(rows, points)}
+
+    def channels(self, query):
+        return [row[0] for row in self._conn().execute("SELECT DISTINCT channel FROM readings ORDER BY channel")]
+
+    def readings(self, query):
+        field = query.get("field", "moisture")
+        if field not in READING_FIELDS:
+            raise ValueError(f"field must be one of {', '.join(sorted(READING_FIELDS))}")
+        start, end = time_range(query)
+        return self._series(
+            f"SELECT CAST(strftime('%s', timestamp) AS INTEGER), {field} FROM readings "
+            f"WHERE channel = ? AND timestamp >= ? AND timestamp < ? AND {field} IS NOT NULL ORDER BY timestamp",
+            (int(query.get("channel", 1)), start, end),
+            min(int(query.get("points", DEFAULT_POINTS)), MAX_POINTS),
+        )
+
+    def sensors(self, query):
+        field = query.get("field", "temp")
+        if field not in SENSOR_FIELDS:
+            raise ValueError(f"field must be one of {', '.join(sorted(SENSOR_FIELDS))}")
+        start, end = time_range(query)
+        return self._series(
+            f"SELECT CAST(strftime('%s', timestamp) AS INTEGER), {field} FROM sensors "
+            f"WHERE timestamp >= ? AND timestamp < ? AND {field} IS NOT NULL ORDER BY timestamp",
+            (start, end),
+            min(int(query.get("points", DEFAULT_POINTS)), MAX_POINTS),
+        )
+
+    def pumps(self, query):
+        start, end = time_range(query)
+        sql = "SELECT CAST(strftime('%s', timestamp) AS INTEGER), channel, rate, duration FROM pump_log " \
+              "WHERE timestamp >= ? AND timestamp < ?"
+        params = [start, end]
+        if "channel" in query:
+            sql += " AND channel = ?"
+            params.append(int(query["channel"]))
+        rows = self._conn().execute(sql + " ORDER BY timestamp LIMIT ?", (*params, MAX_POINTS)).fetchall()
+        return {"count": len(rows), "events": rows}
+
+
+PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>Plants</title>
+<style>
+body { font-family: sans-serif; background: #111; color: #ddd; margin: 1em; }
+canvas { width: 100%; height: 220px; background: #1b1b1b; margin-bottom: 1em; }
+select, button { font-size: 1em; }
+</style></head>
+<body>
+<h2>Plants <small id="status"></small></h2>
+<select id="channel"></select>
+<select id="days"><option value="1">24 hours</option><option value="7" selected>7 days</option>
+<option value="30">30 days</option><option value="365">1 year</option></select>
+<h3>Moisture %</h3><canvas id="moisture"></canvas>
+<h3>Temperature</h3><canvas id="temp"></canvas>
+<h3>UV</h3><canvas id="light"></canvas>
+<script>
+const fmt = d => new Date(d).toISOString().slice(0, 19).replace("T", " ");
+
+function draw(canvas, points, color, markers) {
+  const ctx = canvas.getContext("2d");
+  canvas.width = canvas.clientWidth; canvas.height = canvas.clientHeight;
+  ctx.clearRect(0, 0, canvas.width, canvas.height);
+  if (!points.length) return;
+  const xs = points.map(p => p[0]), ys = points.map(p => p[1]);
+  const x0 = Math.min(...xs), x1 = Math.max(...xs) || x0 + 1;
+  const y0 = Math.min(...ys), y1 = Math.max(...ys);
+  const sx = x => (x - x0) / (x1 - x0 || 1) * (canvas.width - 50) + 45;
+  const sy = y => canvas.height - 15 - (y - y0) / (y1 - y0 || 1) * (canvas.height - 30);
+  ctx.fillStyle = "#888"; ctx.font = "11px sans-serif";
+  ctx.fillText(y1.toFixed(1), 2, 15); ctx.fillText(y0.toFixed(1), 2, canvas.height - 15);
+  ctx.fillText(fmt(x0 * 1000), 45, canvas.height - 2);
+  ctx.fillText(fmt(x1 * 1000), canvas.width - 120, canvas.height - 2);
+  for (const t of markers || []) {
+    ctx.fillStyle = "#1f89fb"; ctx.fillRect(sx(t), 0, 1, canvas.height - 15);
+  }
+  ctx.strokeStyle = color; ctx.beginPath();
+  points.forEach((p, i) => i ? ctx.lineTo(sx(p[0]), sy(p[1])) : ctx.moveTo(sx(p[0]), sy(p[1])));
+  ctx.stroke();
+}
+
+async function load() {
+  const started = performance.now();
+  const channel = document.getElementById("channel").value;
+  const days = +document.getElementById("days").value;
+  // Leaving the start to the server keeps the URL, and so its cached response, the same until new data comes in
+  const range = `days=${days}&points=${Math.round(innerWidth / 100) * 100}`;
+  const get = url => fetch(url).then(r => r.json());
+  const [moisture, pumps, temp, light] = await Promise.all([
+    get(`/api/readings?channel=${channel}&${range}`),
+    get(`/api/pumps?channel=${channel}&${range}`),
+    get(`/api/sensors?field=temp&${range}`),
+    get(`/api/sensors?field=light&${range}`),
+  ]);
+  draw(document.getElementById("moisture"), moisture.points, "#63ff7c", pumps.events.map(e => e[0]));
+  draw(document.getElementById("temp"), temp.points, "#fedb52");
+  draw(document.getElementById("light"), light.points, "#f7003f");
+  document.getElementById("status").textContent =
+    `${moisture.count} readings, ${pumps.count} pump runs, ${Math.round(performance.now() - started)}ms`;
+}
+
+fetch("/api/channels").then(r => r.json()).then(channels => {
+  const select = document.getElementById("channel");
+  for (const c of channels) select.add(new Option(`Channel ${c}`, c));
+  select.onchange = load; document.getElementById("days").onchange = load;
+  load();
+});
+</script></body></html>
+""".encode()
+
+
+def serve(dashboard, host=HOST, port=PORT):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/":
+                self._send(200, PAGE, "text/html; charset=utf-8")
+                return
+
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            try:
+                response = dashboard.get(url.path, query)
+            except (ValueError, sqlite3.Error) as e:
+                self._send(400, json.dumps({"error": str(e)}).encode(), "application/json")
+                return
+            if response is None:
+                self._send(404, b'{"error":"not found"}', "application/json")
+                return
+
+            body, gzipped, etag = response
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                self._send(200, gzipped, "application/json", etag, {"Content-Encoding": "gzip"})
+            else:
+                self._send(200, body, "application/json", etag)
+
+        def _send(self, status, body, content_type, etag=None, headers=None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            if etag is not None:
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "no-cache")
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    logging.info("Dashboard on http://%s:%d/", host, port)
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+    setup_database(args.db)
+    serve(Dashboard(args.db), args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
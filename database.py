@@ -1,37 +1,48 @@
 #!/usr/bin/env python3
+"""Log sensor readings and pump events to plants.db.
+
+grow-monitor logs moisture itself through DatabaseLogger, so running this
+script (eg: from cron) only adds the Arduino temperature/UV readings and new
+pump events. Pass --moisture to also read the moisture sensors directly, for
+setups where grow-monitor is not running.
+"""
 import os
 import re
+import sys
 import json
 import time
-import serial
 import sqlite3
+import threading
 from datetime import datetime
-from grow.moisture import Moisture
 
 # ====== CONFIG ======
 DB_PATH = "/home/jasonvega/Desktop/project/plants.db"
 SERIAL_PORT = "/dev/ttyACM0"
 BAUD_RATE = 9600
-SERVICE_NAME = "grow-monitor.service"
 SYSLOG_PATH = "/var/log/syslog"
+SETTINGS_PATH = "/home/jasonvega/Desktop/project/settings.yml"
+JOURNAL_PATH = "/home/jasonvega/Desktop/project/journal.bin"
+ANOMALY_STATE_PATH = "/home/jasonvega/Desktop/project/anomaly_state.json"
 # ====================
 
 # --- Moisture Sensor Setup ---
-m1 = Moisture(1)
-m2 = Moisture(2)
-m3 = Moisture(3)
+# Only created by read_moisture, grow-monitor owns these pins when it is running
+sensors = []
 
 dry_points = [27, 27, 27]
 wet_points = [3, 3, 3]
 
+# Water moved per second at full speed, the Grow pumps move roughly 20ml/sec
+FLOW_ML_PER_SEC = 20.0
+
 
 # ==========================
 # Database Functions
 # ==========================
 
-def setup_database():
-    """Create the sensors and pump_log tables if they don't exist."""
-    conn = sqlite3.connect(DB_PATH)
+def setup_database(db_path=DB_PATH):
+    """Create the sensors, readings and pump_log tables if they don't exist."""
+    conn = sqlite3.connect(db_path)
     c = conn.cursor()
     c.execute("""
         CREATE TABLE IF NOT EXISTS sensors (
@@ -44,6 +55,35 @@ def setup_database():
             moisture_3 REAL
         )
     """)
+    # Time range lookups, for the dashboard
+    c.execute("CREATE INDEX IF NOT EXISTS sensors_time ON sensors (timestamp)")
+    # One row per channel per reading, so any number of channels fits
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            channel INTEGER,
+            moisture REAL
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS readings_channel_time ON readings (channel, timestamp)")
+    add_columns(c, "readings", {
+        "smoothed": "REAL",
+        "drying_rate": "REAL",
+        "raw": "REAL",
+        "calibration_id": "INTEGER",
+    })
+    migrate_sensors_to_readings(c)
+    # Every wet/dry point pair a channel has used, so percentages can be re-derived from raw
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS calibrations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created TEXT,
+            channel INTEGER,
+            wet_point REAL,
+            dry_point REAL
+        )
+    """)
     c.execute("""
         CREATE TABLE IF NOT EXISTS pump_log (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -53,21 +93,176 @@ def setup_database():
             duration REAL
         )
     """)
+    c.execute("CREATE INDEX IF NOT EXISTS pump_log_time ON pump_log (timestamp)")
+    # Events read from grow-monitor's journal, and how far each journal has been read
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            kind TEXT,
+            channel INTEGER,
+            data TEXT
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS events_time ON events (timestamp)")
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS journal_offsets (
+            path TEXT PRIMARY KEY,
+            offset INTEGER
+        )
+    """)
     conn.commit()
     conn.close()
 
 
-def log_to_db(timestamp, temp, light, m1_val, m2_val, m3_val):
-    """Insert sensor data into the database."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+def parse_time(timestamp):
+    """Unix time of a timestamp as stored in plants.db."""
+    return datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").timestamp()
+
+
+def add_columns(c, table, columns):
+    """Add any of columns ({name: type}) missing from an existing table."""
+    existing = {row[1] for row in c.execute(f"PRAGMA table_info({table})")}
+    for name, column_type in columns.items():
+        if name not in existing:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+
+def migrate_sensors_to_readings(c):
+    """Copy the old fixed moisture_1..3 columns into readings, once."""
+    if c.execute("SELECT 1 FROM readings LIMIT 1").fetchone():
+        return
     c.execute("""
-        INSERT INTO sensors (timestamp, temp, light, moisture_1, moisture_2, moisture_3)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (timestamp, temp, light, m1_val, m2_val, m3_val))
+        INSERT INTO readings (timestamp, channel, moisture)
+        SELECT timestamp, channel, moisture FROM (
+            SELECT timestamp, 1 AS channel, moisture_1 AS moisture FROM sensors
+            UNION ALL SELECT timestamp, 2, moisture_2 FROM sensors
+            UNION ALL SELECT timestamp, 3, moisture_3 FROM sensors
+        )
+        WHERE moisture IS NOT NULL
+        ORDER BY timestamp, channel
+    """)
+
+
+def calibration_id(c, channel, wet_point, dry_point):
+    """Return the id of a channel's current calibration, adding a version when it changes."""
+    row = c.execute(
+        "SELECT id, wet_point, dry_point FROM calibrations WHERE channel = ? ORDER BY id DESC LIMIT 1",
+        (channel,),
+    ).fetchone()
+    if row is not None and (row[1], row[2]) == (wet_point, dry_point):
+        return row[0]
+    c.execute(
+        "INSERT INTO calibrations (created, channel, wet_point, dry_point) VALUES (?, ?, ?, ?)",
+        (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), channel, wet_point, dry_point),
+    )
+    return c.lastrowid
+
+
+def log_readings(c, timestamp, readings):
+    """Insert one readings row per channel.
+
+    Each reading is a dict with "channel" and "moisture" (%), and optionally
+    "raw" (pulses/sec), "wet_point"/"dry_point", "smoothed" and "drying_rate".
+    """
+    rows = []
+    for reading in readings:
+        calibration = None
+        if reading.get("wet_point") is not None:
+            calibration = calibration_id(c, reading["channel"], reading["wet_point"], reading["dry_point"])
+        rows.append((
+            timestamp,
+            reading["channel"],
+            reading["moisture"],
+            reading.get("raw"),
+            calibration,
+            reading.get("smoothed"),
+            reading.get("drying_rate"),
+        ))
+    c.executemany("""
+        INSERT INTO readings (timestamp, channel, moisture, raw, calibration_id, smoothed, drying_rate)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+
+
+def log_to_db(timestamp, temp, light, moisture, db_path=DB_PATH, raw=None):
+    """Insert sensor data into the database.
+
+    moisture is a list of percentages, one per channel starting at channel 1,
+    and raw the matching pulses/sec readings if known.
+    The sensors row is skipped when there is no temperature or light reading.
+    """
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    if temp is not None or light is not None:
+        c.execute("""
+            INSERT INTO sensors (timestamp, temp, light)
+            VALUES (?, ?, ?)
+        """, (timestamp, temp, light))
+    log_readings(c, timestamp, [
+        {
+            "channel": i + 1,
+            "moisture": value,
+            "raw": raw[i] if raw else None,
+            "wet_point": wet_points[i] if raw else None,
+            "dry_point": dry_points[i] if raw else None,
+        }
+        for i, value in enumerate(moisture)
+    ])
     conn.commit()
     conn.close()
-    print(f"✅ Saved to database: Temp={temp}, UV={light}, M1={m1_val}%, M2={m2_val}%, M3={m3_val}%")
+    levels = ", ".join(f"M{i + 1}={value}%" for i, value in enumerate(moisture))
+    print(f"✅ Saved to database: Temp={temp}, UV={light}, {levels}")
+
+
+class DatabaseLogger(threading.Thread):
+    """Log a running grow-monitor's channel readings every interval seconds.
+
+    Reads the saturation the main loop already batched in its
+    ChannelRegistry, so no GPIO is touched and the in-memory sensor history
+    survives.
+    """
+
+    def __init__(self, channels, interval=300, db_path=DB_PATH):
+        threading.Thread.__init__(self, name="db-logger", daemon=True)
+        self.channels = channels
+        self.interval = interval
+        self.db_path = db_path
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def log_once(self):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        readings = []
+        for i, channel in enumerate(self.channels):
+            reading = {
+                "channel": channel.channel,
+                "moisture": round(self.channels.saturation[i] * 100, 1),
+                "raw": round(self.channels.moisture[i], 3),
+                "wet_point": channel.wet_point,
+                "dry_point": channel.dry_point,
+            }
+            if channel.stats.count:
+                reading["smoothed"] = round(channel.stats.ewma * 100, 1)
+                reading["drying_rate"] = round(channel.stats.drying_rate * 100, 3)
+            readings.append(reading)
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            log_readings(conn.cursor(), timestamp, readings)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def run(self):
+        setup_database(self.db_path)
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.log_once()
+            except sqlite3.Error as e:
+                print(f"⚠️ Error logging to database: {e}")
 
 
 # ==========================
@@ -91,6 +286,12 @@ SYSLOG_PATHS = [
 
 DB_PATH = "/home/jasonvega/Desktop/project/plants.db"
 
+# Pattern matches: 2025-11-04 12:00:57,269 INFO: Watering Channel: 1 - rate 0.60 for 1.00sec
+WATERING_MARKER = "Watering Channel"
+WATERING_PATTERN = re.compile(
+    r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),\d+ .*Watering Channel: (\d+) - rate ([\d.]+) for ([\d.]+)sec"
+)
+
 def log_pump_events():
     """Parse Grow HAT watering events from current and previous syslog, store only new events with real timestamps."""
     
@@ -109,18 +310,15 @@ def log_pump_events():
         )
     """)
 
-    # Pattern matches: 2025-11-04 12:00:57,269 INFO: Watering Channel: 1 - rate 0.60 for 1.00sec
-    pattern = re.compile(
-        r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),\d+ .*Watering Channel: (\d+) - rate ([\d.]+) for ([\d.]+)sec"
-    )
-
     events = []
 
     for path in SYSLOG_PATHS:
         try:
             with open(path, "r") as f:
                 for line in f:
-                    match = pattern.search(line)
+                    if WATERING_MARKER not in line:
+                        continue
+                    match = WATERING_PATTERN.search(line)
                     if match:
                         timestamp = match.group(1)
                         channel = int(match.group(2))
@@ -154,10 +352,150 @@ def log_pump_events():
     else:
         print("ℹ️ No new pump events found.")
 
+# ==========================
+# Journal reader
+# ==========================
+
+def log_journal_events(journal_path=JOURNAL_PATH, db_path=DB_PATH):
+    """Copy events added to grow-monitor's journal since the last run into events and pump_log."""
+    from journal import JournalReader
+
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    row = c.execute("SELECT offset FROM journal_offsets WHERE path = ?", (journal_path,)).fetchone()
+    offset = row[0] if row else 0
+
+    reader = JournalReader(journal_path)
+    try:
+        if offset > reader.size:
+            print(f"⚠️ {journal_path} is shorter than the saved offset, reading it from the start.")
+            offset = 0
+        events, offset = reader.read(offset)
+    finally:
+        reader.close()
+
+    rows = [
+        (
+            datetime.fromtimestamp(event.timestamp).strftime("%Y-%m-%d %H:%M:%S"),
+            event.kind,
+            event.channel,
+            json.dumps(event.data),
+        )
+        for event in events
+    ]
+    # A journal read again from the start, or a watering log_pump_events already took from
+    # syslog, must not be logged twice. Only rows from before this run count, so two
+    # identical events within the same second of the journal are both kept.
+    last_event = c.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+    last_pump = c.execute("SELECT COALESCE(MAX(id), 0) FROM pump_log").fetchone()[0]
+    c.executemany(
+        """
+        INSERT INTO events (timestamp, kind, channel, data)
+        SELECT ?, ?, ?, ?
+        WHERE NOT EXISTS (
+            SELECT 1 FROM events
+            WHERE timestamp = ? AND kind = ? AND channel IS ? AND data = ? AND id <= ?
+        )
+        """,
+        [row + row + (last_event,) for row in rows],
+    )
+    added = c.rowcount
+    c.executemany(
+        """
+        INSERT INTO pump_log (timestamp, channel, rate, duration)
+        SELECT ?, ?, ?, ?
+        WHERE NOT EXISTS (
+            SELECT 1 FROM pump_log
+            WHERE timestamp = ? AND channel = ? AND duration = ? AND id <= ?
+        )
+        """,
+        [
+            (timestamp, channel, event.data["speed"], event.data["seconds"],
+             timestamp, channel, event.data["seconds"], last_pump)
+            for event, (timestamp, _, channel, _) in zip(events, rows)
+            if event.kind == "watering"
+        ],
+    )
+    c.execute("INSERT OR REPLACE INTO journal_offsets (path, offset) VALUES (?, ?)", (journal_path, offset))
+    conn.commit()
+    conn.close()
+
+    if added > 0:
+        print(f"✅ Logged {added} new journal event(s).")
+    elif events:
+        print(f"ℹ️ All {len(events)} journal event(s) were already logged.")
+    else:
+        print("ℹ️ No new journal events found.")
+
+
+# ==========================
+# Arduino anomaly detection
+# ==========================
+
+def check_arduino_anomalies(timestamp, temp, uv, state_path=ANOMALY_STATE_PATH, db_path=DB_PATH):
+    """Run the temperature and UV anomaly detectors, keeping their state between cron runs."""
+    from anomaly import temperature_detector, uv_detector
+
+    detectors = {"temperature": temperature_detector(), "uv": uv_detector()}
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+        for name, detector in detectors.items():
+            if name in state:
+                detector.load_dict(state[name])
+    except (OSError, ValueError, KeyError):
+        pass
+
+    now = time.time()
+    rows = []
+    for name, value in (("temperature", temp), ("uv", uv)):
+        if value is None:
+            continue
+        detectors[name].add(now, value)
+        for kind, started in detectors[name].drain_changes():
+            print(f"⚠️ {name.capitalize()} {kind} {'detected' if started else 'cleared'} at {value}")
+            data = {"sensor": name, "kind": kind, "started": started, "value": value}
+            rows.append((timestamp, "anomaly", 0, json.dumps(data)))
+
+    if rows:
+        conn = sqlite3.connect(db_path)
+        conn.executemany("INSERT INTO events (timestamp, kind, channel, data) VALUES (?, ?, ?, ?)", rows)
+        conn.commit()
+        conn.close()
+
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({name: detector.to_dict() for name, detector in detectors.items()}, f)
+    os.replace(tmp_path, state_path)
+
+
 # ==========================
 # Moisture Sensor Functions
 # ==========================
 
+def load_settings(settings_path=SETTINGS_PATH):
+    """grow-monitor's settings.yml, or None if it cannot be read."""
+    try:
+        import yaml
+        with open(settings_path) as f:
+            return yaml.safe_load(f) or {}
+    except (ImportError, OSError) as e:
+        print(f"⚠️ Could not read {settings_path}: {e}")
+        return None
+
+
+def load_points(settings_path=SETTINGS_PATH):
+    """Use grow-monitor's (possibly auto-calibrated) wet/dry points from settings.yml."""
+    settings = load_settings(settings_path)
+    if settings is None:
+        print("⚠️ Using default wet/dry points")
+        return
+    for i in range(len(dry_points)):
+        channel = settings.get(f"channel{i + 1}") or {}
+        dry_points[i] = channel.get("dry_point", dry_points[i])
+        wet_points[i] = channel.get("wet_point", wet_points[i])
+
+
 def moisture_percentage(reading, dry, wet):
     """Convert raw moisture reading to a 0–100% scale."""
     if dry <= wet:
@@ -175,27 +513,60 @@ def safe_read(sensor):
         return None
 
 
+def read_live_moisture(max_age=60):
+    """Return raw readings published by a running grow-monitor, or None."""
+    try:
+        import livestate
+        snapshot = livestate.read()
+    except (OSError, ValueError):
+        return None
+    if time.time() - snapshot.timestamp > max_age:
+        return None
+    return [channel.moisture for channel in snapshot.channels[:len(dry_points)]]
+
+
 def read_moisture():
-    """Read all moisture sensors and return their percentages."""
+    """Read all moisture sensors and return their percentages and raw pulses/sec."""
     try:
+        load_points()
+        readings = read_live_moisture()
+        if readings is not None:
+            pct = [
+                moisture_percentage(readings[i], dry_points[i], wet_points[i])
+                for i in range(len(readings))
+            ]
+            print("💧 Moisture (live): " + "  ".join(f"{i + 1}={value:.1f}%" for i, value in enumerate(pct)))
+            return pct, readings
+
+        if not sensors:
+            # Same pins, HATs and pulse counter as grow-monitor's channels
+            from channel import channel_layout, moisture_counter
+            from moisture import Moisture
+            settings = load_settings() or {}
+            counter = moisture_counter(settings)
+            sensors.extend(
+                Moisture(sensor, gpio_pin=sensor_pin, counter=counter)
+                for _, sensor, _, sensor_pin, _ in channel_layout(settings)[:len(dry_points)]
+            )
+
         # double-read to stabilize sensor output
-        _ = [safe_read(m) for m in (m1, m2, m3)]
+        _ = [safe_read(m) for m in sensors]
         time.sleep(2.0)
-        readings = [safe_read(m) for m in (m1, m2, m3)]
+        readings = [safe_read(m) for m in sensors]
 
         if any(r is None for r in readings):
             raise ValueError("One or more moisture readings failed")
 
         pct = [
             moisture_percentage(readings[i], dry_points[i], wet_points[i])
-            for i in range(3)
+            for i in range(len(sensors))
         ]
 
-        print(f"💧 Moisture: 1={pct[0]:.1f}%  2={pct[1]:.1f}%  3={pct[2]:.1f}%")
-        return pct
+        print("💧 Moisture: " + "  ".join(f"{i + 1}={value:.1f}%" for i, value in enumerate(pct)))
+        return pct, readings
     except Exception as e:
         print(f"⚠️ Error reading moisture sensors: {e}")
-        return (None, None, None)
+        return None, None
 
 
 # ==========================
@@ -207,6 +578,7 @@ def read_arduino_data():
     temp = None
     uv = None
     try:
+        import serial
         ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=10)
         sensors_needed = {"UV", "AmbientTemp"}
         sensors_seen = set()
@@ -250,34 +622,32 @@ def main():
 
     # Read sensors
     temp, uv = read_arduino_data()
-    m1_pct, m2_pct, m3_pct = read_moisture()
+    try:
+        check_arduino_anomalies(timestamp, temp, uv)
+    except OSError as e:
+        print(f"⚠️ Error checking for sensor anomalies: {e}")
+    moisture, raw = [], None
+    if "--moisture" in sys.argv:
+        moisture, raw = read_moisture()
 
     # Log readings
-    if all(v is not None for v in [m1_pct, m2_pct, m3_pct]):
-        log_to_db(timestamp, temp, uv, m1_pct, m2_pct, m3_pct)
+    if moisture is not None:
+        log_to_db(timestamp, temp, uv, moisture, raw=raw)
     else:
         print("⚠️ Skipping database log due to invalid moisture data.")
 
-    # Log pump activity (parses the last ~200 lines of syslog)
+    # Log pump activity from grow-monitor's journal, or by parsing syslog without one
     try:
-        log_pump_events()
+        if os.path.exists(JOURNAL_PATH):
+            log_journal_events()
+        else:
+            log_pump_events()
     except Exception as e:
         print(f"⚠️ Error logging pump events: {e}")
 
 
-# ==========================
-# Safe Service Control Wrapper
-# ==========================
-
 if __name__ == "__main__":
-    print(f"⏸️  Stopping {SERVICE_NAME} ...")
-    os.system(f"sudo systemctl stop {SERVICE_NAME}")
-
     try:
         main()
     except Exception as e:
         print("⚠️ Script error:", e)
-    finally:
-        print(f"▶️  Restarting {SERVICE_NAME} ...")
-        os.system(f"sudo systemctl start {SERVICE_NAME}")
-        print("✅ Grow monitor service restarted.")
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Export plants.db tables as CSV or NDJSON, in constant memory however big they get.
+
+    python3 export.py readings --start 2025-11-01 --end 2025-12-01 -o november.csv.gz
+    python3 export.py pump_log --format ndjson --channel 2 > pumps.ndjson
+    python3 export.py sensors --gzip | ssh laptop 'cat > sensors.csv.gz'
+
+Rows are stepped through with a SQLite cursor and fetched CHUNK at a time,
+then written as they arrive, so only one chunk is held in memory. Time
+ranges use the timestamp indexes, so rows come out in time order without
+SQLite sorting the table first. readings come out channel by channel: its
+index is (channel, timestamp), so a time range without --channel is read
+as one range per channel, each channel found with an index seek, rather
+than by scanning the whole index.
+Output ending in .gz, or --gzip, is compressed on the fly. Rows per second
+are reported on stderr.
+
+From Python:
+
+    with open("readings.ndjson", "w") as out:
+        export(DB_PATH, "readings", out, "ndjson", start="2025-11-01")
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import sqlite3
+import sys
+import time
+
+from database import DB_PATH
+
+# table: ORDER BY, matching an index so the rows stream instead of being sorted
+TABLES = {
+    "sensors": "timestamp",
+    "readings": "channel, timestamp",
+    "pump_log": "timestamp",
+    "events": "timestamp",
+}
+FORMATS = ("csv", "ndjson")
+CHUNK = 5000
+
+
+def query(conn, table, start=None, end=None, channel=None):
+    """Return a cursor over table, filtered to start <= timestamp < end and channel."""
+    if table not in TABLES:
+        raise ValueError(f"table must be one of {', '.join(TABLES)}")
+    where = []
+    params = []
+    if start is not None:
+        where.append("timestamp >= ?")
+        params.append(start)
+    if end is not None:
+        where.append("timestamp < ?")
+        params.append(end)
+    if channel is not None:
+        if table == "sensors":
+            raise ValueError("sensors has no channel column")
+        where.append("channel = ?")
+        params.append(channel)
+    sql = f"SELECT * FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return conn.execute(f"{sql} ORDER BY {TABLES[table]}", params)
+
+
+def channels(conn):
+    """Yield the channels in readings, each found by a seek on its index instead of a scan."""
+    channel = conn.execute("SELECT MIN(channel) FROM readings").fetchone()[0]
+    while channel is not None:
+        yield channel
+        channel = conn.execute("SELECT MIN(channel) FROM readings WHERE channel > ?", (channel,)).fetchone()[0]
+
+
+def iter_channel_ranges(conn, start, end, chunk=CHUNK):
+    """Yield readings between start and end a channel at a time, each a range on (channel, timestamp)."""
+    for channel in list(channels(conn)):
+        yield from iter_rows(query(conn, "readings", start, end, channel), chunk)
+
+
+def iter_rows(cursor, chunk=CHUNK):
+    """Yield the cursor's rows, fetching chunk at a time."""
+    while True:
+        rows = cursor.fetchmany(chunk)
+        if not rows:
+            return
+        yield from rows
+
+
+def write_csv(out, columns, rows):
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_ndjson(out, columns, rows):
+    encode = json.JSONEncoder(separators=(",", ":")).encode
+    count = 0
+    for row in rows:
+        out.write(encode(dict(zip(columns, row))))
+        out.write("\n")
+        count += 1
+    return count
+
+
+def export(db_path, table, out, fmt="csv", start=None, end=None, channel=None, chunk=CHUNK):
+    """Write table to the text stream out as fmt, returning the number of rows."""
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        if table == "readings" and channel is None and (start is not None or end is not None):
+            columns = [column[0] for column in conn.execute("SELECT * FROM readings LIMIT 0").description]
+            rows = iter_channel_ranges(conn, start, end, chunk)
+        else:
+            cursor = query(conn, table, start, end, channel)
+            columns = [column[0] for column in cursor.description]
+            rows = iter_rows(cursor, chunk)
+        writer = write_csv if fmt == "csv" else write_ndjson
+        return writer(out, columns, rows)
+    finally:
+        conn.close()
+
+
+def open_output(path, compress):
+    """Text stream for path, or stdout for None/-, gzipped when compress is set."""
+    if path is None or path == "-":
+        if compress:
+            return io.TextIOWrapper(gzip.GzipFile(fileobj=sys.stdout.buffer, mode="wb", compresslevel=6), newline="")
+        return io.TextIOWrapper(sys.stdout.buffer, newline="", write_through=False)
+    if compress:
+        return gzip.open(path, "wt", compresslevel=6, newline="")
+    return open(path, "w", newline="")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("table", choices=TABLES)
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--format", choices=FORMATS, help="default: from the output name, else csv")
+    parser.add_argument("--start", help="eg: 2025-11-01 or 2025-11-01 06:00:00")
+    parser.add_argument("--end", help="exclusive, same format as --start")
+    parser.add_argument("--channel", type=int)
+    parser.add_argument("-o", "--output", help="file to write, default stdout")
+    parser.add_argument("--gzip", action="store_true", help="compress (implied by a .gz output name)")
+    parser.add_argument("--chunk", type=int, default=CHUNK, help="rows fetched from SQLite at a time")
+    args = parser.parse_args()
+
+    name = (args.output or "").removesuffix(".gz")
+    fmt = args.format or ("ndjson" if name.endswith((".ndjson", ".jsonl")) else "csv")
+    compress = args.gzip or (args.output or "").endswith(".gz")
+
+    start = time.perf_counter()
+    out = open_output(args.output, compress)
+    try:
+        count = export(args.db, args.table, out, fmt, args.start, args.end, args.channel, args.chunk)
+    except (ValueError, sqlite3.Error) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        out.close()
+    elapsed = time.perf_counter() - start
+    print(
+        f"✅ Exported {count} {args.table} row(s) in {elapsed:.2f}s ({count / max(elapsed, 1e-9):.0f} rows/s)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
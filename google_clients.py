@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Google Sheets and Photos clients built from discovery documents cached on disk.
+
+build('sheets', 'v4') parses the API's discovery document every run, and
+older googleapiclient releases (like Raspberry Pi OS's python3-googleapi)
+download it over HTTPS first. Here each document is kept in DISCOVERY_DIR
+as <api>.<version>.json, with the revision it came from. It is taken from
+googleapiclient's bundled copy, or downloaded when there isn't one, and
+refreshed after MAX_AGE. Clients are then made with build_from_document.
+
+Nothing from googleapiclient or google.auth is imported until a client is
+actually built, so a cron run with nothing to upload never pays for them.
+
+Run directly to compare the startup cost of the old way with this one,
+each in a fresh interpreter:
+
+    python3 google_clients.py --benchmark
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# ====== CONFIG ======
+BASE_DIR = "/home/jasonvega/Desktop/project"
+DISCOVERY_DIR = os.path.join(BASE_DIR, "discovery")
+MAX_AGE = 30 * 24 * 3600
+DISCOVERY_URL = "https://{api}.googleapis.com/$discovery/rest?version={version}"
+# ====================
+
+
+def _fetch(api, version):
+    try:
+        from googleapiclient.discovery_cache import get_static_doc
+
+        document = get_static_doc(api, version)
+        if document is not None:
+            return document
+    except ImportError:
+        pass
+    import urllib.request
+
+    with urllib.request.urlopen(DISCOVERY_URL.format(api=api, version=version), timeout=10) as response:
+        return response.read().decode()
+
+
+def discovery_document(api, version, cache_dir=DISCOVERY_DIR, max_age=MAX_AGE):
+    """Return the discovery document for api/version as JSON text, from the disk cache when it's fresh enough."""
+    path = os.path.join(cache_dir, f"{api}.{version}.json")
+    try:
+        age = time.time() - os.path.getmtime(path)
+    except OSError:
+        age = None
+    if age is not None and age < max_age:
+        with open(path) as file:
+            return file.read()
+
+    try:
+        document = _fetch(api, version)
+        revision = json.loads(document).get("revision")
+    except (OSError, ValueError) as e:
+        if age is None:
+            raise
+        print(f"⚠️ Couldn't refresh the {api} {version} discovery document, using the cached one: {e}")
+        os.utime(path)
+        with open(path) as file:
+            return file.read()
+
+    if age is not None:
+        with open(path) as file:
+            cached = json.loads(file.read()).get("revision")
+        if cached != revision:
+            print(f"📄 {api} {version} discovery document updated from revision {cached} to {revision}")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as file:
+        file.write(document)
+    os.replace(tmp, path)
+    return document
+
+
+def build_client(api, version, credentials=None, http=None, endpoint=None):
+    """Build a googleapiclient Resource from the cached discovery document.
+
+    endpoint replaces the API's root URL, eg: to talk to a local fake server
+    with an unauthenticated http.
+    """
+    from googleapiclient.discovery import build_from_document
+
+    client_options = {"api_endpoint": endpoint} if endpoint else None
+    return build_from_document(
+        discovery_document(api, version),
+        credentials=credentials,
+        http=http,
+        client_options=client_options,
+    )
+
+
+def sheets(credentials=None, http=None, endpoint=None):
+    return build_client("sheets", "v4", credentials, http, endpoint)
+
+
+def photos(credentials=None, http=None, endpoint=None):
+    # Photos needs static_discovery=False with build(), so this is where the cache saves a download every run
+    return build_client("photoslibrary", "v1", credentials, http, endpoint)
+
+
+BENCHMARKS = {
+    "eager imports + build()": (
+        "import google.oauth2.credentials, google_auth_oauthlib.flow, google.auth.transport.requests\n"
+        "import httplib2\n"
+        "from googleapiclient.discovery import build\n"
+        "build('sheets', 'v4', http=httplib2.Http())\n"
+    ),
+    "lazy, nothing to upload": "import google_clients\n",
+    "lazy + cached document": (
+        "import httplib2, google_clients\n"
+        "google_clients.sheets(http=httplib2.Http())\n"
+    ),
+    "bare interpreter": "pass\n",
+}
+
+
+def benchmark(runs=5):
+    """Return {name: best wall time} for each BENCHMARKS snippet, run in a fresh python3."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    # Warm the cache so the lazy runs measure reading it, not filling it
+    discovery_document("sheets", "v4")
+    results = {}
+    for name, code in BENCHMARKS.items():
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], cwd=here, check=True)
+            times.append(time.perf_counter() - start)
+        results[name] = min(times)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--benchmark", action="store_true", help="time startup the old way and the cached way")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--refresh", action="store_true", help="fetch the Sheets and Photos documents now")
+    args = parser.parse_args()
+
+    if args.refresh:
+        for api, version in (("sheets", "v4"), ("photoslibrary", "v1")):
+            document = json.loads(discovery_document(api, version, max_age=0))
+            print(f"✅ {api} {version} revision {document.get('revision')}")
+
+    if args.benchmark:
+        baseline = None
+        for name, seconds in benchmark(args.runs).items():
+            baseline = baseline or seconds
+            print(f"{name:28} {seconds * 1000:7.0f}ms  ({seconds / baseline * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
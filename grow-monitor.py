@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
+import collections
 import logging 
 #test
 import math
 import pathlib
 import random
+import socket
 import sys
 import threading
 import time
@@ -15,9 +17,17 @@ from fonts.ttf import RobotoMedium as UserFont
 from PIL import Image, ImageDraw, ImageFont
 
 import yaml
+from database import DB_PATH, DatabaseLogger
+import history_store
+from alarm import SNOOZE_DURATION, AlarmState
+from calibration import CalibrationStore
+from channel import COLOR_BLUE, ChannelRegistry
+from clock import real_clock
 from grow import Piezo
-from grow.moisture import Moisture
-from grow.pump import Pump
+from journal import JournalWriter
+from livestate import LiveStateWriter
+from rollups import SPANS, RollupLoader
+from telemetry import TelemetryPublisher
 
 
 FPS = 10
@@ -29,12 +39,12 @@ DISPLAY_WIDTH = 160
 DISPLAY_HEIGHT = 80
 
 COLOR_WHITE = (255, 255, 255)
-COLOR_BLUE = (31, 137, 251)
-COLOR_GREEN = (99, 255, 124)
-COLOR_YELLOW = (254, 219, 82)
-COLOR_RED = (247, 0, 63)
 COLOR_BLACK = (0, 0, 0)
 
+# Horizontal space between the left and right icons used for channel bars
+CHANNEL_AREA_X = 33
+CHANNEL_AREA_WIDTH = 96
+
 
 # Only the ALPHA channel is used from these images
 icon_drop = Image.open("icons/icon-drop.png").convert("RGBA")
@@ -49,7 +59,16 @@ icon_backdrop = Image.open("icons/icon-backdrop.png").convert("RGBA")
 icon_return = Image.open("icons/icon-return.png").convert("RGBA")
 
 
+def channel_slots(count, margin=2):
+    """Return (x, width) of each channel's bar, scaled to fit count channels."""
+    width = max(1, CHANNEL_AREA_WIDTH // max(1, count) - margin)
+    return [(CHANNEL_AREA_X + (width + margin) * i, width) for i in range(count)]
+
+
 class View:
+    # Drives the animations, shared by every view unless replaced
+    clock = real_clock
+
     def __init__(self, image):
         self._image = image
         self._draw = ImageDraw.Draw(image)
@@ -180,7 +199,7 @@ class View:
 class MainView(View):
     """Main overview.
 
-    Displays three channels and alarm indicator/snooze.
+    Displays every channel and alarm indicator/snooze.
 
     """
 
@@ -190,20 +209,12 @@ class MainView(View):
 
         View.__init__(self, image)
 
-    def render_channel(self, channel):
-        bar_x = 33
-        bar_margin = 2
-        bar_width = 30
+    def render_channel(self, channel, slot):
+        x, bar_width = slot
         label_width = 16
         label_height = 16
         label_y = 0
 
-        x = [
-            bar_x,
-            bar_x + ((bar_width + bar_margin) * 1),
-            bar_x + ((bar_width + bar_margin) * 2),
-        ][channel.channel - 1]
-
         # Saturation amounts from each sensor
         saturation = channel.sensor.saturation
         active = channel.sensor.active and channel.enabled
@@ -221,6 +232,17 @@ class MainView(View):
             (x, y, x + bar_width - 1, y), (255, 0, 0) if channel.alarm else (0, 0, 0)
         )
 
+        # Too many channels for the icons, fall back to small numbers
+        if bar_width < label_width:
+            tw, th = self.font_small.getsize(str(channel.channel))
+            self._draw.text(
+                (x + (bar_width - tw) // 2, label_y + 1),
+                str(channel.channel),
+                font=self.font_small,
+                fill=(200, 200, 200) if active else (100, 100, 100),
+            )
+            return
+
         # Channel selection icons
         x += (bar_width - label_width) // 2
 
@@ -238,8 +260,8 @@ class MainView(View):
     def render(self):
         self.clear()
 
-        for channel in self.channels:
-            self.render_channel(channel)
+        for channel, slot in zip(self.channels, channel_slots(len(self.channels))):
+            self.render_channel(channel, slot)
 
         # Icons
         self.icon(icon_backdrop, (0, 0), COLOR_WHITE)
@@ -401,6 +423,19 @@ class ChannelView(View):
             fill=(255, 255, 255),
         )
 
+    def draw_trend(self, position):
+        """Draw the drying rate, alternating with the time until the alarm level."""
+        stats = self.channel.stats
+        if stats.count < 3:
+            return
+
+        text = f"{-stats.drying_rate * 100:+.1f}%/h"
+        eta = stats.time_until(self.channel.warn_level)
+        if eta is not None and self.clock.time() % 6 >= 3:
+            text = "alarm" if eta == 0 else f"in {eta / 3600:.1f}h"
+
+        self._draw.text(position, text, font=self.font_small, fill=(200, 200, 200))
+
     def draw_context(self, position, metric="Hz"):
         context = f"Now: {self.channel.sensor.moisture:.2f}Hz"
         if metric.lower() == "sat":
@@ -421,6 +456,10 @@ class DetailView(ChannelView):
 
     """
 
+    def __init__(self, image, channel=None, channels=None):
+        self.channels = channels if channels is not None else [channel]
+        ChannelView.__init__(self, image, channel)
+
     def render(self):
         self.clear()
 
@@ -432,10 +471,14 @@ class DetailView(ChannelView):
             graph_y = 8
 
             self.draw_status((graph_x, graph_y + graph_height + 4))
+            self.draw_trend((DISPLAY_WIDTH - 40, graph_y + graph_height + 7))
 
             self._draw.rectangle((graph_x, graph_y, graph_x + graph_width, graph_y + graph_height), (50, 50, 50))
 
             for x, value in enumerate(self.channel.sensor.history[:graph_width]):
+                # NaN marks readings missed while grow-monitor wasn't running
+                if math.isnan(value):
+                    continue
                 color = self.channel.indicator_color(value)
                 h = value * graph_height
                 x = graph_x + graph_width - x - 1
@@ -444,7 +487,7 @@ class DetailView(ChannelView):
             alarm_line = int(self.channel.warn_level * graph_height)
             r = 255
             if self.channel.alarm:
-                r = int(((math.sin(time.time() * 3 * math.pi) + 1.0) / 2.0) * 128) + 127
+                r = int(((math.sin(self.clock.time() * 3 * math.pi) + 1.0) / 2.0) * 128) + 127
 
             self._draw.rectangle(
                 (
@@ -473,14 +516,18 @@ class DetailView(ChannelView):
 
         # Channel icons
 
-        x_positions = [40, 72, 104]
-        label_x = x_positions[self.channel.channel - 1]
+        label_width = 16
+        x_positions = [
+            x + (width - label_width) // 2 for x, width in channel_slots(len(self.channels))
+        ]
+        label_x = x_positions[list(self.channels).index(self.channel)]
         label_y = 0
 
         active = self.channel.sensor.active and self.channel.enabled
 
-        for x in x_positions:
-            self.icon(icon_channel, (x, label_y - 10), (16, 16, 16))
+        if len(x_positions) * label_width <= CHANNEL_AREA_WIDTH:
+            for x in x_positions:
+                self.icon(icon_channel, (x, label_y - 10), (16, 16, 16))
 
         self.icon(icon_channel, (label_x, label_y), (200, 200, 200))
 
@@ -505,6 +552,75 @@ class DetailView(ChannelView):
         self.icon(icon_settings, (DISPLAY_WIDTH - 19 - 3, 3), (55, 55, 55))
 
 
+class HistoryView(ChannelView):
+    """Single channel history over a long span (24h, 7d) from plants.db.
+
+    Each column shows the lowest to highest saturation logged in its slice
+    of the span, dimmed, with the mean in the channel colour on top. The
+    rollups are loaded on the RollupLoader thread, render only draws the
+    last one it got.
+
+    """
+
+    def __init__(self, image, channel=None, rollups=None, title="24h"):
+        self.rollups = rollups
+        self.title = title
+        self.span = SPANS[title]
+        ChannelView.__init__(self, image, channel)
+
+    def render(self):
+        self.clear()
+
+        graph_height = DISPLAY_HEIGHT - 8 - 20
+        graph_width = DISPLAY_WIDTH - 64
+
+        graph_x = (DISPLAY_WIDTH - graph_width) // 2
+        graph_y = 8
+        bottom = graph_y + graph_height
+
+        self._draw.rectangle((graph_x, graph_y, graph_x + graph_width, bottom), (50, 50, 50))
+
+        rollup = self.rollups.get(self.channel.channel, self.span, graph_width)
+        if rollup is None:
+            status = "Loading..."
+        else:
+            filled = [column for column in rollup.columns if column is not None]
+            if filled:
+                low = min(column[0] for column in filled)
+                high = max(column[1] for column in filled)
+                status = f"{low * 100:.0f}-{high * 100:.0f}%"
+            else:
+                status = "No data"
+
+            for x, column in enumerate(rollup.columns):
+                if column is None:
+                    continue
+                low, high, mean = (min(max(value, 0.0), 1.0) for value in column)
+                color = self.channel.indicator_color(mean)
+                x += graph_x
+                self._draw.rectangle(
+                    (x, bottom - int(high * graph_height), x, bottom - int(low * graph_height)),
+                    tuple(c // 3 for c in color),
+                )
+                y = bottom - int(mean * graph_height)
+                self._draw.rectangle((x, y, x, y), color)
+
+        alarm_line = bottom - int(self.channel.warn_level * graph_height)
+        self._draw.rectangle((graph_x, alarm_line, graph_x + graph_width, alarm_line), (255, 0, 0))
+
+        self._draw.text((graph_x, bottom + 4), status, font=self.font, fill=COLOR_WHITE)
+        self._draw.text(
+            (DISPLAY_WIDTH - 40, bottom + 7),
+            f"Ch{self.channel.channel} {self.title}",
+            font=self.font_small,
+            fill=(200, 200, 200),
+        )
+
+        # Next subview
+        self.icon(icon_backdrop.rotate(180), (DISPLAY_WIDTH - 26, 0), COLOR_WHITE)
+        self.icon(icon_rightarrow, (DISPLAY_WIDTH - 19 - 3, 3), (55, 55, 55))
+
+
 class ChannelEditView(ChannelView, EditView):
     """Single channel edit."""
 
@@ -572,6 +688,13 @@ class ChannelEditView(ChannelView, EditView):
                 "help": "Frequency for fully dried soil",
                 "context": "hz",
             },
+            {
+                "title": "Auto Calibrate",
+                "prop": "auto_calibrate",
+                "mode": "bool",
+                "format": lambda value: "Yes" if value else "No",
+                "help": "Set wet/dry points from readings",
+            },
             {
                 "title": "Pump Time",
                 "prop": "pump_time",
@@ -701,197 +824,29 @@ def sendMessage(body, to=sms_recipient):
         _smtp = None
         return False
 
-class Channel:
-    colors = [
-        COLOR_BLUE,
-        COLOR_GREEN,
-        COLOR_YELLOW,
-        COLOR_RED
-    ]
-
-    def __init__(
-        self,
-        display_channel,
-        sensor_channel,
-        pump_channel,
-        title=None,
-        water_level=0.5,
-        warn_level=0.5,
-        pump_speed=0.5,
-        pump_time=0.2,
-        watering_delay=60,
-        wet_point=0.7,
-        dry_point=26.7,
-        icon=None,
-        auto_water=False,
-        enabled=False,
-    ):
-        self.channel = display_channel
-        self.sensor = Moisture(sensor_channel)
-        self.pump = Pump(pump_channel)
-        self.water_level = water_level
-        self.warn_level = warn_level
-        self.auto_water = auto_water
-        self.pump_speed = pump_speed
-        self.pump_time = pump_time
-        self.watering_delay = watering_delay
-        self._wet_point = wet_point
-        self._dry_point = dry_point
-        self.last_dose = time.time()
-        self.icon = icon
-        self._enabled = enabled
-        self.alarm = False
-        self.title = f"Channel {display_channel}" if title is None else title
-
-        self.sensor.set_wet_point(wet_point)
-        self.sensor.set_dry_point(dry_point)
-
-    @property
-    def enabled(self):
-        return self._enabled
-
-    @enabled.setter
-    def enabled(self, enabled):
-        self._enabled = enabled
-
-    @property
-    def wet_point(self):
-        return self._wet_point
-
-    @property
-    def dry_point(self):
-        return self._dry_point
-
-    @wet_point.setter
-    def wet_point(self, wet_point):
-        self._wet_point = wet_point
-        self.sensor.set_wet_point(wet_point)
-
-    @dry_point.setter
-    def dry_point(self, dry_point):
-        self._dry_point = dry_point
-        self.sensor.set_dry_point(dry_point)
-
-    def warn_color(self):
-        value = self.sensor.moisture
-
-    def indicator_color(self, value):
-        value = 1.0 - value
-        if value == 1.0:
-            return self.colors[-1]
-        if value == 0.0:
-            return self.colors[0]
-
-        value *= len(self.colors) - 1
-        a = int(math.floor(value))
-        b = a + 1
-        blend = float(value - a)
-
-        r, g, b = [int(((self.colors[b][i] - self.colors[a][i]) * blend) + self.colors[a][i]) for i in range(3)]
-        return (r, g, b)
-
-    def update_from_yml(self, config):
-        if config is not None:
-            self.pump_speed = config.get("pump_speed", self.pump_speed)
-            self.pump_time = config.get("pump_time", self.pump_time)
-            self.warn_level = config.get("warn_level", self.warn_level)
-            self.water_level = config.get("water_level", self.water_level)
-            self.watering_delay = config.get("watering_delay", self.watering_delay)
-            self.auto_water = config.get("auto_water", self.auto_water)
-            self.enabled = config.get("enabled", self.enabled)
-            self.wet_point = config.get("wet_point", self.wet_point)
-            self.dry_point = config.get("dry_point", self.dry_point)
-
-    def __str__(self):
-        return f"""Channel: {self.channel}
-Enabled: {self.enabled}
-Alarm level: {self.warn_level}
-Auto water: {self.auto_water}
-Water level: {self.water_level}
-Pump speed: {self.pump_speed}
-Pump time: {self.pump_time}
-Delay: {self.watering_delay}
-Wet point: {self.wet_point}
-Dry point: {self.dry_point}
-"""
-
-    def water(self):
-        if not self.auto_water:
-            return False
-        if time.time() - self.last_dose > self.watering_delay:
-            self.pump.dose(self.pump_speed, self.pump_time, blocking=False)
-            self.last_dose = time.time()
-            return True
-        return False
-
-    def render(self, image, font):
-        pass
-
-    def update(self):
-        if not self.enabled:
-            return
-        sat = self.sensor.saturation
-        if sat < self.water_level:
-            if self.water():
-                logging.info(
-                    f"Watering Channel: {self.channel} - rate {self.pump_speed:.2f} for {self.pump_time:.2f}sec"
-                )
-                sendMessage(f"Auto-watering triggered on Channel {self.channel}")
-        if sat < self.warn_level:
-            if not self.alarm:
-                logging.warning(
-                    f"Alarm on Channel: {self.channel} - saturation is {sat * 100:.2f}% (warn level {self.warn_level * 100:.2f}%)"
-                )
-                sendMessage(f"Warning: Moisture low on Channel {self.channel}")
-            self.alarm = True
-        else:
-            self.alarm = False
-
-class Alarm(View):
-    def __init__(self, image, enabled=True, interval=10.0, beep_frequency=440):
+class Alarm(AlarmState, View):
+    def __init__(self, image, enabled=True, interval=10.0, beep_frequency=440, clock=real_clock):
         self.piezo = Piezo()
-        self.enabled = enabled
-        self.interval = interval
         self.beep_frequency = beep_frequency
-        self._triggered = False
-        self._time_last_beep = time.time()
-        self._sleep_until = None
 
+        AlarmState.__init__(self, enabled, interval, clock)
         View.__init__(self, image)
 
-    def update_from_yml(self, config):
-        if config is not None:
-            self.enabled = config.get("alarm_enable", self.enabled)
-            self.interval = config.get("alarm_interval", self.interval)
-
-    def update(self, lights_out=False):
-        if self._sleep_until is not None:
-            if self._sleep_until > time.time():
-                return
-            self._sleep_until = None
-
-        if (
-            self.enabled
-            and not lights_out
-            and self._triggered
-            and time.time() - self._time_last_beep > self.interval
-        ):
-            self.piezo.beep(self.beep_frequency, 0.1, blocking=False)
-            threading.Timer(
-                0.3,
-                self.piezo.beep,
-                args=[self.beep_frequency, 0.1],
-                kwargs={"blocking": False},
-            ).start()
-            threading.Timer(
-                0.6,
-                self.piezo.beep,
-                args=[self.beep_frequency, 0.1],
-                kwargs={"blocking": False},
-            ).start()
-            self._time_last_beep = time.time()
-
-            self._triggered = False
+    def beep(self):
+        AlarmState.beep(self)
+        self.piezo.beep(self.beep_frequency, 0.1, blocking=False)
+        threading.Timer(
+            0.3,
+            self.piezo.beep,
+            args=[self.beep_frequency, 0.1],
+            kwargs={"blocking": False},
+        ).start()
+        threading.Timer(
+            0.6,
+            self.piezo.beep,
+            args=[self.beep_frequency, 0.1],
+            kwargs={"blocking": False},
+        ).start()
 
     def render(self, position=(0, 0)):
         x, y = position
@@ -899,30 +854,75 @@ class Alarm(View):
         #self._draw.rectangle((x, y, x + 19, y + 19), (255, 255, 255))
         r = 129
         if self._triggered and self._sleep_until is None:
-            r = int(((math.sin(time.time() * 3 * math.pi) + 1.0) / 2.0) * 128) + 127
+            r = int(((math.sin(self.clock.time() * 3 * math.pi) + 1.0) / 2.0) * 128) + 127
 
         if self._sleep_until is None:
             self.icon(icon_alarm, (x, y - 1), (r, 129, 129))
         else:
             self.icon(icon_snooze, (x, y - 1), (r, 129, 129))
 
-    def trigger(self):
-        self._triggered = True
 
-    def disable(self):
-        self.enabled = False
+class ButtonQueue:
+    """Hand button presses from the GPIO callback thread to the main loop.
+
+    The callback only appends a (timestamp, pin) tuple. deque.append and
+    deque.popleft are atomic, so neither side needs to take a lock.
+
+    """
 
-    def enable(self):
-        self.enabled = True
+    def __init__(self, clock=real_clock):
+        self.clock = clock
+        self._events = collections.deque()
+        self._wake = threading.Event()
 
-    def cancel_sleep(self):
-        self._sleep_until = None
+    def push(self, pin):
+        self._events.append((self.clock.time(), pin))
+        self._wake.set()
 
-    def sleeping(self):
-        return self._sleep_until is not None
+    def drain(self):
+        self._wake.clear()
+        events = []
+        while True:
+            try:
+                events.append(self._events.popleft())
+            except IndexError:
+                return events
+
+    def wait(self, timeout):
+        """Sleep for up to timeout seconds, returning early on a new press."""
+        return self.clock.wait(self._wake, timeout)
+
+
+class LatencyHistogram:
+    """Power-of-two millisecond histogram, logged every log_interval seconds."""
+
+    def __init__(self, name, buckets=12, log_interval=300):
+        self.name = name
+        self.log_interval = log_interval
+        self._counts = [0] * buckets
+        self._max = 0.0
+        self._time_last_log = time.monotonic()
+
+    def record(self, seconds):
+        ms = seconds * 1000
+        index = min(int(ms).bit_length(), len(self._counts) - 1)
+        self._counts[index] += 1
+        self._max = max(self._max, ms)
+
+    def summary(self):
+        buckets = [
+            f"<{1 << i}ms:{count}" for i, count in enumerate(self._counts) if count
+        ]
+        return f"{self.name}: {' '.join(buckets)} max={self._max:.1f}ms"
 
-    def sleep(self, duration=500):
-        self._sleep_until = time.time() + duration
+    def maybe_log(self):
+        if time.monotonic() - self._time_last_log < self.log_interval:
+            return
+        if any(self._counts):
+            logging.info(self.summary())
+        self._counts = [0] * len(self._counts)
+        self._max = 0.0
+        self._time_last_log = time.monotonic()
 
 
 class ViewController:
@@ -990,7 +990,10 @@ class ViewController:
 class Config:
     def __init__(self):
         self.config = None
+        self.settings_file = pathlib.Path("settings.yml")
         self._last_save = ""
+        # (section, key, old value, new value) for each setting changed since last drained
+        self.changes = []
 
         self.channel_settings = [
             "enabled",
@@ -1002,6 +1005,7 @@ class Config:
             "pump_time",
             "pump_speed",
             "water_level",
+            "auto_calibrate",
         ]
 
         self.general_settings = [
@@ -1014,6 +1018,7 @@ class Config:
             settings_file = sys.argv[1]
 
         settings_file = pathlib.Path(settings_file)
+        self.settings_file = settings_file
 
         if settings_file.is_file():
             try:
@@ -1044,13 +1049,25 @@ class Config:
         return self.config.get("channel{}".format(channel_id), {})
 
     def set(self, section, settings):
+        self.config.setdefault(section, {})
         if isinstance(settings, dict):
-            self.config[section].update(settings)
+            updates = settings
         else:
+            updates = {}
             for key in self.channel_settings:
                 value = getattr(settings, key, None)
                 if value is not None:
-                    self.config[section].update({key: value})
+                    updates[key] = value
+
+        current = self.config[section]
+        for key, value in updates.items():
+            if key in current and current[key] != value:
+                self.changes.append((section, key, current[key], value))
+        current.update(updates)
+
+    def drain_changes(self):
+        changes, self.changes = self.changes, []
+        return changes
 
     def set_channel(self, channel_id, settings):
         self.set("channel{}".format(channel_id), settings)
@@ -1062,10 +1079,21 @@ class Config:
         self.set("general", settings)
 
 
-def main():
+def main(clock=real_clock):
+    # The views' blinks and pulses follow the same clock as everything else
+    View.clock = clock
+    buttons = ButtonQueue(clock)
+    button_latency = LatencyHistogram("Button press-to-frame latency")
+
     def handle_button(pin):
+        # Runs on the RPi.GPIO callback thread, so only queue the press
+        buttons.push(pin)
+
+    def dispatch_button(pin):
         index = BUTTONS.index(pin)
         label = LABELS[index]
+        if journal is not None:
+            journal.button(label)
 
         if label == "A":  # Select View
             viewcontroller.button_a()
@@ -1075,8 +1103,12 @@ def main():
                 if viewcontroller.home:
                     if alarm.sleeping():
                         alarm.cancel_sleep()
+                        if journal is not None:
+                            journal.snooze_cancel()
                     else:
-                        alarm.sleep()
+                        alarm.sleep(SNOOZE_DURATION)
+                        if journal is not None:
+                            journal.snooze(SNOOZE_DURATION)
 
         if label == "X":
             viewcontroller.button_x()
@@ -1101,16 +1133,46 @@ def main():
     image_blank = Image.new("RGBA", (DISPLAY_WIDTH, DISPLAY_HEIGHT), color=(0, 0, 0))
 
 
-    # Pick a random selection of plant icons to display on screen
-    channels = [
-        Channel(1, 1, 1),
-        Channel(2, 2, 2),
-        Channel(3, 3, 3),
-    ]
-
-    alarm = Alarm(image)
+    alarm = Alarm(image, clock=clock)
 
     config = Config()
+    config.load()
+
+    channels = ChannelRegistry.from_config(config, notify=sendMessage, clock=clock)
+
+    telemetry = TelemetryPublisher.from_config(socket.gethostname(), config.get_general().get("telemetry"))
+
+    history_path = config.get_general().get("history_path", "history.bin")
+    history_store.load(history_path, channels, max_age=config.get_general().get("history_max_age"))
+    history_snapshotter = history_store.HistorySnapshotter(
+        history_path, channels, interval=config.get_general().get("history_save_interval", 60)
+    )
+
+    try:
+        live_state = LiveStateWriter()
+    except OSError as e:
+        logging.warning("Unable to publish live state: %s", e)
+        live_state = None
+
+    try:
+        journal = JournalWriter(config.get_general().get("journal_path", "journal.bin"), clock=clock)
+    except OSError as e:
+        logging.warning("Unable to open event journal: %s", e)
+        journal = None
+    alarms_on = [False] * len(channels)
+
+    db_log_interval = config.get_general().get("db_log_interval", 300)
+    if db_log_interval:
+        db_logger = DatabaseLogger(
+            channels,
+            interval=db_log_interval,
+            db_path=config.get_general().get("db_path", DB_PATH),
+        )
+        db_logger.start()
+
+    # Loads the 24h/7d history views' graphs, only while they're on screen
+    rollups = RollupLoader(config.get_general().get("db_path", DB_PATH), clock=clock)
+    rollups.start()
 
     GPIO.setmode(GPIO.BCM)
     GPIO.setwarnings(False)
@@ -1119,13 +1181,16 @@ def main():
     for pin in BUTTONS:
         GPIO.add_event_detect(pin, GPIO.FALLING, handle_button, bouncetime=200)
 
-    config.load()
-
     for channel in channels:
         channel.update_from_yml(config.get_channel(channel.channel))
 
     alarm.update_from_yml(config.get_general())
 
+    calibration_store = CalibrationStore(config.settings_file.with_name("calibration.yml"))
+    calibration_store.load(channels)
+    calibration_interval = config.get_general().get("calibration_interval", 3600)
+    time_last_calibration = clock.time()
+
     print("Channels:")
     for channel in channels:
         print(channel)
@@ -1171,30 +1236,60 @@ Low Light Value {:.2f}
                 MainView(image, channels=channels, alarm=alarm),
                 SettingsView(image, options=main_options),
             ),
+        ]
+        + [
             (
-                DetailView(image, channel=channels[0]),
-                ChannelEditView(image, channel=channels[0]),
-            ),
-            (
-                DetailView(image, channel=channels[1]),
-                ChannelEditView(image, channel=channels[1]),
-            ),
-            (
-                DetailView(image, channel=channels[2]),
-                ChannelEditView(image, channel=channels[2]),
-            ),
+                DetailView(image, channel=channel, channels=channels),
+                HistoryView(image, channel=channel, rollups=rollups, title="24h"),
+                HistoryView(image, channel=channel, rollups=rollups, title="7d"),
+                ChannelEditView(image, channel=channel),
+            )
+            for channel in channels
         ]
     )
 
     while True:
+        pressed = buttons.drain()
         try:
-            for channel in channels:
+            for _, pin in pressed:
+                dispatch_button(pin)
+
+            channels.update()
+
+            if telemetry is not None:
+                now = clock.wall()
+                for i, channel in enumerate(channels):
+                    if channels.new_data[i]:
+                        telemetry.add_reading(now, channel.channel, channels.moisture[i], channels.saturation[i])
+                for channel in channels.watered:
+                    telemetry.add_pump_event(now, channel.channel, channel.pump_speed, channel.pump_time)
+                telemetry.maybe_flush()
+
+            for i, channel in enumerate(channels):
                 config.set_channel(channel.channel, channel)
-                channel.update()
                 if channel.alarm:
                     alarm.trigger()
+                if journal is not None and channel.alarm != alarms_on[i]:
+                    journal.alarm(channel.channel, channels.saturation[i], on=channel.alarm)
+                alarms_on[i] = channel.alarm
+
+                for kind, started in channel.anomaly.drain_changes():
+                    if started:
+                        logging.warning(f"Anomaly on Channel: {channel.channel} - {kind}, auto-watering paused")
+                    else:
+                        logging.info(f"Anomaly on Channel: {channel.channel} - {kind} cleared")
+                    if journal is not None:
+                        journal.anomaly(channel.channel, kind, started)
 
-            light_level_low = light.get_lux() < config.get_general().get("light_level_low")
+            if journal is not None:
+                for channel in channels.watered:
+                    journal.watering(channel.channel, channel.pump_speed, channel.pump_time)
+
+            lux = light.get_lux()
+            light_level_low = lux < config.get_general().get("light_level_low")
+
+            if live_state is not None:
+                live_state.publish(channels, lux)
 
             alarm.update(light_level_low)
 
@@ -1208,6 +1303,11 @@ Low Light Value {:.2f}
                 display.wake()
                 display.display(image.convert("RGB"))
 
+            frame_time = clock.time()
+            for pressed_at, _ in pressed:
+                button_latency.record(frame_time - pressed_at)
+            button_latency.maybe_log()
+
             config.set_general(
                 {
                     "alarm_enable": alarm.enabled,
@@ -1217,13 +1317,30 @@ Low Light Value {:.2f}
 
             config.save()
 
+            for section, key, old, new in config.drain_changes():
+                if journal is not None:
+                    channel_id = int(section[len("channel"):]) if section.startswith("channel") else 0
+                    journal.config(channel_id, key, old, new)
+
+            history_snapshotter.maybe_save()
+
+            if clock.time() - time_last_calibration > calibration_interval:
+                time_last_calibration = clock.time()
+                for channel in channels:
+                    suggestion = channel.calibrate()
+                    if suggestion is not None and not channel.auto_calibrate:
+                        logging.info(
+                            "Channel %d suggested wet/dry points: %.2f/%.2fHz", channel.channel, *suggestion
+                        )
+                calibration_store.save(channels)
+
         except Exception as e:
             logging.exception("Unhandled exception in main loop: %s", e)
             # Sleep a bit to avoid tight exception loop
-            time.sleep(5)
+            clock.sleep(5)
 
-        # main loop tick
-        time.sleep(1.0 / FPS)
+        # main loop tick, cut short by a button press
+        buttons.wait(1.0 / FPS)
 
 
 if __name__ == "__main__":
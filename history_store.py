@@ -0,0 +1,115 @@
+"""Save each channel's sensor history to disk so grow-monitor restarts warm.
+
+The snapshot is a small binary file, little-endian:
+
+    header   magic "GRHS", version u16, channel count u16, saved_at f64
+    channel  channel u16, last_dose f64, history length u16, history f32 * length
+
+Writes go to a temporary file that is renamed over the old snapshot, so a
+crash or power cut mid-write never leaves a truncated file behind.
+"""
+import logging
+import os
+import struct
+import tempfile
+import time
+from array import array
+
+MAGIC = b"GRHS"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHHd")
+CHANNEL = struct.Struct("<HdH")
+
+
+def save(path, channels):
+    parts = [HEADER.pack(MAGIC, VERSION, len(channels), time.time())]
+    for channel in channels:
+        history = array("f", channel.sensor.raw_history)
+        parts.append(CHANNEL.pack(channel.channel, channel.clock.to_wall(channel.last_dose), len(history)))
+        parts.append(history.tobytes())
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".history-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(b"".join(parts))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load(path, channels, max_age=None):
+    """Restore history and last dose times saved by save.
+
+    History is restored behind a gap as long as the restart took, and only
+    while some of it would still be in the sensor's history (or max_age
+    seconds, if given), since the graph would otherwise be misleading. The
+    last dose time is always restored so watering_delay still applies
+    across a restart.
+
+    Returns the number of channels restored.
+
+    """
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+        magic, version, count, saved_at = HEADER.unpack_from(data)
+    except (OSError, struct.error):
+        return 0
+    if magic != MAGIC or version != VERSION:
+        logging.warning("Ignoring history snapshot %s: unknown format %r v%d", path, magic, version)
+        return 0
+
+    age = time.time() - saved_at
+    by_channel = {channel.channel: channel for channel in channels}
+    restored = 0
+    stale = 0
+    offset = HEADER.size
+    for _ in range(count):
+        number, last_dose, length = CHANNEL.unpack_from(data, offset)
+        offset += CHANNEL.size
+        history = array("f")
+        history.frombytes(data[offset:offset + length * history.itemsize])
+        offset += length * history.itemsize
+
+        channel = by_channel.get(number)
+        if channel is None:
+            continue
+        channel.last_dose = channel.clock.from_wall(last_dose)
+        if age < (max_age if max_age is not None else channel.sensor.history_span):
+            channel.sensor.restore_history(history, gap=age)
+        else:
+            stale += 1
+        restored += 1
+
+    logging.info(
+        "Restored %d channel(s) from %s saved %.0fs ago%s",
+        restored,
+        path,
+        age,
+        f" ({stale} too old for their history, kept last dose times only)" if stale else "",
+    )
+    return restored
+
+
+class HistorySnapshotter:
+    """Save a snapshot every interval seconds, called from the main loop."""
+
+    def __init__(self, path, channels, interval=60):
+        self.path = path
+        self.channels = channels
+        self.interval = interval
+        self._time_last_save = time.monotonic()
+
+    def maybe_save(self):
+        if time.monotonic() - self._time_last_save < self.interval:
+            return
+        self._time_last_save = time.monotonic()
+        try:
+            save(self.path, self.channels)
+        except OSError as e:
+            logging.warning("Unable to save history snapshot %s: %s", self.path, e)
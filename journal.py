@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Append-only journal of grow-monitor events: watering, alarms, snoozes, buttons, config changes and anomalies.
+
+The file is a run of fixed-size blocks, little-endian:
+
+    block    magic "GRJB", version u16, pad u16, first timestamp f64, then records
+    record   length u16, type u8, timestamp f64, channel u16, payload
+
+A record never straddles a block. When the next one does not fit, the rest
+of the block is left as zeros (a zero length ends the block) and a new block
+is started. The block headers are the index: a reader memory-maps the file,
+binary searches the first timestamps to find a time and scans at most one
+block from there. Offsets are stable, so a consumer can remember where it
+got to and read only the events appended since.
+
+Run directly to print the events since a time:
+
+    python3 journal.py journal.bin --since "2025-11-04 12:00"
+"""
+import argparse
+import logging
+import mmap
+import os
+import struct
+from collections import namedtuple
+from datetime import datetime
+
+from clock import real_clock
+
+PATH = "journal.bin"
+
+MAGIC = b"GRJB"
+VERSION = 1
+BLOCK_SIZE = 16 * 1024
+
+BLOCK = struct.Struct("<4sHHd")
+RECORD = struct.Struct("<HBdH")
+
+# type: (name, payload struct or None for utf-8 text, payload field names)
+EVENT_TYPES = {
+    1: ("watering", struct.Struct("<ff"), ("speed", "seconds")),
+    2: ("alarm", struct.Struct("<f"), ("saturation",)),
+    3: ("alarm_clear", struct.Struct("<f"), ("saturation",)),
+    4: ("snooze", struct.Struct("<f"), ("duration",)),
+    5: ("snooze_cancel", struct.Struct(""), ()),
+    6: ("button", struct.Struct("<c"), ("label",)),
+    7: ("config", None, ("text",)),
+    8: ("anomaly", None, ("text",)),
+}
+EVENT_IDS = {name: type_id for type_id, (name, _, _) in EVENT_TYPES.items()}
+
+Event = namedtuple("Event", "offset timestamp kind channel data")
+
+
+def encode(kind, timestamp, channel=0, **fields):
+    type_id = EVENT_IDS[kind]
+    _, payload_struct, names = EVENT_TYPES[type_id]
+    if payload_struct is None:
+        payload = fields["text"].encode()
+    else:
+        values = [fields[name] for name in names]
+        if kind == "button":
+            values = [values[0].encode()]
+        payload = payload_struct.pack(*values)
+    return RECORD.pack(RECORD.size + len(payload), type_id, timestamp, channel) + payload
+
+
+def decode(data, offset):
+    """Return (Event, offset of the next record), or (None, None) at the end of a block."""
+    if offset + RECORD.size > len(data):
+        return None, None
+    length, type_id, timestamp, channel = RECORD.unpack_from(data, offset)
+    if length < RECORD.size or offset + length > len(data) or type_id not in EVENT_TYPES:
+        return None, None
+    name, payload_struct, names = EVENT_TYPES[type_id]
+    payload = data[offset + RECORD.size:offset + length]
+    if payload_struct is None:
+        values = [payload.decode(errors="replace")]
+    else:
+        # Payload floats are f32, so drop the digits they can't hold
+        values = [round(value, 4) if isinstance(value, float) else value for value in payload_struct.unpack(payload)]
+        if name == "button":
+            values = [values[0].decode()]
+    return Event(offset, timestamp, name, channel, dict(zip(names, values))), offset + length
+
+
+class JournalWriter:
+    """Append events, called from grow-monitor's main loop."""
+
+    def __init__(self, path=PATH, block_size=BLOCK_SIZE, clock=real_clock):
+        self.path = path
+        self.block_size = block_size
+        self.clock = clock
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self._end = self._recover()
+
+    def _recover(self):
+        """Find the end of the last complete record, dropping any torn write after it."""
+        size = os.fstat(self._fd).st_size
+        block = size - size % self.block_size
+        if block == size:
+            return size
+        with open(self.path, "rb") as file:
+            file.seek(block)
+            data = file.read(self.block_size)
+        end = block + BLOCK.size
+        if len(data) < BLOCK.size or BLOCK.unpack_from(data)[0] != MAGIC:
+            end = block
+        else:
+            offset = BLOCK.size
+            while True:
+                _, offset = decode(data, offset)
+                if offset is None:
+                    break
+                end = block + offset
+        if end != size:
+            logging.warning("Truncating %d byte(s) of torn journal writes in %s", size - end, self.path)
+            os.ftruncate(self._fd, end)
+        return end
+
+    def write(self, kind, channel=0, **fields):
+        timestamp = self.clock.wall()
+        record = encode(kind, timestamp, channel, **fields)
+        used = self._end % self.block_size
+        if used == 0 or used + len(record) > self.block_size:
+            padding = b"\0" * (self.block_size - used) if used else b""
+            record = padding + BLOCK.pack(MAGIC, VERSION, 0, timestamp) + record
+        os.write(self._fd, record)
+        self._end += len(record)
+
+    def watering(self, channel, speed, seconds):
+        self.write("watering", channel, speed=speed, seconds=seconds)
+
+    def alarm(self, channel, saturation, on=True):
+        self.write("alarm" if on else "alarm_clear", channel, saturation=saturation)
+
+    def snooze(self, duration):
+        self.write("snooze", duration=duration)
+
+    def snooze_cancel(self):
+        self.write("snooze_cancel")
+
+    def button(self, label):
+        self.write("button", label=label)
+
+    def config(self, channel, key, old, new):
+        self.write("config", channel, text=f"{key}: {old} -> {new}")
+
+    def anomaly(self, channel, kind, started=True):
+        self.write("anomaly", channel, text=kind if started else f"{kind} cleared")
+
+    def close(self):
+        os.close(self._fd)
+
+
+class JournalReader:
+    """Memory-map a journal to seek by time and read events from an offset."""
+
+    def __init__(self, path=PATH, block_size=BLOCK_SIZE):
+        self.path = path
+        self.block_size = block_size
+        self._file = open(path, "rb")
+        self._map = None
+        self._size = 0
+        self._remap()
+
+    def _remap(self):
+        size = os.fstat(self._file.fileno()).st_size
+        if size == self._size:
+            return
+        if self._map is not None:
+            self._map.close()
+        self._map = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ) if size else None
+        self._size = size
+
+    @property
+    def size(self):
+        self._remap()
+        return self._size
+
+    @property
+    def blocks(self):
+        return -(-self._size // self.block_size)
+
+    def _block_time(self, index):
+        magic, _, _, first = BLOCK.unpack_from(self._map, index * self.block_size)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} block {index} is not a v{VERSION} journal block ({magic!r})")
+        return first
+
+    def seek(self, timestamp):
+        """Offset of the first event at or after timestamp."""
+        self._remap()
+        low, high = 0, self.blocks
+        while low < high:
+            middle = (low + high) // 2
+            if self._block_time(middle) <= timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        block = max(0, low - 1) * self.block_size
+        end = min(block + self.block_size, self._size)
+
+        # Only the record headers are needed to find the time
+        offset = block + BLOCK.size
+        while offset + RECORD.size <= end:
+            length, _, event_time, _ = RECORD.unpack_from(self._map, offset)
+            if length < RECORD.size or offset + length > end:
+                break
+            if event_time >= timestamp:
+                return offset
+            offset += length
+        return end
+
+    def _scan(self, offset):
+        while offset < self._size:
+            block = offset - offset % self.block_size
+            if offset == block:
+                offset += BLOCK.size
+            data = self._map[block:block + self.block_size]
+            position = offset - block
+            while True:
+                event, position = decode(data, position)
+                if event is None:
+                    break
+                yield event._replace(offset=block + event.offset), block + position
+            offset = block + self.block_size
+
+    def read(self, offset=0):
+        """Return (events appended since offset, offset to read from next time)."""
+        self._remap()
+        events = []
+        for event, offset_next in self._scan(offset):
+            events.append(event)
+            offset = offset_next
+        return events, offset
+
+    def events(self, since=None, until=None):
+        """Events between two timestamps."""
+        offset = 0 if since is None else self.seek(since)
+        events, _ = self.read(offset)
+        return [event for event in events if until is None or event.timestamp < until]
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print events from a grow-monitor journal.")
+    parser.add_argument("path", nargs="?", default=PATH)
+    parser.add_argument("--since", help="eg: 2025-11-04 12:00")
+    args = parser.parse_args()
+
+    since = None
+    if args.since:
+        since = datetime.fromisoformat(args.since).timestamp()
+    reader = JournalReader(args.path)
+    for event in reader.events(since):
+        when = datetime.fromtimestamp(event.timestamp).strftime("%Y-%m-%d %H:%M:%S")
+        channel = f" channel {event.channel}" if event.channel else ""
+        details = " ".join(f"{key}={value}" for key, value in event.data.items())
+        print(f"{when} {event.kind}{channel} {details}".rstrip())
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
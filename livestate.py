@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Live grow-monitor state shared with other processes through an mmap'd file.
+
+grow-monitor publishes a fixed-layout snapshot every tick. Other scripts
+read it instead of opening the moisture sensors or serial port themselves.
+
+Layout, little-endian:
+
+    header   magic "GRLS", version u16, channel count u16, seq u32, pad u32, timestamp f64, lux f64
+    channel  MAX_CHANNELS slots of: channel u16, flags u16, saturation f32, moisture f32,
+             warn_level f32, water_level f32, last_dose f64, pad 4
+
+The writer bumps seq to an odd number before changing the snapshot and
+back to even afterwards (a seqlock). Readers retry until they copy a
+snapshot with the same even seq before and after.
+
+Run directly to print the current state and the time taken to read it.
+"""
+import mmap
+import os
+import struct
+import time
+from collections import namedtuple
+
+PATH = "/dev/shm/grow-monitor.state"
+
+MAGIC = b"GRLS"
+VERSION = 1
+MAX_CHANNELS = 32
+
+HEADER = struct.Struct("<4sHHIIdd")
+CHANNEL = struct.Struct("<HHffffd4x")
+SEQ = struct.Struct("<I")
+SEQ_OFFSET = 8
+SIZE = HEADER.size + CHANNEL.size * MAX_CHANNELS
+
+FLAG_ENABLED = 1
+FLAG_ACTIVE = 2
+FLAG_ALARM = 4
+FLAG_WATERING = 8
+
+Snapshot = namedtuple("Snapshot", "timestamp lux channels")
+ChannelState = namedtuple(
+    "ChannelState",
+    "channel enabled active alarm watering saturation moisture warn_level water_level last_dose",
+)
+
+
+class LiveStateWriter:
+    """Publish grow-monitor's channel state, called once per main loop tick."""
+
+    def __init__(self, path=PATH):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, SIZE)
+            self._map = mmap.mmap(fd, SIZE)
+        finally:
+            os.close(fd)
+        self._seq = 0
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, 0, self._seq, 0, 0.0, 0.0)
+
+    def publish(self, channels, lux):
+        count = min(len(channels), MAX_CHANNELS)
+        body = bytearray(SIZE - HEADER.size)
+        for i in range(count):
+            channel = channels[i]
+            flags = (
+                (FLAG_ENABLED if channel.enabled else 0)
+                | (FLAG_ACTIVE if channel.sensor.active else 0)
+                | (FLAG_ALARM if channel.alarm else 0)
+                | (FLAG_WATERING if channel.pump.get_speed() > 0 else 0)
+            )
+            CHANNEL.pack_into(
+                body,
+                i * CHANNEL.size,
+                channel.channel,
+                flags,
+                channels.saturation[i],
+                channels.moisture[i],
+                channel.warn_level,
+                channel.water_level,
+                channel.clock.to_wall(channel.last_dose),
+            )
+
+        self._seq += 1
+        SEQ.pack_into(self._map, SEQ_OFFSET, self._seq)
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, count, self._seq, 0, time.time(), lux)
+        self._map[HEADER.size:] = body
+        self._seq += 1
+        SEQ.pack_into(self._map, SEQ_OFFSET, self._seq)
+
+    def close(self):
+        self._map.close()
+
+
+class LiveStateReader:
+    """Read consistent snapshots published by a running grow-monitor."""
+
+    def __init__(self, path=PATH):
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), SIZE, access=mmap.ACCESS_READ)
+        magic, version = HEADER.unpack_from(self._map)[:2]
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a v{VERSION} grow-monitor state file ({magic!r} v{version})")
+
+    def read(self, retries=1000):
+        for _ in range(retries):
+            seq = SEQ.unpack_from(self._map, SEQ_OFFSET)[0]
+            if seq & 1:
+                continue
+            data = self._map[:]
+            if SEQ.unpack_from(self._map, SEQ_OFFSET)[0] == seq:
+                break
+        else:
+            raise TimeoutError("grow-monitor state kept changing while being read")
+
+        _, _, count, _, _, timestamp, lux = HEADER.unpack_from(data)
+        channels = []
+        for i in range(count):
+            channel, flags, saturation, moisture, warn_level, water_level, last_dose = CHANNEL.unpack_from(
+                data, HEADER.size + i * CHANNEL.size
+            )
+            channels.append(
+                ChannelState(
+                    channel,
+                    bool(flags & FLAG_ENABLED),
+                    bool(flags & FLAG_ACTIVE),
+                    bool(flags & FLAG_ALARM),
+                    bool(flags & FLAG_WATERING),
+                    saturation,
+                    moisture,
+                    warn_level,
+                    water_level,
+                    last_dose,
+                )
+            )
+        return Snapshot(timestamp, lux, channels)
+
+    def close(self):
+        self._map.close()
+
+
+def read(path=PATH):
+    """Return one snapshot, opening and closing the state file."""
+    reader = LiveStateReader(path)
+    try:
+        return reader.read()
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    reader = LiveStateReader()
+    runs = 10000
+    start = time.perf_counter()
+    for _ in range(runs):
+        snapshot = reader.read()
+    elapsed = (time.perf_counter() - start) / runs
+
+    print(f"Published {time.time() - snapshot.timestamp:.1f}s ago, lux {snapshot.lux:.1f}")
+    for channel in snapshot.channels:
+        print(
+            f"Channel {channel.channel}: {channel.saturation * 100:.1f}% ({channel.moisture:.2f}Hz)"
+            f"{' alarm' if channel.alarm else ''}{' watering' if channel.watering else ''}"
+            f"{'' if channel.enabled else ' disabled'}"
+        )
+    print(f"Read in {elapsed * 1e6:.1f}µs")
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""Push live readings to any number of clients as Server-Sent Events.
+
+    python3 livestream.py --port 8081
+
+Clients connect to /events (eg: new EventSource("http://<pi>:8081/events")
+in a browser, or curl -N) and receive:
+
+    moisture   {"channel", "saturation", "moisture", "alarm", "watering"}  from grow-monitor's live state
+    sensors    {"timestamp", "temp", "light"}                            new rows in plants.db's sensors table
+    watering, alarm, alarm_clear, snooze, button, config, anomaly, ...   events from grow-monitor's journal
+
+New clients first get the latest moisture and sensors event so they have
+something to show straight away.
+
+The sources are polled every --poll seconds (0.05 by default), which keeps
+delivery well inside 100ms while costing almost nothing: the live state is
+an mmap read, the journal an mmap size check and the database a PRAGMA
+data_version. Each event is encoded once and the same bytes are queued for
+every client. Client queues are bounded and drop their oldest events, so a
+client that stops reading costs at most --queue events and never holds up
+the others.
+
+Run with --loadtest N to connect N idle subscribers in-process, publish
+test events and print delivery latency and memory use.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import resource
+import sqlite3
+import time
+from collections import deque
+
+import livestate
+from database import DB_PATH, JOURNAL_PATH
+from journal import JournalReader
+
+# ====== CONFIG ======
+HOST = "0.0.0.0"
+PORT = 8081
+POLL_INTERVAL = 0.05
+QUEUE_SIZE = 64
+HEARTBEAT = 15
+# ====================
+
+
+def frame(kind, data):
+    return f"event: {kind}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+class Subscriber:
+    def __init__(self, queue_size=QUEUE_SIZE):
+        self.queue = deque(maxlen=queue_size)
+        self.ready = asyncio.Event()
+        self.dropped = 0
+
+    def put(self, data):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(data)
+        self.ready.set()
+
+
+class Broadcaster:
+    """Fan events out to every connected subscriber."""
+
+    def __init__(self, queue_size=QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.published = 0
+        # Latest frame for each (kind, channel), sent to new subscribers
+        self.latest = {}
+
+    def subscribe(self):
+        subscriber = Subscriber(self.queue_size)
+        for data in self.latest.values():
+            subscriber.put(data)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    def publish(self, kind, data, channel=0, keep=False):
+        encoded = frame(kind, data)
+        if keep:
+            self.latest[(kind, channel)] = encoded
+        self.published += 1
+        for subscriber in self.subscribers:
+            subscriber.put(encoded)
+
+
+async def watch_live_state(broadcaster, path=livestate.PATH, interval=POLL_INTERVAL):
+    """Publish a moisture event whenever a channel's live state changes."""
+    reader = None
+    previous = {}
+    while True:
+        if reader is None:
+            try:
+                reader = livestate.LiveStateReader(path)
+            except (OSError, ValueError):
+                await asyncio.sleep(1)
+                continue
+        try:
+            snapshot = reader.read()
+        except TimeoutError:
+            await asyncio.sleep(interval)
+            continue
+        for channel in snapshot.channels:
+            state = (channel.saturation, channel.moisture, channel.alarm, channel.watering)
+            if previous.get(channel.channel) == state:
+                continue
+            previous[channel.channel] = state
+            broadcaster.publish(
+                "moisture",
+                {
+                    "channel": channel.channel,
+                    "saturation": round(channel.saturation, 4),
+                    "moisture": round(channel.moisture, 3),
+                    "alarm": channel.alarm,
+                    "watering": channel.watering,
+                },
+                channel.channel,
+                keep=True,
+            )
+        await asyncio.sleep(interval)
+
+
+async def watch_journal(broadcaster, path=JOURNAL_PATH, interval=POLL_INTERVAL):
+    """Publish each event appended to grow-monitor's journal, starting from its current end."""
+    reader = None
+    offset = 0
+    while True:
+        if reader is None:
+            try:
+                reader = JournalReader(path)
+            except OSError:
+                await asyncio.sleep(1)
+                continue
+            offset = reader.size
+        if reader.size > offset:
+            events, offset = reader.read(offset)
+            for event in events:
+                broadcaster.publish(event.kind, {"timestamp": event.timestamp, "channel": event.channel, **event.data})
+        await asyncio.sleep(interval)
+
+
+async def watch_sensors(broadcaster, db_path=DB_PATH, interval=POLL_INTERVAL):
+    """Publish each new row in the sensors table (Arduino temp and UV)."""
+    while True:
+        try:
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            row = conn.execute("SELECT id, timestamp, temp, light FROM sensors ORDER BY id DESC LIMIT 1").fetchone()
+            break
+        except sqlite3.Error:
+            await asyncio.sleep(1)
+    last_id = 0
+    if row is not None:
+        last_id = row[0]
+        broadcaster.publish("sensors", {"timestamp": row[1], "temp": row[2], "light": row[3]}, keep=True)
+    version = None
+    while True:
+        # data_version only changes when another connection commits, so idle polls don't query the table
+        current = conn.execute("PRAGMA data_version").fetchone()[0]
+        if current != version:
+            version = current
+            for last_id, timestamp, temp, light in conn.execute(
+                "SELECT id, timestamp, temp, light FROM sensors WHERE id > ? ORDER BY id", (last_id,)
+            ).fetchall():
+                if temp is not None or light is not None:
+                    broadcaster.publish("sensors", {"timestamp": timestamp, "temp": temp, "light": light}, keep=True)
+        await asyncio.sleep(interval)
+
+
+async def handle_client(broadcaster, reader, writer):
+    try:
+        request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        writer.close()
+        return
+    path = request.split(b" ", 2)[1] if request.count(b" ") >= 2 else b""
+    if path.split(b"?")[0] != b"/events":
+        writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+        writer.close()
+        return
+
+    writer.write(
+        b"HTTP/1.1 200 OK\r\n"
+        b"Content-Type: text/event-stream\r\n"
+        b"Cache-Control: no-cache\r\n"
+        b"Access-Control-Allow-Origin: *\r\n"
+        b"Connection: keep-alive\r\n\r\n"
+        b"retry: 2000\n\n"
+    )
+    subscriber = broadcaster.subscribe()
+    # Finishes when the client hangs up, so it is dropped straight away rather than at the next write
+    closed = asyncio.ensure_future(reader.read())
+    closed.add_done_callback(lambda _: subscriber.ready.set())
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            heartbeat = loop.call_later(HEARTBEAT, subscriber.ready.set)
+            await subscriber.ready.wait()
+            heartbeat.cancel()
+            if closed.done():
+                break
+            subscriber.ready.clear()
+            if not subscriber.queue:
+                # Comments keep proxies from closing the connection
+                writer.write(b": ping\n\n")
+            while subscriber.queue:
+                writer.write(subscriber.queue.popleft())
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        closed.cancel()
+        broadcaster.unsubscribe(subscriber)
+        if subscriber.dropped:
+            logging.info("Client dropped %d event(s) it was too slow to read", subscriber.dropped)
+        writer.close()
+
+
+async def start_server(broadcaster, host=HOST, port=PORT):
+    return await asyncio.start_server(
+        lambda reader, writer: handle_client(broadcaster, reader, writer), host, port, backlog=1024
+    )
+
+
+async def serve(args):
+    broadcaster = Broadcaster(args.queue)
+    server = await start_server(broadcaster, args.host, args.port)
+    logging.info("Streaming events on http://%s:%d/events", args.host, args.port)
+    await asyncio.gather(
+        server.serve_forever(),
+        watch_live_state(broadcaster, args.state, args.poll),
+        watch_journal(broadcaster, args.journal, args.poll),
+        watch_sensors(broadcaster, args.db, args.poll),
+    )
+
+
+async def loadtest(clients, events=200, port=PORT + 1000):
+    """Connect idle subscribers, publish events and time how long each takes to reach all of them."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < clients * 2 + 64:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, clients * 2 + 64), hard))
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    broadcaster = Broadcaster()
+    server = await start_server(broadcaster, "127.0.0.1", port)
+    connections = []
+    for _ in range(clients):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /events HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        await reader.readuntil(b"retry: 2000\n\n")
+        connections.append((reader, writer))
+    while len(broadcaster.subscribers) < clients:
+        await asyncio.sleep(0.01)
+    rss_connected = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    latencies = []
+
+    async def receive(reader):
+        for _ in range(events):
+            data = await reader.readuntil(b"\n\n")
+            sent = json.loads(data.split(b"data: ", 1)[1])["sent"]
+            latencies.append(time.perf_counter() - sent)
+
+    receivers = [asyncio.ensure_future(receive(reader)) for reader, _ in connections]
+    start = time.perf_counter()
+    for i in range(events):
+        broadcaster.publish("moisture", {"channel": 1, "saturation": i / events, "sent": time.perf_counter()})
+        # One reading every 10ms is far more than grow-monitor produces
+        await asyncio.sleep(0.01)
+    await asyncio.gather(*receivers)
+    elapsed = time.perf_counter() - start
+
+    for _, writer in connections:
+        writer.close()
+    while broadcaster.subscribers:
+        await asyncio.sleep(0.01)
+    server.close()
+
+    latencies.sort()
+    per_client = (rss_connected - rss_before) / clients
+    print(f"{clients} subscribers, {events} events each, {clients * events / elapsed:.0f} deliveries/s")
+    print(
+        f"Latency p50 {latencies[len(latencies) // 2] * 1000:.1f}ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms, max {latencies[-1] * 1000:.1f}ms"
+    )
+    print(f"Memory {rss_connected / 1024:.1f}MB peak RSS, ~{per_client:.0f}KB per idle subscriber (both ends)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--journal", default=JOURNAL_PATH)
+    parser.add_argument("--state", default=livestate.PATH)
+    parser.add_argument("--poll", type=float, default=POLL_INTERVAL, help="seconds between source polls")
+    parser.add_argument("--queue", type=int, default=QUEUE_SIZE, help="events held for each slow client")
+    parser.add_argument("--loadtest", type=int, metavar="N", help="benchmark N idle subscribers and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+    if args.loadtest:
+        asyncio.run(loadtest(args.loadtest))
+    else:
+        asyncio.run(serve(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
-import time
+import math
+
 import RPi.GPIO as GPIO
 
+import pulsecounter
+from clock import real_clock
+
 MOISTURE_1_PIN = 23
 MOISTURE_2_PIN = 8
 MOISTURE_3_PIN = 25
@@ -10,7 +14,7 @@ MOISTURE_INT_PIN = 4
 class Moisture(object):
     """Grow moisture sensor driver."""
 
-    def __init__(self, channel=1, wet_point=None, dry_point=None):
+    def __init__(self, channel=1, wet_point=None, dry_point=None, gpio_pin=None, counter="python", clock=real_clock):
         """Create a new moisture sensor.
 
         Uses an interrupt to count pulses on the GPIO pin corresponding to the selected channel.
@@ -20,25 +24,33 @@ class Moisture(object):
         :param channel: One of 1, 2 or 3. 4 can optionally be used to set up a sensor on the Int pin (BCM4)
         :param wet_point: Wet point in pulses/sec
         :param dry_point: Dry point in pulses/sec
+        :param gpio_pin: BCM pin to use instead of the channel default, eg: for a second HAT
+        :param counter: Pulse counting backend, one of "python", "gate" or "pigpio" (see pulsecounter.py)
+        :param clock: Time source, see clock.py
 
         """
-        self._gpio_pin = [MOISTURE_1_PIN, MOISTURE_2_PIN, MOISTURE_3_PIN, MOISTURE_INT_PIN][channel - 1]
+        if gpio_pin is None:
+            gpio_pin = [MOISTURE_1_PIN, MOISTURE_2_PIN, MOISTURE_3_PIN, MOISTURE_INT_PIN][channel - 1]
+        self._gpio_pin = gpio_pin
 
         GPIO.setwarnings(False)
         GPIO.setmode(GPIO.BCM)
         GPIO.setup(self._gpio_pin, GPIO.IN)
 
-        self._count = 0
         self._reading = 0
         self._history = []
         self._history_length = 200
-        self._last_pulse = time.time()
         self._new_data = False
         self._wet_point = wet_point if wet_point is not None else 0.7
         self._dry_point = dry_point if dry_point is not None else 27.6
-        self._time_last_reading = time.time()
+        self._clock = clock
+        self._counter = pulsecounter.create(counter, self._on_reading, clock=clock)
+        # Gated backends only report once per window, so allow for one late window
+        self._active_timeout = 1.0 if counter == "python" else self._counter.gate * 2
+        # Every backend reports about once per gate window
+        self._sample_interval = self._counter.gate
         try:
-            GPIO.add_event_detect(self._gpio_pin, GPIO.RISING, callback=self._event_handler, bouncetime=1)
+            self._counter.start(GPIO, self._gpio_pin)
         except RuntimeError as e:
             if self._gpio_pin == 8:
                 raise RuntimeError("""Unable to set up edge detection on BCM8.
@@ -51,24 +63,22 @@ dtoverlay=spi0-cs,cs0_pin=14 # Re-assign CS0 from BCM 8 so that Grow can use it
             else:
                 raise e
 
-        self._time_start = time.time()
+        self._time_start = clock.time()
 
-    def _event_handler(self, pin):
-        self._count += 1
-        self._last_pulse = time.time()
-        if self._time_elapsed >= 1.0:
-            self._reading = self._count / self._time_elapsed
-            self._history.insert(0, self._reading)
-            self._history = self._history[:self._history_length]
-            self._count = 0
-            self._time_last_reading = time.time()
-            self._new_data = True
+    def _on_reading(self, reading):
+        self._reading = reading
+        self._history.insert(0, self._reading)
+        self._history = self._history[:self._history_length]
+        self._new_data = True
 
     @property
     def history(self):
         history = []
 
         for moisture in self._history:
+            if math.isnan(moisture):
+                history.append(moisture)
+                continue
             saturation = float(moisture - self._dry_point) / self.range
             saturation = round(saturation, 3)
             history.append(max(0.0, min(1.0, saturation)))
@@ -76,8 +86,27 @@ dtoverlay=spi0-cs,cs0_pin=14 # Re-assign CS0 from BCM 8 so that Grow can use it
         return history
 
     @property
-    def _time_elapsed(self):
-        return time.time() - self._time_last_reading
+    def raw_history(self):
+        """Return the raw pulses/sec history, newest first."""
+        return list(self._history)
+
+    @property
+    def history_span(self):
+        """Seconds of readings the history holds when full."""
+        return self._history_length * self._sample_interval
+
+    def restore_history(self, history, gap=0.0):
+        """Prefill the history, eg: from a snapshot saved before a restart.
+
+        The readings missed during the gap are kept as NaN, so the graph
+        shows a break instead of joining the old readings to the new ones.
+
+        :param history: Raw pulses/sec readings, newest first.
+        :param gap: Seconds between the newest of them and now.
+
+        """
+        missed = min(int(gap / self._sample_interval), self._history_length)
+        self._history = (self._history + [math.nan] * missed + list(history))[:self._history_length]
 
     def set_wet_point(self, value=None):
         """Set the sensor wet point.
@@ -122,7 +151,7 @@ dtoverlay=spi0-cs,cs0_pin=14 # Re-assign CS0 from BCM 8 so that Grow can use it
     @property
     def active(self):
         """Check if the moisture sensor is producing a valid reading."""
-        return (time.time() - self._last_pulse) < 1.0 and self._reading > 0 and self._reading < 28
+        return (self._clock.time() - self._counter.last_pulse) < self._active_timeout and self._reading > 0 and self._reading < 28
 
     @property
     def new_data(self):
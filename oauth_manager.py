@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""One place to load, refresh and save the Google OAuth tokens the scripts use.
+
+    creds = oauth_manager.credentials(TOKEN_PATH, CREDENTIALS_PATH, SCOPES)
+
+Each token file gets one CredentialManager per process, which keeps the
+credentials in memory after the first load. A long-running process can call
+start() to refresh them on a background thread REFRESH_MARGIN seconds
+before they expire, so an upload never waits for a refresh. Without the
+thread, get() refreshes early itself when the token is within the margin.
+
+Scripts run from cron share token files, so every refresh and write of a
+token file happens under an flock on <token>.lock. The file is read again
+once the lock is held: if another script has just refreshed it, that token
+is used instead of refreshing a second time. Writes go to a temporary file
+that is renamed over the token, so a reader never sees half a file.
+
+Run directly to check a token and refresh it if needed:
+
+    python3 oauth_manager.py --token sheets_token.json --credentials sheets_credentials.json \\
+        --scope https://www.googleapis.com/auth/spreadsheets
+"""
+import argparse
+import fcntl
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+# ====== CONFIG ======
+REFRESH_MARGIN = 300
+RETRY_INTERVAL = 60
+# ====================
+
+
+def utcnow():
+    # google-auth keeps expiry as a naive UTC datetime
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def remaining(creds):
+    """Seconds until creds expire, or None if they don't."""
+    if creds.expiry is None:
+        return None
+    return (creds.expiry - utcnow()).total_seconds()
+
+
+class CredentialManager:
+    def __init__(self, token_path, credentials_path, scopes, refresh_margin=REFRESH_MARGIN):
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self.scopes = list(scopes)
+        self.refresh_margin = refresh_margin
+        self._creds = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def _file_lock(self):
+        lock = open(self.token_path + ".lock", "w")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def _load(self):
+        from google.oauth2.credentials import Credentials
+
+        if not os.path.exists(self.token_path):
+            return None
+        return Credentials.from_authorized_user_file(self.token_path, self.scopes)
+
+    def _save(self, creds):
+        tmp = f"{self.token_path}.tmp"
+        with open(tmp, "w") as token:
+            token.write(creds.to_json())
+        os.replace(tmp, self.token_path)
+
+    def _fresh(self, creds):
+        left = remaining(creds)
+        return creds.token is not None and (left is None or left > self.refresh_margin)
+
+    def refresh(self):
+        """Refresh the token now, unless another process already has. Returns the credentials."""
+        from google.auth.transport.requests import Request
+
+        lock = self._file_lock()
+        try:
+            creds = self._load() or self._creds
+            if creds is not None and self._fresh(creds):
+                self._creds = creds
+                return creds
+            if creds is None or not creds.refresh_token:
+                creds = self._authorize()
+            else:
+                creds.refresh(Request())
+                logging.info("Refreshed %s, valid for %.0fs", os.path.basename(self.token_path), remaining(creds) or 0)
+            self._save(creds)
+            self._creds = creds
+            return creds
+        finally:
+            lock.close()
+
+    def _authorize(self):
+        """Run the browser consent flow, only needed when there's no usable refresh token."""
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, self.scopes)
+        return flow.run_local_server(port=0)
+
+    def get(self):
+        """Return valid credentials, from memory when possible."""
+        with self._lock:
+            if self._creds is None:
+                self._creds = self._load()
+            creds = self._creds
+            if creds is None or not creds.valid:
+                return self.refresh()
+            # With the background thread running only an expired token is worth waiting for
+            if self._thread is None and not self._fresh(creds):
+                return self.refresh()
+            return creds
+
+    def start(self):
+        """Refresh in the background before expiry, for long-running processes."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="oauth-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                creds = self.get()
+                left = remaining(creds)
+                if left is None:
+                    return
+                wait = left - self.refresh_margin
+                if wait > 0 and self._stop_event.wait(wait):
+                    return
+                with self._lock:
+                    self.refresh()
+            except Exception as e:
+                logging.warning("Unable to refresh %s: %s", self.token_path, e)
+                self._stop_event.wait(RETRY_INTERVAL)
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_manager(token_path, credentials_path, scopes):
+    """The process-wide CredentialManager for token_path."""
+    with _managers_lock:
+        manager = _managers.get(token_path)
+        if manager is None:
+            manager = _managers[token_path] = CredentialManager(token_path, credentials_path, scopes)
+        return manager
+
+
+def credentials(token_path, credentials_path, scopes):
+    """Valid credentials for token_path, refreshed or authorized as needed."""
+    return get_manager(token_path, credentials_path, scopes).get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--credentials", required=True)
+    parser.add_argument("--scope", action="append", required=True)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+    creds = credentials(args.token, args.credentials, args.scope)
+    left = remaining(creds)
+    print(f"✅ {args.token} is valid" + ("" if left is None else f" for another {left / 60:.0f} minutes"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import atexit
+import threading
+import time
+import RPi.GPIO as GPIO
+
+PUMP_1_PIN = 17
+PUMP_2_PIN = 27
+PUMP_3_PIN = 22
+PUMP_PWM_FREQ = 10000
+PUMP_MAX_DUTY = 90
+
+
+global_lock = threading.Lock()
+
+
+class Pump(object):
+    """Grow pump driver."""
+
+    def __init__(self, channel=1, gpio_pin=None):
+        """Create a new pump.
+
+        Uses soft PWM to drive a Grow pump.
+
+        :param channel: One of 1, 2 or 3.
+        :param gpio_pin: BCM pin to use instead of the channel default, eg: for a second HAT
+
+        """
+        if gpio_pin is None:
+            gpio_pin = [PUMP_1_PIN, PUMP_2_PIN, PUMP_3_PIN][channel - 1]
+        self._gpio_pin = gpio_pin
+        self._speed = 0
+        self._timeout = None
+        self._has_lock = False
+
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setwarnings(False)
+        GPIO.setup(self._gpio_pin, GPIO.OUT, initial=GPIO.LOW)
+        self._pwm = GPIO.PWM(self._gpio_pin, PUMP_PWM_FREQ)
+        self._pwm.start(0)
+
+        atexit.register(self._stop)
+
+    def _stop(self):
+        self._pwm.stop(0)
+        GPIO.setup(self._gpio_pin, GPIO.IN)
+
+    def set_speed(self, speed):
+        """Set pump speed (PWM duty cycle)."""
+        if speed > 1.0:
+            raise ValueError("Speed must be between 0 and 1")
+        elif speed < 0:
+            raise ValueError("Speed must be between 0 and 1")
+
+        if speed == 0:
+            if self._has_lock:
+                global_lock.release()
+                self._has_lock = False
+        elif not self._has_lock:
+            if not global_lock.acquire(blocking=False):
+                return False
+            self._has_lock = True
+
+        self._pwm.ChangeDutyCycle(int(PUMP_MAX_DUTY * speed))
+        self._speed = speed
+        return True
+
+    def get_speed(self):
+        """Return the current pump speed."""
+        return self._speed
+
+    def stop(self):
+        """Stop the pump."""
+        if self._timeout is not None:
+            self._timeout.cancel()
+            self._timeout = None
+        self.set_speed(0)
+
+    def dose(self, speed, timeout=0.1, blocking=True, force=False):
+        """Pulse the pump for timeout seconds.
+
+        Only one pump across all HATs runs at a time; returns False if another is running.
+
+        :param speed: Speed from 0 to 1
+        :param timeout: Timeout in seconds
+        :param blocking: If true, function will not return until the dose has finished
+        :param force: If true, stop any running dose first
+
+        """
+        if force:
+            self.stop()
+
+        if blocking:
+            if not self.set_speed(speed):
+                return False
+            time.sleep(timeout)
+            self.stop()
+            return True
+
+        if self._timeout is not None and self._timeout.is_alive():
+            return False
+
+        if not self.set_speed(speed):
+            return False
+        self._timeout = threading.Timer(timeout, self.stop)
+        self._timeout.start()
+        return True
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""How much moisture does each pump run buy? Joins pump_log against readings.
+
+    python3 pump_analytics.py
+    python3 pump_analytics.py --rebuild --window 90
+
+For every pump run the moisture just before it (the baseline) is compared
+with the readings over the following --window minutes, or up to the
+channel's next pump run if that comes sooner (the run is then flagged as
+overlapped):
+
+    rise_5m .. rise_60m   moisture rise at each offset, from the first reading at or after it
+    peak_rise             highest rise in the window and minutes_to_peak, how long it took
+    volume_ml             estimated from rate * duration at FLOW_ML_PER_SEC
+    efficiency            peak rise in percentage points per 100ml
+
+Each channel's pump runs and readings are read in time order and joined
+with a sorted merge: one pass over each, keeping only the readings inside
+the current run's window. Results are cached in the pump_response table and
+only runs that are not there yet, and whose window has been fully recorded,
+are computed on later runs.
+"""
+import argparse
+import sqlite3
+import statistics
+import time
+from collections import deque
+
+from database import DB_PATH, FLOW_ML_PER_SEC, parse_time, setup_database
+
+OFFSETS = (5, 15, 30, 60)
+# Use the last reading up to this long before a pump run as its baseline
+LOOKBACK = 30 * 60
+
+
+def setup_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS pump_response (
+            pump_id INTEGER PRIMARY KEY,
+            timestamp TEXT,
+            channel INTEGER,
+            rate REAL,
+            duration REAL,
+            volume_ml REAL,
+            baseline REAL,
+            rise_5m REAL,
+            rise_15m REAL,
+            rise_30m REAL,
+            rise_60m REAL,
+            peak_rise REAL,
+            minutes_to_peak REAL,
+            efficiency REAL,
+            overlapped INTEGER
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS pump_response_channel_time ON pump_response (channel, timestamp)")
+
+
+def merge(doses, readings, window, flow=FLOW_ML_PER_SEC):
+    """Join one channel's doses and readings, both sorted by time, yielding one result per dose.
+
+    doses yields (id, timestamp, t, rate, duration, next_t) and readings
+    (t, moisture), with t in seconds. next_t is when the channel's next pump
+    run started, or None, whether or not that run is among doses.
+
+    """
+    readings = iter(readings)
+    buffer = deque()
+    pending = next(readings, None)
+
+    for pump_id, timestamp, t, rate, duration, next_dose in doses:
+        # Pull in readings up to the end of this dose's window
+        while pending is not None and pending[0] <= t + window:
+            buffer.append(pending)
+            pending = next(readings, None)
+        while buffer and buffer[0][0] < t - LOOKBACK:
+            buffer.popleft()
+
+        baseline = None
+        after = []
+        for when, moisture in buffer:
+            if when < t:
+                baseline = moisture
+            elif next_dose is None or when < next_dose:
+                # Readings after the next run started would credit its water to this one
+                after.append((when, moisture))
+        volume = rate * duration * flow
+        if baseline is None or not after:
+            # Cached anyway, so runs during sensor or logging gaps are not retried every time
+            yield (pump_id, timestamp, rate, duration, round(volume, 1)) + (None,) * 8 + (0,)
+            continue
+
+        rises = []
+        for minutes in OFFSETS:
+            at = next((moisture for when, moisture in after if when >= t + minutes * 60), None)
+            rises.append(None if at is None or minutes * 60 > window else round(at - baseline, 2))
+        peak_time, peak = max(after, key=lambda reading: reading[1])
+        peak_rise = round(peak - baseline, 2)
+
+        yield (
+            pump_id, timestamp, rate, duration, round(volume, 1), round(baseline, 2), *rises,
+            peak_rise,
+            round((peak_time - t) / 60, 1),
+            round(peak_rise / volume * 100, 3) if volume > 0 else None,
+            int(next_dose is not None and next_dose - t < window),
+        )
+
+
+def update(conn, window=60 * 60, rebuild=False):
+    """Compute responses for pump runs not yet in pump_response, returning how many were added."""
+    setup_table(conn)
+    if rebuild:
+        conn.execute("DELETE FROM pump_response")
+
+    added = 0
+    channels = [row[0] for row in conn.execute("SELECT DISTINCT channel FROM pump_log ORDER BY channel")]
+    for channel in channels:
+        latest = conn.execute("SELECT MAX(timestamp) FROM readings WHERE channel = ?", (channel,)).fetchone()[0]
+        if latest is None:
+            continue
+        # Leave runs whose window is still being recorded for next time
+        complete_before = parse_time(latest) - window
+
+        # The next run is looked up over all of pump_log, not just the runs still to compute,
+        # so a run whose successor is cached or still in its window still sees it
+        doses = [
+            (pump_id, timestamp, parse_time(timestamp), rate, duration, next_timestamp and parse_time(next_timestamp))
+            for pump_id, timestamp, rate, duration, next_timestamp in conn.execute(
+                """
+                SELECT p.id, p.timestamp, p.rate, p.duration, p.next_timestamp FROM (
+                    SELECT id, timestamp, rate, duration,
+                        LEAD(timestamp) OVER (ORDER BY timestamp, id) AS next_timestamp
+                    FROM pump_log WHERE channel = ?
+                ) p
+                LEFT JOIN pump_response r ON r.pump_id = p.id
+                WHERE r.pump_id IS NULL
+                ORDER BY p.timestamp
+                """,
+                (channel,),
+            )
+        ]
+        doses = [dose for dose in doses if dose[2] <= complete_before]
+        if not doses:
+            continue
+
+        first = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(doses[0][2] - LOOKBACK))
+        last = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(doses[-1][2] + window))
+        readings = (
+            (parse_time(timestamp), moisture)
+            for timestamp, moisture in conn.execute(
+                "SELECT timestamp, moisture FROM readings "
+                "WHERE channel = ? AND timestamp BETWEEN ? AND ? AND moisture IS NOT NULL "
+                "ORDER BY timestamp",
+                (channel, first, last),
+            )
+        )
+
+        rows = [
+            (pump_id, timestamp, channel, *rest)
+            for pump_id, timestamp, *rest in merge(doses, readings, window)
+        ]
+        conn.executemany(
+            f"INSERT OR REPLACE INTO pump_response VALUES ({', '.join('?' * 15)})", rows
+        )
+        added += len(rows)
+
+    conn.commit()
+    return added
+
+
+def summary(conn):
+    """Per channel (runs, mean peak rise, median efficiency, mean minutes to peak), ignoring overlapped runs."""
+    results = {}
+    for channel, peak_rise, efficiency, minutes in conn.execute(
+        "SELECT channel, peak_rise, efficiency, minutes_to_peak FROM pump_response "
+        "WHERE overlapped = 0 AND peak_rise IS NOT NULL ORDER BY channel"
+    ):
+        results.setdefault(channel, []).append((peak_rise, efficiency, minutes))
+    summaries = {}
+    for channel, rows in results.items():
+        efficiencies = [row[1] for row in rows if row[1] is not None]
+        summaries[channel] = (
+            len(rows),
+            statistics.fmean(row[0] for row in rows),
+            statistics.median(efficiencies) if efficiencies else 0.0,
+            statistics.fmean(row[2] for row in rows),
+        )
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--window", type=float, default=60, help="minutes after each pump run to look at")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every pump run")
+    args = parser.parse_args()
+
+    setup_database(args.db)
+    conn = sqlite3.connect(args.db)
+    start = time.perf_counter()
+    added = update(conn, args.window * 60, args.rebuild)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Computed {added} new pump response(s) in {elapsed:.2f}s")
+
+    for channel, (runs, rise, efficiency, minutes) in summary(conn).items():
+        print(
+            f"💧 Channel {channel}: {runs} run(s), +{rise:.1f}% peak after {minutes:.0f}min, "
+            f"{efficiency:.2f}% per 100ml"
+        )
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
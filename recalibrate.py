@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Re-derive stored moisture percentages from raw pulses/sec under a new calibration.
+
+    python3 recalibrate.py --channel 2 --wet 3.5 --dry 25.8 --start "2025-11-01" --end "2025-12-01"
+
+Adds the wet/dry pair as a new calibrations version and rewrites readings in
+the time range chunk by chunk. Each chunk is read by id (id > last, LIMIT),
+converted with NumPy and committed before the next one is read, so memory use
+does not depend on the size of the table. Rows logged before raw readings were
+stored are left alone.
+
+smoothed and drying_rate were tracked live from the old calibration's
+percentages, one update per sample, and the table only keeps a reading every
+few minutes, so they cannot be rebuilt from it. They are cleared on the
+rewritten rows rather than left disagreeing with moisture.
+"""
+import argparse
+import sqlite3
+import time
+from datetime import datetime
+
+import numpy as np
+
+from database import DB_PATH, setup_database
+
+CHUNK_SIZE = 20000
+
+
+def percentages(raw, wet_point, dry_point):
+    """Vectorised database.moisture_percentage."""
+    if dry_point <= wet_point:
+        return np.zeros_like(raw)
+    return np.clip((dry_point - raw) / (dry_point - wet_point) * 100, 0, 100).round(1)
+
+
+def recalibrate(conn, channel, wet_point, dry_point, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """Rewrite readings for one channel, returning (calibration id, rows updated)."""
+    c = conn.cursor()
+    c.execute(
+        "INSERT INTO calibrations (created, channel, wet_point, dry_point) VALUES (?, ?, ?, ?)",
+        (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), channel, wet_point, dry_point),
+    )
+    calibration = c.lastrowid
+    conn.commit()
+
+    where = "channel = ? AND raw IS NOT NULL AND id > ?"
+    params = [channel]
+    if start is not None:
+        where += " AND timestamp >= ?"
+        params.append(start)
+    if end is not None:
+        where += " AND timestamp < ?"
+        params.append(end)
+
+    last_id = 0
+    updated = 0
+    while True:
+        rows = c.execute(
+            f"SELECT id, raw FROM readings WHERE {where} ORDER BY id LIMIT ?",
+            (params[0], last_id, *params[1:], chunk_size),
+        ).fetchall()
+        if not rows:
+            break
+
+        chunk = np.array(rows, dtype=np.float64)
+        ids = chunk[:, 0].astype(np.int64)
+        pct = percentages(chunk[:, 1], wet_point, dry_point)
+
+        c.executemany(
+            "UPDATE readings SET moisture = ?, smoothed = NULL, drying_rate = NULL, calibration_id = ? "
+            "WHERE id = ?",
+            zip(pct.tolist(), [calibration] * len(ids), ids.tolist()),
+        )
+        conn.commit()
+
+        updated += len(ids)
+        last_id = int(ids[-1])
+
+    return calibration, updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--channel", type=int, required=True)
+    parser.add_argument("--wet", type=float, required=True, help="wet point in pulses/sec")
+    parser.add_argument("--dry", type=float, required=True, help="dry point in pulses/sec")
+    parser.add_argument("--start", help="first timestamp to recompute, eg: 2025-11-01")
+    parser.add_argument("--end", help="recompute readings before this timestamp")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    setup_database(args.db)
+    conn = sqlite3.connect(args.db)
+    start = time.perf_counter()
+    calibration, updated = recalibrate(
+        conn, args.channel, args.wet, args.dry, args.start, args.end, args.chunk_size
+    )
+    elapsed = time.perf_counter() - start
+    conn.close()
+
+    print(f"✅ Recomputed {updated} reading(s) on channel {args.channel} "
+          f"with calibration #{calibration} in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
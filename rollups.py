@@ -0,0 +1,148 @@
+"""Long-range moisture graphs for the LCD: per-pixel-column min/max/mean from plants.db.
+
+grow-monitor's HistoryView asks RollupLoader for a channel's rollup every
+frame. get() only looks up the last result, so a frame never waits on
+SQLite. Missing or stale rollups are (re)loaded by the loader thread,
+which bins the readings in SQL so only one row per column comes back.
+Rollups that have not been asked for in a while are dropped, so only the
+views actually being looked at cost anything.
+
+Run directly to print a channel's rollups and the time taken to load them.
+"""
+import argparse
+import logging
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from clock import real_clock
+from database import DB_PATH
+
+SPANS = {"24h": 24 * 3600, "7d": 7 * 24 * 3600}
+# readings are logged every 5 minutes, so there's no point reloading more often
+REFRESH = 300
+RETRY = 30
+
+# columns: one (min, max, mean) saturation per column, oldest first, or None where nothing was logged
+Rollup = namedtuple("Rollup", "loaded_at start span columns")
+
+
+def load_rollup(conn, channel, span, columns, now):
+    """Bin the last span seconds (up to wall time now) of a channel's readings into columns."""
+    start = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now - span))
+    rows = conn.execute(
+        """
+        SELECT CAST((julianday(timestamp) - julianday(?)) * ? AS INTEGER) AS col,
+               MIN(moisture), MAX(moisture), AVG(moisture)
+        FROM readings
+        WHERE channel = ? AND timestamp >= ? AND moisture IS NOT NULL
+        GROUP BY col
+        """,
+        (start, 86400 * columns / span, channel, start),
+    )
+    bins = [None] * columns
+    for col, low, high, mean in rows:
+        if 0 <= col < columns:
+            bins[col] = (low / 100, high / 100, mean / 100)
+    return bins
+
+
+class RollupLoader(threading.Thread):
+    """Load rollups from plants.db in the background for views that ask for them."""
+
+    def __init__(self, db_path=DB_PATH, refresh=REFRESH, clock=real_clock):
+        threading.Thread.__init__(self, name="rollup-loader", daemon=True)
+        self.db_path = db_path
+        self.refresh = refresh
+        self.clock = clock
+        self._results = {}
+        self._wanted = {}
+        self._attempted = {}
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+
+    def get(self, channel, span, columns):
+        """Return the latest Rollup, or None until the first load finishes. Never touches SQLite."""
+        key = (channel, span, columns)
+        now = self.clock.time()
+        self._wanted[key] = now
+        result = self._results.get(key)
+        if result is None or now - result.loaded_at > self.refresh:
+            self._wake.set()
+        return result
+
+    def _due(self, key, now):
+        result = self._results.get(key)
+        if result is not None and now - result.loaded_at < self.refresh:
+            return False
+        attempted = self._attempted.get(key)
+        return attempted is None or now - attempted >= RETRY
+
+    def load_due(self, conn):
+        now = self.clock.time()
+        for key, asked in list(self._wanted.items()):
+            if now - asked > self.refresh:
+                # Nobody is looking at this one any more
+                del self._wanted[key]
+                self._results.pop(key, None)
+                continue
+            if not self._due(key, now):
+                continue
+            self._attempted[key] = now
+            channel, span, columns = key
+            wall = self.clock.wall()
+            try:
+                bins = load_rollup(conn, channel, span, columns, wall)
+            except sqlite3.Error as e:
+                logging.warning("Unable to load %ds history for channel %d: %s", span, channel, e)
+                continue
+            self._results[key] = Rollup(now, wall - span, span, bins)
+
+    def run(self):
+        conn = None
+        while not self._stop_event.is_set():
+            self._wake.wait(self.refresh)
+            self._wake.clear()
+            if self._stop_event.is_set():
+                break
+            try:
+                if conn is None:
+                    conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+                self.load_due(conn)
+            except sqlite3.Error as e:
+                logging.warning("Unable to open %s for history: %s", self.db_path, e)
+                conn = None
+                self._stop_event.wait(RETRY)
+        if conn is not None:
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print a channel's long-range rollups from plants.db.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--channel", type=int, default=1)
+    parser.add_argument("--columns", type=int, default=96)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    for name, span in SPANS.items():
+        start = time.perf_counter()
+        bins = load_rollup(conn, args.channel, span, args.columns, time.time())
+        elapsed = time.perf_counter() - start
+        filled = [b for b in bins if b is not None]
+        print(f"{name}: {len(filled)}/{args.columns} columns with data, loaded in {elapsed * 1000:.1f}ms")
+        if filled:
+            print(
+                f"  min {min(b[0] for b in filled) * 100:.1f}%, "
+                f"max {max(b[1] for b in filled) * 100:.1f}%, "
+                f"latest mean {filled[-1][2] * 100:.1f}%"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""Durable local spool for Google Sheets rows, uploaded in batches.
+
+Scripts that used to call values().append for every sample add their rows
+to the spool instead, which is a small SQLite file, so nothing is lost when
+the network or Google is down. The uploader sends everything pending for a
+sheet in one append of up to BATCH_SIZE rows:
+
+    python3 sheets_spool.py flush                 # upload what's pending, eg: from cron
+    python3 sheets_spool.py flush --loop 60       # keep running, flushing every 60s
+    python3 sheets_spool.py status
+
+Requests are at least MIN_INTERVAL apart to stay under the Sheets limit of
+60 writes a minute per user. A failed request is retried with exponential
+backoff, doubling up to BACKOFF_MAX. The retry time is kept in the spool
+so cron runs back off too. A request Sheets rejects outright (a 4xx other
+than auth or rate limiting) won't work on retry, so its rows are moved to
+the rejected table rather than blocking the ones behind them.
+
+Before each append the uploader notes which rows are in flight, and after
+it the last sheet row Sheets reports writing. If it dies between Sheets
+taking the rows and the spool dropping them, the next flush reads back
+column A just past that row: when the rows are already there they're
+dropped instead of being appended a second time.
+
+To try it without Google, run the fake Sheets server and point the
+uploader at it:
+
+    python3 sheets_spool.py fake-server --port 8099 --fail-rate 0.3
+    python3 sheets_spool.py flush --endpoint http://127.0.0.1:8099
+"""
+import argparse
+import fcntl
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+from clock import real_clock
+
+# ====== CONFIG ======
+BASE_DIR = "/home/jasonvega/Desktop/project"
+SPOOL_PATH = os.path.join(BASE_DIR, "sheets_spool.db")
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+CREDENTIALS_PATH = os.path.join(BASE_DIR, "sheets_credentials.json")
+TOKEN_PATH = os.path.join(BASE_DIR, "sheets_token.json")
+BATCH_SIZE = 500
+MIN_INTERVAL = 1.0
+BACKOFF_BASE = 30
+BACKOFF_MAX = 3600
+# ====================
+
+# Retrying these can work: auth that needs refreshing, rate limiting and timeouts
+RETRYABLE = {401, 403, 408, 429}
+
+
+class Spool:
+    def __init__(self, path=SPOOL_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS rows (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                spreadsheet_id TEXT,
+                range TEXT,
+                input_option TEXT,
+                row TEXT,
+                created TEXT
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS rejected (
+                id INTEGER PRIMARY KEY,
+                spreadsheet_id TEXT,
+                range TEXT,
+                input_option TEXT,
+                row TEXT,
+                created TEXT,
+                error TEXT
+            )
+        """)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value REAL)")
+        self.conn.commit()
+
+    def append(self, spreadsheet_id, range_name, rows, input_option="RAW", state=None):
+        """Queue rows (lists of cell values) to be appended to range_name.
+
+        state is a dict of state keys to set in the same transaction, so a
+        caller can record how far it has read along with the rows.
+        """
+        created = time.strftime("%Y-%m-%d %H:%M:%S")
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO rows (spreadsheet_id, range, input_option, row, created) VALUES (?, ?, ?, ?, ?)",
+                [(spreadsheet_id, range_name, input_option, json.dumps(row), created) for row in rows],
+            )
+            self._write_state(state)
+
+    def pending(self):
+        return self.conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def next_batch(self, limit=BATCH_SIZE):
+        """Return ((spreadsheet_id, range, input_option), ids, rows) for the oldest sheet with rows, or None."""
+        target = self.conn.execute(
+            "SELECT spreadsheet_id, range, input_option FROM rows ORDER BY id LIMIT 1"
+        ).fetchone()
+        if target is None:
+            return None
+        ids = []
+        rows = []
+        for row_id, row in self.conn.execute(
+            "SELECT id, row FROM rows WHERE spreadsheet_id = ? AND range = ? AND input_option = ? ORDER BY id LIMIT ?",
+            (*target, limit),
+        ):
+            ids.append(row_id)
+            rows.append(json.loads(row))
+        return target, ids, rows
+
+    def remove(self, ids, state=None):
+        with self.conn:
+            self.conn.executemany("DELETE FROM rows WHERE id = ?", [(row_id,) for row_id in ids])
+            self._write_state(state)
+
+    def reject(self, ids, error):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO rejected SELECT *, ? FROM rows WHERE id = ?",
+                [(error, row_id) for row_id in ids],
+            )
+            self.conn.executemany("DELETE FROM rows WHERE id = ?", [(row_id,) for row_id in ids])
+
+    def get_state(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_state(self, key, value):
+        with self.conn:
+            self._write_state({key: value})
+
+    def _write_state(self, state):
+        if state:
+            self.conn.executemany("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", state.items())
+
+    def close(self):
+        self.conn.close()
+
+
+def last_row(response):
+    """The last sheet row an append wrote, from its updatedRange (eg: Sheet6!A1201:D1700), or None."""
+    updated = response.get("updates", {}).get("updatedRange", "")
+    match = re.search(r"(\d+)$", updated)
+    return int(match.group(1)) if match else None
+
+
+def http_status(error):
+    """HTTP status of a googleapiclient HttpError, or None for network errors."""
+    resp = getattr(error, "resp", None)
+    status = getattr(resp, "status", None)
+    return int(status) if status is not None else None
+
+
+class Uploader:
+    """Send spooled rows to Sheets, one append per batch."""
+
+    def __init__(
+        self,
+        spool,
+        service_factory,
+        batch_size=BATCH_SIZE,
+        min_interval=MIN_INTERVAL,
+        clock=real_clock,
+    ):
+        self.spool = spool
+        # Only called once there's something to upload, so an idle run never builds a client
+        self.service_factory = service_factory
+        self.batch_size = batch_size
+        self.min_interval = min_interval
+        self.clock = clock
+        self._service = None
+        self._last_request = None
+
+    def backoff_remaining(self):
+        return max(0.0, self.spool.get_state("retry_at", 0.0) - self.clock.wall())
+
+    def _lock(self):
+        lock = open(self.spool.path + ".lock", "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return None
+        return lock
+
+    def _values(self):
+        if self._service is None:
+            self._service = self.service_factory()
+        if self._last_request is not None:
+            wait = self._last_request + self.min_interval - self.clock.time()
+            if wait > 0:
+                self.clock.sleep(wait)
+        self._last_request = self.clock.time()
+        return self._service.spreadsheets().values()
+
+    def _send(self, target, rows):
+        spreadsheet_id, range_name, input_option = target
+        return self._values().append(
+            spreadsheetId=spreadsheet_id,
+            range=range_name,
+            valueInputOption=input_option,
+            insertDataOption="INSERT_ROWS",
+            body={"values": rows},
+        ).execute(num_retries=0)
+
+    def _already_sent(self, target, ids, rows):
+        """How many of these rows an interrupted flush already appended, 0 when none or unsure."""
+        key = f"{target[0]}:{target[1]}"
+        count = int(self.spool.get_state(f"inflight_rows:{key}", 0))
+        last = self.spool.get_state(f"last_row:{key}")
+        if self.spool.get_state(f"inflight:{key}") != ids[0] or not count or last is None or count > len(ids):
+            return 0
+        # The rows Sheets would have written are the ones right after the last append we know about
+        sheet = target[1].split("!")[0] + "!" if "!" in target[1] else ""
+        first = int(last) + 1
+        try:
+            result = self._values().get(
+                spreadsheetId=target[0],
+                range=f"{sheet}A{first}:A{first + count - 1}",
+            ).execute(num_retries=0)
+        except Exception as e:
+            status = http_status(e)
+            if status is not None and 400 <= status < 500 and status not in RETRYABLE:
+                return 0
+            raise
+        found = [value[0] if value else "" for value in result.get("values", [])]
+        expected = [str(row[0]) if row else "" for row in rows[:count]]
+        return count if found == expected else 0
+
+    def flush(self):
+        """Upload pending rows until the spool is empty or a request fails, returning how many were sent."""
+        if self.backoff_remaining() > 0:
+            print(f"ℹ️ Backing off after a failed upload, next try in {self.backoff_remaining():.0f}s.")
+            return 0
+        lock = self._lock()
+        if lock is None:
+            print("ℹ️ Another uploader is already flushing the spool.")
+            return 0
+
+        uploaded = 0
+        try:
+            while True:
+                batch = self.spool.next_batch(self.batch_size)
+                if batch is None:
+                    break
+                target, ids, rows = batch
+                key = f"{target[0]}:{target[1]}"
+                try:
+                    sent = self._already_sent(target, ids, rows)
+                    if sent:
+                        print(f"ℹ️ {sent} row(s) for {target[1]} were appended before an interrupted flush, not sending them again.")
+                        last = int(self.spool.get_state(f"last_row:{key}")) + sent
+                        self.spool.remove(ids[:sent], state={f"last_row:{key}": last, f"inflight:{key}": 0})
+                        continue
+                    self.spool.set_state(f"inflight_rows:{key}", len(ids))
+                    self.spool.set_state(f"inflight:{key}", ids[0])
+                    response = self._send(target, rows)
+                except Exception as e:
+                    status = http_status(e)
+                    if status is not None and 400 <= status < 500 and status not in RETRYABLE:
+                        print(f"❌ Sheets rejected {len(rows)} row(s) for {target[1]}, moved to rejected: {e}")
+                        self.spool.reject(ids, str(e))
+                        continue
+                    failures = int(self.spool.get_state("failures", 0)) + 1
+                    delay = min(BACKOFF_BASE * 2 ** (failures - 1), BACKOFF_MAX)
+                    # Jitter so several Pis sharing a quota don't retry in step
+                    delay *= random.uniform(0.75, 1.0)
+                    self.spool.set_state("failures", failures)
+                    self.spool.set_state("retry_at", self.clock.wall() + delay)
+                    print(f"⚠️ Sheets upload failed ({e}), retrying in {delay:.0f}s.")
+                    break
+                state = {f"inflight:{key}": 0, "failures": 0}
+                if last_row(response) is not None:
+                    state[f"last_row:{key}"] = last_row(response)
+                self.spool.remove(ids, state=state)
+                uploaded += len(rows)
+        finally:
+            lock.close()
+        return uploaded
+
+
+def sheets_service(token_path=TOKEN_PATH, credentials_path=CREDENTIALS_PATH, endpoint=None):
+    """Build a Sheets client, unauthenticated against endpoint if given (for the fake server)."""
+    import google_clients
+
+    if endpoint is not None:
+        import httplib2
+
+        return google_clients.sheets(http=httplib2.Http(), endpoint=endpoint)
+
+    import oauth_manager
+
+    creds = oauth_manager.credentials(token_path, credentials_path, SCOPES)
+    return google_clients.sheets(credentials=creds)
+
+
+def flush(spool_path=SPOOL_PATH, service_factory=None):
+    """Upload what's pending in the spool at spool_path, returning how many rows were sent."""
+    spool = Spool(spool_path)
+    try:
+        if not spool.pending():
+            return 0
+        return Uploader(spool, service_factory or sheets_service).flush()
+    finally:
+        spool.close()
+
+
+# ==========================
+# Fake Sheets server for testing
+# ==========================
+
+APPEND_PATH = re.compile(r"^/v4/spreadsheets/([^/]+)/values/(.+):append")
+GET_PATH = re.compile(r"^/v4/spreadsheets/([^/]+)/values/([^?]+)")
+CELLS = re.compile(r"^(?:(.+)!)?([A-Z]+)(\d+):[A-Z]+(\d+)$")
+
+
+def fake_server(host="127.0.0.1", port=8099, fail_rate=0.0, per_minute=60):
+    """Serve values.append and values.get like Sheets does, failing fail_rate of requests with a 503 and rate limiting with a 429."""
+    sheets = {}
+    recent = deque()
+    lock = threading.Lock()
+
+    def sheet_name(range_name):
+        return range_name.split("!")[0] if "!" in range_name else ""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            match = GET_PATH.match(self.path)
+            cells = match and CELLS.match(unquote(match.group(2)))
+            if not cells:
+                self._reply(404, {"error": {"code": 404, "message": "Not found"}})
+                return
+            sheet, _, first, last = cells.groups()
+            with lock:
+                rows = sheets.get((match.group(1), sheet or ""), [])[int(first) - 1:int(last)]
+            # Only column A is ever read back, formatted the way Sheets shows it
+            values = [[str(row[0])] if row else [] for row in rows]
+            self._reply(200, {"range": unquote(match.group(2)), "majorDimension": "ROWS", "values": values})
+
+        def do_POST(self):
+            match = APPEND_PATH.match(self.path)
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if match is None:
+                self._reply(404, {"error": {"code": 404, "message": "Not found"}})
+                return
+
+            with lock:
+                now = time.monotonic()
+                while recent and recent[0] < now - 60:
+                    recent.popleft()
+                if len(recent) >= per_minute:
+                    self._reply(429, {"error": {"code": 429, "message": "Quota exceeded"}})
+                    return
+                recent.append(now)
+                if random.random() < fail_rate:
+                    self._reply(503, {"error": {"code": 503, "message": "The service is currently unavailable."}})
+                    return
+                key = (match.group(1), sheet_name(unquote(match.group(2))))
+                sheets.setdefault(key, []).extend(body.get("values", []))
+                total = len(sheets[key])
+
+            rows = len(body.get("values", []))
+            updated = f"{key[1] + '!' if key[1] else ''}A{total - rows + 1}:D{total}"
+            logging.info("Appended %d row(s) to %s, %d in total", rows, updated, total)
+            self._reply(200, {"spreadsheetId": key[0], "updates": {"updatedRange": updated, "updatedRows": rows}})
+
+        def _reply(self, status, data):
+            payload = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    logging.info("Fake Sheets server on http://%s:%d", host, port)
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("flush", "status", "fake-server"))
+    parser.add_argument("--spool", default=SPOOL_PATH)
+    parser.add_argument("--endpoint", help="Sheets API root, eg: http://127.0.0.1:8099 for the fake server")
+    parser.add_argument("--loop", type=float, metavar="SECONDS", help="keep flushing every SECONDS")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fake server: share of requests to fail")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+    if args.command == "fake-server":
+        fake_server(port=args.port, fail_rate=args.fail_rate)
+        return
+
+    if args.command == "status":
+        spool = Spool(args.spool)
+        rejected = spool.conn.execute("SELECT COUNT(*) FROM rejected").fetchone()[0]
+        retry_at = spool.get_state("retry_at", 0.0)
+        print(f"📄 {spool.pending()} row(s) pending, {rejected} rejected")
+        if retry_at > time.time():
+            failures = spool.get_state("failures", 0)
+            print(f"⚠️ Backing off after {failures:.0f} failure(s), next try in {retry_at - time.time():.0f}s")
+        spool.close()
+        return
+
+    def service_factory():
+        return sheets_service(endpoint=args.endpoint)
+
+    if args.loop is not None and args.endpoint is None:
+        import oauth_manager
+
+        # Keep the token fresh between flushes so an upload never waits on a refresh
+        oauth_manager.get_manager(TOKEN_PATH, CREDENTIALS_PATH, SCOPES).start()
+
+    while True:
+        start = time.perf_counter()
+        uploaded = flush(args.spool, service_factory)
+        if uploaded:
+            print(f"✅ Uploaded {uploaded} row(s) in {time.perf_counter() - start:.2f}s")
+        if args.loop is None:
+            break
+        time.sleep(args.loop)
+
+
+if __name__ == "__main__":
+    main()
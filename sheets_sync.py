@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Copy the rows added to plants.db since the last run to Google Sheets.
+
+grow-monitor and database.py already log every moisture, temperature and
+UV reading to plants.db, so the Sheets scripts no longer read the sensors
+themselves. Each source table keeps a high-water mark, the id of the last
+row copied. Rows after it are turned into sheet rows and added to the
+Sheets spool, then the spool is flushed with one append per sheet:
+
+    readings -> Sheet6: timestamp, channel 1 %, channel 2 %, channel 3 %
+    sensors  -> Sheet5: timestamp, sensor, value, unit (a UV and an AmbientTemp row)
+
+The marks are kept in the spool's state table and written in the same
+transaction as the rows, so a crash either spools a delta and moves its
+mark or does neither, and running again never spools a row twice. The
+first run starts at the newest rows rather than copying the whole history
+again, unless --backfill is given.
+
+    python3 sheets_sync.py                 # eg: from cron every 5 minutes
+    python3 sheets_sync.py --dry-run       # show what would be spooled
+    python3 sheets_sync.py --endpoint http://127.0.0.1:8099
+"""
+import argparse
+import fcntl
+import sqlite3
+
+from database import DB_PATH
+from sheets_spool import SPOOL_PATH, Spool, flush, sheets_service
+
+# ====== CONFIG ======
+SPREADSHEET_ID = '1fTo3iM-Cx3aHHIhCSZdE_poF8YB6l79xb78klvEHR98'
+MOISTURE_RANGE = 'Sheet6!A:D'
+SENSOR_RANGE = 'Sheet5!A:D'
+CHANNELS = (1, 2, 3)
+# Units the Ardusat UVLight and Temperature sensors report (unit_to_str in ArdusatSDK.cpp)
+UV_UNIT = "mW/cm^2"
+TEMP_UNIT = "C"
+# ====================
+
+
+def moisture_rows(conn, after):
+    """One Sheet6 row per timestamp for the readings after id `after`, and the last id read."""
+    last_id = after
+    rows = {}
+    for row_id, timestamp, channel, moisture in conn.execute(
+        "SELECT id, timestamp, channel, moisture FROM readings WHERE id > ? ORDER BY id", (after,)
+    ):
+        last_id = row_id
+        if channel not in CHANNELS:
+            continue
+        row = rows.setdefault(timestamp, [timestamp] + [""] * len(CHANNELS))
+        if moisture is not None:
+            row[CHANNELS.index(channel) + 1] = f"{moisture:.1f}"
+    return list(rows.values()), last_id
+
+
+def sensor_rows(conn, after):
+    """Sheet5 rows for the sensors rows after id `after`, and the last id read."""
+    last_id = after
+    rows = []
+    for row_id, timestamp, temp, light in conn.execute(
+        "SELECT id, timestamp, temp, light FROM sensors WHERE id > ? ORDER BY id", (after,)
+    ):
+        last_id = row_id
+        if light is not None:
+            rows.append([timestamp, "UV", light, UV_UNIT])
+        if temp is not None:
+            rows.append([timestamp, "AmbientTemp", temp, TEMP_UNIT])
+    return rows, last_id
+
+
+# table: (range, read function, valueInputOption)
+# Sheet5 has always been appended USER_ENTERED, so its timestamps and values stay dates and numbers
+SOURCES = {
+    "readings": (MOISTURE_RANGE, moisture_rows, "RAW"),
+    "sensors": (SENSOR_RANGE, sensor_rows, "USER_ENTERED"),
+}
+
+
+def sync(db_path=DB_PATH, spool_path=SPOOL_PATH, sources=tuple(SOURCES), backfill=False, dry_run=False):
+    """Spool the rows added to each source table since the last sync, returning {table: rows spooled}."""
+    # Two syncs at once would both read the same delta
+    lock = open(spool_path + ".sync.lock", "w")
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    spool = Spool(spool_path)
+    spooled = {}
+    try:
+        for table in sources:
+            range_name, read, input_option = SOURCES[table]
+            key = f"sync:{table}"
+            mark = spool.get_state(key)
+            newest = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+            if mark is None:
+                mark = 0 if backfill else newest
+            elif mark > newest:
+                print(f"⚠️ {table} ends at id {newest} but was synced up to {mark:.0f}, is plants.db new? Starting over.")
+                mark = 0
+
+            rows, last_id = read(conn, int(mark))
+            spooled[table] = len(rows)
+            if dry_run:
+                print(f"📄 {table}: {len(rows)} row(s) for {range_name} after id {mark:.0f}")
+                for row in rows[:5]:
+                    print("   ", row)
+                continue
+            if rows or last_id != spool.get_state(key):
+                spool.append(SPREADSHEET_ID, range_name, rows, input_option, state={key: last_id})
+    finally:
+        spool.close()
+        conn.close()
+        lock.close()
+    return spooled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--spool", default=SPOOL_PATH)
+    parser.add_argument("--table", action="append", choices=tuple(SOURCES), help="only sync these tables")
+    parser.add_argument("--backfill", action="store_true", help="on the first run, copy every row, not just new ones")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--endpoint", help="Sheets API root, eg: http://127.0.0.1:8099 for the fake server")
+    args = parser.parse_args()
+
+    spooled = sync(args.db, args.spool, args.table or tuple(SOURCES), args.backfill, args.dry_run)
+    if args.dry_run:
+        return
+    for table, count in spooled.items():
+        if count:
+            print(f"📄 Spooled {count} new row(s) from {table}")
+
+    uploaded = flush(args.spool, lambda: sheets_service(endpoint=args.endpoint))
+    if uploaded:
+        print(f"✅ Uploaded {uploaded} row(s) to Google Sheets")
+
+
+if __name__ == "__main__":
+    main()
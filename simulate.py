@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""Replay recorded moisture history through Channel.update to try out watering settings.
+
+    python3 simulate.py --channel 1 --water-level 0.3,0.4,0.5 --pump-time 0.2,0.5 --watering-delay 60,600
+
+Readings and pump runs are loaded from plants.db once, then every
+combination of the comma separated values is run on a process pool. Each
+run drives a real Channel with a virtual sensor, pump and clock, ticking
+once per --tick seconds like the sensor does, so hours of history replay
+in well under a second.
+
+The recorded saturation is only what happened with the settings used at
+the time. To see what a different setting would have done, each pump run
+is modelled as a jump in saturation of gain * speed * seconds that drains
+away with time constant --tau. Runs that really happened are taken back
+out and the simulated ones added in. gain is estimated from the rise after
+each recorded run unless --gain is given.
+
+For each configuration it prints the number of pump runs, the water used
+and how long saturation sat below the warn level.
+
+    python3 simulate.py --scenario 24
+
+runs grow-monitor's channel and alarm logic for a day of synthetic drying
+soil instead, with watering delays, alarm beeps and snoozes, as a quick
+check that the timing logic still hangs together.
+"""
+import argparse
+import itertools
+import logging
+import math
+import sqlite3
+import statistics
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import yaml
+
+from alarm import AlarmState
+from channel import Channel, ChannelRegistry
+from clock import VirtualClock
+from database import DB_PATH, FLOW_ML_PER_SEC, SETTINGS_PATH, parse_time
+
+DEFAULT_GAIN = 0.1
+DEFAULT_TAU = 6 * 3600
+# Longer gaps between readings are treated as the monitor being off
+MAX_GAP = 1800
+
+PARAMETERS = ["water_level", "warn_level", "pump_speed", "pump_time", "watering_delay"]
+
+
+class SimSensor:
+    """Stands in for Moisture, the simulator passes saturation to update() directly."""
+
+    def __init__(self):
+        self.saturation = 0.0
+        self.moisture = 0.0
+        self.active = True
+        self.new_data = False
+
+    def set_wet_point(self, wet_point):
+        pass
+
+    def set_dry_point(self, dry_point):
+        pass
+
+
+class DryingSensor:
+    """Soil drying at a steady rate per hour, reporting a reading every interval seconds."""
+
+    def __init__(self, clock, saturation=0.8, drying_rate=0.02, interval=1.0):
+        self.clock = clock
+        self.saturation = saturation
+        self.drying_rate = drying_rate
+        self.interval = interval
+        self.moisture = 0.0
+        self.active = True
+        self._wet_point = 0.7
+        self._dry_point = 26.7
+        self._time_last_reading = clock.time()
+
+    def set_wet_point(self, wet_point):
+        self._wet_point = wet_point
+
+    def set_dry_point(self, dry_point):
+        self._dry_point = dry_point
+
+    def water(self, amount):
+        self.saturation = min(1.0, self.saturation + amount)
+
+    @property
+    def new_data(self):
+        elapsed = self.clock.time() - self._time_last_reading
+        if elapsed < self.interval:
+            return False
+        self._time_last_reading += elapsed
+        self.saturation = max(0.0, self.saturation - self.drying_rate * elapsed / 3600)
+        self.moisture = self._dry_point + self.saturation * (self._wet_point - self._dry_point)
+        return True
+
+
+class SimPump:
+    """Stands in for Pump, recording each dose instead of running a motor.
+
+    Doses wet sensor, if given, by gain * speed * seconds.
+
+    """
+
+    def __init__(self, clock, sensor=None, gain=DEFAULT_GAIN):
+        self.clock = clock
+        self.sensor = sensor
+        self.gain = gain
+        self.doses = []
+
+    def dose(self, speed, timeout=0.1, blocking=True, force=False):
+        self.doses.append((self.clock.time(), speed, timeout))
+        if self.sensor is not None:
+            self.sensor.water(self.gain * speed * timeout)
+        return True
+
+    def get_speed(self):
+        return 0
+
+    def stop(self):
+        pass
+
+
+def load_history(db_path, channel, start=None, end=None):
+    """Return ([(t, saturation)], [(t, speed, seconds)]) for one channel, oldest first."""
+    where = "channel = ?"
+    params = [channel]
+    if start is not None:
+        where += " AND timestamp >= ?"
+        params.append(start)
+    if end is not None:
+        where += " AND timestamp < ?"
+        params.append(end)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        readings = [
+            (parse_time(timestamp), moisture / 100.0)
+            for timestamp, moisture in conn.execute(
+                f"SELECT timestamp, moisture FROM readings WHERE {where} AND moisture IS NOT NULL "
+                "ORDER BY timestamp",
+                params,
+            )
+        ]
+        doses = [
+            (parse_time(timestamp), rate, duration)
+            for timestamp, rate, duration in conn.execute(
+                f"SELECT timestamp, rate, duration FROM pump_log WHERE {where} ORDER BY timestamp",
+                params,
+            )
+        ]
+    finally:
+        conn.close()
+    return readings, doses
+
+
+def estimate_gain(readings, doses, window=900):
+    """Median saturation rise per speed-second in the window after each recorded pump run."""
+    gains = []
+    i = 0
+    for t, speed, seconds in doses:
+        while i < len(readings) and readings[i][0] < t:
+            i += 1
+        if i == 0 or i == len(readings) or speed * seconds <= 0:
+            continue
+        before = readings[i - 1][1]
+        after = [sat for when, sat in readings[i:i + 20] if when - t <= window]
+        if after and max(after) > before:
+            gains.append((max(after) - before) / (speed * seconds))
+    return statistics.median(gains) if gains else None
+
+
+def simulate(readings, doses, params, base=None, tick=1.0, gain=DEFAULT_GAIN, tau=DEFAULT_TAU, flow=FLOW_ML_PER_SEC):
+    """Run one configuration over the recorded history and return its metrics."""
+    clock = VirtualClock(readings[0][0])
+    pump = SimPump(clock)
+    channel = Channel(1, 1, 1, sensor=SimSensor(), pump=pump, clock=clock)
+    channel.update_from_yml(base)
+    channel.update_from_yml(params)
+    channel.enabled = True
+    channel.auto_water = True
+
+    # Simulated minus recorded pump effect, decaying towards nothing
+    offset = 0.0
+    below_warn = 0.0
+    simulated = 0.0
+    next_dose = 0
+    decay = math.exp(-tick / tau)
+
+    for (t0, sat0), (t1, sat1) in zip(readings, readings[1:]):
+        if t1 - t0 > MAX_GAP:
+            # Nothing was recorded, skip ahead and let the offset drain meanwhile
+            offset *= math.exp(-(t1 - t0) / tau)
+            clock.set(t1)
+            continue
+
+        now = t0
+        while now < t1:
+            while next_dose < len(doses) and doses[next_dose][0] <= now:
+                _, speed, seconds = doses[next_dose]
+                offset -= gain * speed * seconds
+                next_dose += 1
+
+            clock.set(now)
+            recorded = sat0 + (sat1 - sat0) * (now - t0) / (t1 - t0)
+            sat = max(0.0, min(1.0, recorded + offset))
+            channel.add_reading(now, sat)
+            if channel.update(sat):
+                offset += gain * channel.pump_speed * channel.pump_time
+
+            if sat < channel.warn_level:
+                below_warn += tick
+            simulated += tick
+            offset *= decay
+            now += tick
+
+    return {
+        "pump_runs": len(pump.doses),
+        "water_ml": sum(speed * seconds for _, speed, seconds in pump.doses) * flow,
+        "below_warn_hours": below_warn / 3600,
+        "simulated_hours": simulated / 3600,
+    }
+
+
+_history = None
+
+
+def _init_worker(readings, doses, base, options):
+    global _history
+    # Channel logs every simulated watering and alarm
+    logging.disable(logging.WARNING)
+    _history = (readings, doses, base, options)
+
+
+def _run(params):
+    readings, doses, base, options = _history
+    return params, simulate(readings, doses, params, base, **options)
+
+
+def parse_values(text, kind=float):
+    return [kind(value) for value in text.split(",")] if text else [None]
+
+
+def sweep(readings, doses, grid, base=None, workers=None, **options):
+    """Simulate every combination in grid, a dict of parameter name to list of values."""
+    names = list(grid)
+    configurations = [
+        {name: value for name, value in zip(names, values) if value is not None}
+        for values in itertools.product(*grid.values())
+    ]
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(readings, doses, base, options)
+    ) as executor:
+        return list(executor.map(_run, configurations, chunksize=max(1, len(configurations) // 64)))
+
+
+def scenario(hours=24, tick=2.0, reading_interval=60, snoozes=(12, 16, 20)):
+    """Run the main loop's channel and alarm logic over hours of virtual time.
+
+    The loop ticks every tick seconds rather than grow-monitor's 1 / FPS,
+    which is plenty for alarm intervals of several seconds. Three channels
+    dry at different rates, with a sensor reading every reading_interval
+    seconds. The third has auto water off, so it drops below
+    its warn level and the alarm beeps until snoozed with button B at each
+    hour in snoozes.
+
+    """
+    clock = VirtualClock()
+    channels = []
+    for number, drying_rate, auto_water in ((1, 0.01, True), (2, 0.04, True), (3, 0.05, False)):
+        sensor = DryingSensor(clock, drying_rate=drying_rate, interval=reading_interval)
+        channels.append(
+            Channel(
+                number, number, number,
+                water_level=0.5, warn_level=0.3, pump_speed=0.5, pump_time=1.0, watering_delay=600,
+                auto_water=auto_water, enabled=True,
+                sensor=sensor, pump=SimPump(clock, sensor), clock=clock,
+            )
+        )
+    channels = ChannelRegistry(channels, clock)
+    alarm = AlarmState(interval=10.0, clock=clock)
+    # Never set, the loop just sleeps for tick like grow-monitor with no button presses
+    wake = threading.Event()
+
+    snoozes = [hour * 3600 for hour in sorted(snoozes)]
+    alarm_seconds = 0.0
+    snoozed_seconds = 0.0
+    while clock.time() < hours * 3600:
+        if snoozes and clock.time() >= snoozes[0]:
+            snoozes.pop(0)
+            alarm.sleep()
+
+        channels.update()
+        for channel in channels:
+            if channel.alarm:
+                alarm.trigger()
+        alarm.update()
+
+        if any(channel.alarm for channel in channels):
+            alarm_seconds += tick
+            if alarm.sleeping():
+                snoozed_seconds += tick
+        clock.wait(wake, tick)
+
+    return {
+        "pump_runs": {channel.channel: len(channel.pump.doses) for channel in channels},
+        "beeps": alarm.beeps,
+        "alarm_hours": alarm_seconds / 3600,
+        "snoozed_hours": snoozed_seconds / 3600,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--settings", default=SETTINGS_PATH, help="settings.yml to take unswept values from")
+    parser.add_argument("--channel", type=int)
+    parser.add_argument("--start", help="first timestamp to replay, eg: 2025-11-01")
+    parser.add_argument("--end", help="replay readings before this timestamp")
+    parser.add_argument("--water-level", help="eg: 0.3,0.4,0.5")
+    parser.add_argument("--warn-level")
+    parser.add_argument("--pump-speed")
+    parser.add_argument("--pump-time")
+    parser.add_argument("--watering-delay")
+    parser.add_argument("--tick", type=float, default=1.0, help="seconds between simulated sensor readings")
+    parser.add_argument("--gain", type=float, help="saturation added per speed-second of pumping")
+    parser.add_argument("--tau", type=float, default=DEFAULT_TAU, help="seconds for added water to drain by 1/e")
+    parser.add_argument("--flow", type=float, default=FLOW_ML_PER_SEC, help="ml per second at full speed")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--scenario", type=float, metavar="HOURS", help="run the synthetic scenario instead")
+    args = parser.parse_args()
+
+    if args.scenario:
+        start = time.perf_counter()
+        metrics = scenario(args.scenario)
+        elapsed = time.perf_counter() - start
+        runs = ", ".join(f"channel {number}: {count}" for number, count in metrics["pump_runs"].items())
+        print(f"💧 Pump runs {runs}")
+        print(
+            f"🔔 {metrics['beeps']} beeps, alarm on for {metrics['alarm_hours']:.1f}h "
+            f"of which {metrics['snoozed_hours']:.1f}h snoozed"
+        )
+        print(f"✅ {args.scenario:g}h simulated in {elapsed:.2f}s")
+        return
+
+    if args.channel is None:
+        parser.error("--channel is required unless running --scenario")
+
+    readings, doses = load_history(args.db, args.channel, args.start, args.end)
+    if len(readings) < 2:
+        print(f"❌ Not enough readings for channel {args.channel} in {args.db}")
+        return
+
+    base = None
+    try:
+        with open(args.settings) as file:
+            base = (yaml.safe_load(file) or {}).get(f"channel{args.channel}")
+    except (OSError, yaml.YAMLError) as e:
+        print(f"⚠️ Using Channel defaults, could not read {args.settings}: {e}")
+
+    gain = args.gain
+    if gain is None:
+        gain = estimate_gain(readings, doses) or DEFAULT_GAIN
+    print(
+        f"📈 {len(readings)} readings and {len(doses)} pump runs on channel {args.channel}, "
+        f"gain {gain:.3f}/speed-sec, tau {args.tau / 3600:.1f}h"
+    )
+
+    grid = {
+        "water_level": parse_values(args.water_level),
+        "warn_level": parse_values(args.warn_level),
+        "pump_speed": parse_values(args.pump_speed),
+        "pump_time": parse_values(args.pump_time),
+        "watering_delay": parse_values(args.watering_delay),
+    }
+    start = time.perf_counter()
+    results = sweep(
+        readings, doses, grid, base, args.workers,
+        tick=args.tick, gain=gain, tau=args.tau, flow=args.flow,
+    )
+    elapsed = time.perf_counter() - start
+
+    defaults = Channel(1, 1, 1, sensor=SimSensor(), pump=SimPump(VirtualClock()))
+    defaults.update_from_yml(base)
+    print(f"{'water':>6} {'warn':>6} {'speed':>6} {'time':>6} {'delay':>6} | {'runs':>6} {'water ml':>9} {'<warn h':>8}")
+    for params, metrics in sorted(results, key=lambda result: (result[1]["below_warn_hours"], result[1]["water_ml"])):
+        values = [params.get(name, getattr(defaults, name)) for name in PARAMETERS]
+        print(
+            f"{values[0]:6.2f} {values[1]:6.2f} {values[2]:6.2f} {values[3]:6.2f} {values[4]:6.0f} | "
+            f"{metrics['pump_runs']:6d} {metrics['water_ml']:9.0f} {metrics['below_warn_hours']:8.1f}"
+        )
+
+    simulated = sum(metrics["simulated_hours"] for _, metrics in results) * 3600
+    print(
+        f"✅ {len(results)} configuration(s) in {elapsed:.2f}s, "
+        f"{simulated / elapsed:,.0f}x real time"
+    )
+
+
+if __name__ == "__main__":
+    main()
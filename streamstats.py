@@ -0,0 +1,95 @@
+"""O(1) streaming statistics for a channel's saturation readings."""
+import math
+
+
+class StreamingStats:
+    """Track a smoothed level, its variance and how fast it is drying out.
+
+    Every sample updates:
+
+    ewma       exponentially weighted moving average, weight alpha per sample
+    variance   exponentially weighted variance with the same weight
+    slope      saturation change per second, from a least-squares line fitted
+               with exponential forgetting (half-life slope_halflife seconds)
+
+    Nothing is kept per sample, so the cost is constant however long it runs.
+
+    """
+
+    def __init__(self, alpha=0.1, slope_halflife=1800):
+        self.alpha = alpha
+        self.slope_halflife = slope_halflife
+        self.count = 0
+        self.ewma = 0.0
+        self.variance = 0.0
+        self.last = None
+        self._t_last = None
+        # Weighted sums for the regression, with time measured from the latest sample
+        self._s0 = 0.0
+        self._st = 0.0
+        self._sy = 0.0
+        self._stt = 0.0
+        self._sty = 0.0
+
+    def add(self, t, value):
+        """Add a sample taken at time t (seconds)."""
+        if self.count == 0:
+            self.ewma = value
+            self.variance = 0.0
+        else:
+            diff = value - self.ewma
+            increment = self.alpha * diff
+            self.ewma += increment
+            self.variance = (1 - self.alpha) * (self.variance + diff * increment)
+
+        if self._t_last is not None:
+            dt = t - self._t_last
+            decay = 0.5 ** (dt / self.slope_halflife)
+            # Move the time origin to t, then fade the old samples
+            self._stt = (self._stt - 2 * dt * self._st + dt * dt * self._s0) * decay
+            self._sty = (self._sty - dt * self._sy) * decay
+            self._st = (self._st - dt * self._s0) * decay
+            self._s0 *= decay
+            self._sy *= decay
+
+        self._s0 += 1.0
+        self._sy += value
+        self._t_last = t
+        self.last = value
+        self.count += 1
+
+    @property
+    def stddev(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def slope(self):
+        """Saturation change per second, negative while drying."""
+        denominator = self._s0 * self._stt - self._st * self._st
+        if self.count < 3 or denominator <= 1e-12:
+            return 0.0
+        return (self._s0 * self._sty - self._st * self._sy) / denominator
+
+    @property
+    def drying_rate(self):
+        """Saturation lost per hour, as a fraction (0.01 is 1% an hour)."""
+        return -self.slope * 3600
+
+    def time_until(self, level):
+        """Seconds until the smoothed saturation falls to level.
+
+        0 if it is already there, None if it is not falling.
+
+        """
+        if self.count == 0:
+            return None
+        if self.ewma <= level:
+            return 0.0
+        slope = self.slope
+        if slope >= 0:
+            return None
+        return (self.ewma - level) / -slope
+
+    def value(self, default):
+        """The smoothed saturation, or default before any samples arrive."""
+        return self.ewma if self.count else default
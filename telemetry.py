@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""Ship moisture readings and pump events from a Grow-monitor Pi to an aggregator.
+
+Readings are buffered in the acquisition path and packed into compact,
+zlib-compressed binary batches. A background thread sends them over UDP or
+HTTP so a slow network never stalls the display loop.
+
+Payload layout (before compression), all big-endian:
+
+    header   magic "GRT1", version u8, seq u32, readings u16, pumps u16, node length u8, node utf-8
+    reading  timestamp f64, channel u8, moisture f32, saturation f32
+    pump     timestamp f64, channel u8, rate f32, duration f32
+"""
+import logging
+import queue
+import socket
+import struct
+import threading
+import time
+import urllib.request
+import zlib
+
+MAGIC = b"GRT1"
+VERSION = 1
+
+HEADER = struct.Struct("!4sBIHHB")
+READING = struct.Struct("!dBff")
+PUMP = struct.Struct("!dBff")
+
+# A UDP datagram must stay under the typical 1500 byte MTU once compressed
+MAX_BATCH = 200
+
+
+def encode_payload(node, seq, readings, pumps):
+    """Pack one batch into compressed bytes."""
+    node = node.encode("utf-8")[:255]
+    parts = [HEADER.pack(MAGIC, VERSION, seq, len(readings), len(pumps), len(node)), node]
+    parts.extend(READING.pack(*reading) for reading in readings)
+    parts.extend(PUMP.pack(*pump) for pump in pumps)
+    return zlib.compress(b"".join(parts), 6)
+
+
+def decode_payload(payload):
+    """Unpack a batch, returning (node, seq, readings, pumps)."""
+    data = zlib.decompress(payload)
+    magic, version, seq, n_readings, n_pumps, node_length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Unknown telemetry payload {magic!r} v{version}")
+    offset = HEADER.size
+    node = data[offset:offset + node_length].decode("utf-8")
+    offset += node_length
+    readings = [READING.unpack_from(data, offset + i * READING.size) for i in range(n_readings)]
+    offset += n_readings * READING.size
+    pumps = [PUMP.unpack_from(data, offset + i * PUMP.size) for i in range(n_pumps)]
+    return node, seq, readings, pumps
+
+
+class UdpTransport:
+    def __init__(self, host, port):
+        self._address = (host, port)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, payload):
+        self._socket.sendto(payload, self._address)
+
+
+class HttpTransport:
+    def __init__(self, url, timeout=5):
+        self._url = url
+        self._timeout = timeout
+
+    def send(self, payload):
+        request = urllib.request.Request(
+            self._url,
+            data=payload,
+            headers={"Content-Type": "application/octet-stream"},
+        )
+        with urllib.request.urlopen(request, timeout=self._timeout) as response:
+            response.read()
+
+
+class LoopbackTransport:
+    """Hand payloads straight to an in-process aggregator, for testing."""
+
+    def __init__(self, aggregator):
+        self._aggregator = aggregator
+
+    def send(self, payload):
+        self._aggregator.ingest(payload)
+
+
+class TelemetryPublisher:
+    """Batch readings and pump events and send them from a background thread.
+
+    add_reading/add_pump_event only append to a list. maybe_flush packs a
+    batch once batch_size items or flush_interval seconds have built up.
+    When the send queue is full the oldest batch is dropped, and the
+    aggregator sees that as a sequence gap.
+
+    """
+
+    def __init__(self, node, transport, batch_size=50, flush_interval=10.0, max_queued=100):
+        self.node = node
+        self.batch_size = min(batch_size, MAX_BATCH)
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._transport = transport
+        self._seq = 0
+        self._readings = []
+        self._pumps = []
+        self._time_last_flush = time.monotonic()
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_config(cls, node, config):
+        """Build a publisher from the "telemetry" settings.yml section, or None."""
+        if not config or not config.get("enabled", False):
+            return None
+        if config.get("transport", "udp") == "http":
+            transport = HttpTransport(config["url"])
+        else:
+            transport = UdpTransport(config.get("host", "127.0.0.1"), config.get("port", 9999))
+        return cls(
+            config.get("node", node),
+            transport,
+            batch_size=config.get("batch_size", 50),
+            flush_interval=config.get("flush_interval", 10.0),
+        )
+
+    def add_reading(self, timestamp, channel, moisture, saturation):
+        self._readings.append((timestamp, channel, moisture, saturation))
+
+    def add_pump_event(self, timestamp, channel, rate, duration):
+        self._pumps.append((timestamp, channel, rate, duration))
+
+    def maybe_flush(self):
+        pending = len(self._readings) + len(self._pumps)
+        if pending == 0:
+            return
+        if pending < self.batch_size and time.monotonic() - self._time_last_flush < self.flush_interval:
+            return
+        self.flush()
+
+    def flush(self):
+        while self._readings or self._pumps:
+            readings = self._readings[:self.batch_size]
+            pumps = self._pumps[:self.batch_size - len(readings)]
+            del self._readings[:len(readings)]
+            del self._pumps[:len(pumps)]
+
+            payload = encode_payload(self.node, self._seq, readings, pumps)
+            self._seq = (self._seq + 1) & 0xFFFFFFFF
+
+            while True:
+                try:
+                    self._queue.put_nowait(payload)
+                    break
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                        self._queue.task_done()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+        self._time_last_flush = time.monotonic()
+
+    def wait_sent(self):
+        """Block until every flushed batch has been handed to the transport."""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            payload = self._queue.get()
+            try:
+                self._transport.send(payload)
+            except Exception as e:
+                logging.warning("Telemetry send failed, dropping batch: %s", e)
+            finally:
+                self._queue.task_done()